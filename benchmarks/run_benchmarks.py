@@ -0,0 +1,257 @@
+"""Reproducible benchmarks for the runner, the ReAct loop, batch runs and the API under simulated model latency.
+
+Every LLM call goes through `LatencyMockLLM` (or, with --cassette, replays recorded traffic with its recorded
+latencies), so results depend only on the configured latency distribution or cassette, seed and concurrency -
+not on the network. Output is a single JSON document (stdout or --out) with throughput,
+p50/p95/p99/max latency and event-loop lag per scenario, plus enough metadata to compare runs across commits.
+
+    python benchmarks/run_benchmarks.py --requests 200 --concurrency 50 --out bench.json
+"""
+import os
+import sys
+import json
+import time
+import asyncio
+import argparse
+import platform
+import subprocess
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+from src.agent_demo.llm import CassetteLLM, LatencyMockLLM  # noqa: E402
+from src.agent_demo.reactor import ReActAgent  # noqa: E402
+from src.agent_demo.workflow import WorkflowRunner  # noqa: E402
+from src.agent_demo import tools as tools_mod  # noqa: E402
+
+SCENARIOS = ("workflow", "react", "batch", "api_run", "api_stream")
+
+
+def percentile(values: List[float], q: float) -> Optional[float]:
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+def summarize(latencies: List[float], errors: int, wall: float, lag: List[float]) -> Dict[str, Any]:
+    ms = [v * 1000 for v in latencies]
+    return {
+        "count": len(latencies),
+        "errors": errors,
+        "wall_s": round(wall, 4),
+        "throughput_per_s": round(len(latencies) / wall, 3) if wall > 0 else None,
+        "latency_ms": {
+            "p50": percentile(ms, 0.50),
+            "p95": percentile(ms, 0.95),
+            "p99": percentile(ms, 0.99),
+            "max": max(ms) if ms else None,
+        },
+        "loop_lag_ms": {
+            "p50": percentile(lag, 0.50),
+            "p99": percentile(lag, 0.99),
+            "max": max(lag) if lag else None,
+        },
+    }
+
+
+class LoopLagMonitor:
+    """Measures how late the event loop wakes a task that sleeps `interval` seconds."""
+
+    def __init__(self, interval: float = 0.01):
+        self.interval = interval
+        self.samples: List[float] = []
+        self._task: Optional[asyncio.Task] = None
+
+    async def _run(self) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            start = loop.time()
+            await asyncio.sleep(self.interval)
+            self.samples.append(max(0.0, (loop.time() - start - self.interval) * 1000))
+
+    def __enter__(self) -> "LoopLagMonitor":
+        self._task = asyncio.ensure_future(self._run())
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self._task.cancel()
+
+
+async def run_load(op: Callable[[], Awaitable[Any]], requests: int, concurrency: int) -> Dict[str, Any]:
+    """Call `op` `requests` times with at most `concurrency` calls in flight."""
+    latencies: List[float] = []
+    errors = 0
+    remaining = iter(range(requests))
+
+    async def worker() -> None:
+        nonlocal errors
+        for _ in remaining:
+            start = time.perf_counter()
+            try:
+                await op()
+            except Exception:
+                errors += 1
+                continue
+            latencies.append(time.perf_counter() - start)
+
+    with LoopLagMonitor() as lag:
+        start = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(max(1, concurrency))))
+        wall = time.perf_counter() - start
+    return summarize(latencies, errors, wall, lag.samples)
+
+
+def make_llm(args: argparse.Namespace):
+    if args.cassette:
+        # recorded production traffic, replayed with its recorded latencies
+        return CassetteLLM(args.cassette, mode="replay", replay_latency=True, time_scale=args.time_scale)
+    trace = None
+    if args.trace:
+        with open(args.trace, "r", encoding="utf-8") as f:
+            trace = [float(line) for line in f if line.strip()]
+    return LatencyMockLLM(
+        distribution="trace" if trace else args.distribution,
+        latency=args.latency,
+        sigma=args.sigma,
+        trace=trace,
+        max_latency=args.max_latency,
+        tokens_per_second=args.tokens_per_second,
+        error_rate=args.error_rate,
+        time_scale=args.time_scale,
+        seed=args.seed,
+    )
+
+
+def load_workflow() -> Dict[str, Any]:
+    with open(os.path.join(ROOT, "examples", "hybrid_workflow.json"), "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def demo_tools() -> Dict[str, Any]:
+    return {"search": tools_mod.search_tool, "run_tests": tools_mod.run_tests_tool}
+
+
+async def bench_workflow(args) -> Dict[str, Any]:
+    runner = WorkflowRunner(make_llm(args), tools=demo_tools())
+    workflow = load_workflow()
+    return await run_load(lambda: runner.run(workflow), args.requests, args.concurrency)
+
+
+async def bench_react(args) -> Dict[str, Any]:
+    llm = make_llm(args)
+    prompt = "You are a ReAct agent. Thought and action."
+    return await run_load(lambda: ReActAgent(llm, demo_tools()).run(prompt), args.requests, args.concurrency)
+
+
+async def bench_batch(args) -> Dict[str, Any]:
+    runner = WorkflowRunner(make_llm(args), tools=demo_tools())
+    items = ({"function_code": f"def f{n}(x):\n    return x * {n}\n"} for n in range(args.requests))
+    latencies: List[float] = []
+    errors = 0
+    with LoopLagMonitor() as lag:
+        start = time.perf_counter()
+        # per-item latency is measured from batch start, so it includes time spent queued
+        async for out in runner.run_many(load_workflow(), items, max_concurrency=args.concurrency):
+            if "error" in out:
+                errors += 1
+            else:
+                latencies.append(time.perf_counter() - start)
+        wall = time.perf_counter() - start
+    return summarize(latencies, errors, wall, lag.samples)
+
+
+async def _api_client(args):
+    import httpx
+    from src import server
+
+    # route the shared mock runner through the latency-injecting adapter
+    server.RUNNERS[False] = WorkflowRunner(make_llm(args), tools=server.TOOLS)
+    transport = httpx.ASGITransport(app=server.app)
+    return httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=None)
+
+
+async def bench_api_run(args) -> Dict[str, Any]:
+    async with await _api_client(args) as client:
+        async def op():
+            resp = await client.post("/run-workflow")
+            resp.raise_for_status()
+
+        return await run_load(op, args.requests, args.concurrency)
+
+
+async def bench_api_stream(args) -> Dict[str, Any]:
+    async with await _api_client(args) as client:
+        async def op():
+            async with client.stream("GET", "/stream-workflow") as resp:
+                resp.raise_for_status()
+                async for _ in resp.aiter_lines():
+                    pass
+
+        return await run_load(op, args.requests, args.concurrency)
+
+
+BENCHES = {
+    "workflow": bench_workflow,
+    "react": bench_react,
+    "batch": bench_batch,
+    "api_run": bench_api_run,
+    "api_stream": bench_api_stream,
+}
+
+
+def git_commit() -> Optional[str]:
+    try:
+        out = subprocess.run(["git", "rev-parse", "HEAD"], cwd=ROOT, capture_output=True, text=True, check=True)
+        return out.stdout.strip()
+    except Exception:
+        return None
+
+
+async def main(args: argparse.Namespace) -> Dict[str, Any]:
+    results = {}
+    for name in args.scenarios:
+        results[name] = await BENCHES[name](args)
+    params = {k: v for k, v in vars(args).items() if k != "out"}
+    return {
+        "meta": {
+            "commit": git_commit(),
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "params": params,
+        },
+        "results": results,
+    }
+
+
+def parse_args(argv=None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--scenarios", nargs="+", choices=SCENARIOS, default=list(SCENARIOS))
+    parser.add_argument("--requests", type=int, default=100, help="Operations per scenario")
+    parser.add_argument("--concurrency", type=int, default=20, help="Operations in flight at once")
+    parser.add_argument("--distribution", choices=("fixed", "lognormal"), default="lognormal")
+    parser.add_argument("--latency", type=float, default=0.8, help="Fixed latency or lognormal median (seconds)")
+    parser.add_argument("--sigma", type=float, default=0.6, help="Lognormal shape")
+    parser.add_argument("--max-latency", type=float, default=5.0, help="Cap on sampled latency (seconds)")
+    parser.add_argument("--trace", type=str, help="File of per-call latencies (seconds, one per line) to replay")
+    parser.add_argument("--cassette", type=str, help="Replay a recorded CassetteLLM file instead of the latency mock")
+    parser.add_argument("--tokens-per-second", type=float, default=None)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--time-scale", type=float, default=0.05, help="Multiply all simulated delays")
+    parser.add_argument("--seed", type=int, default=1234)
+    parser.add_argument("--out", type=str, help="Write the JSON report here instead of stdout")
+    return parser.parse_args(argv)
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    report = asyncio.run(main(args))
+    text = json.dumps(report, indent=2)
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            f.write(text + "\n")
+    else:
+        print(text)
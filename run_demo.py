@@ -1,42 +1,94 @@
 import asyncio
 import json
+import sys
 import argparse
-from src.agent_demo.llm import MockLLM, OpenAIAdapter
+from src.agent_demo.llm import CassetteLLM, MockLLM, OpenAIAdapter
 from src.agent_demo.workflow import WorkflowRunner
 from src.agent_demo import tools as tools_mod
 
 
-async def main(use_openai: bool = False, code: str | None = None):
-    # load workflow
+def load_workflow():
     with open("examples/hybrid_workflow.json", "r", encoding="utf-8") as f:
-        workflow = json.load(f)
+        return json.load(f)
 
-    # If code provided, inject into entry_inputs.function_code
-    if code:
-        workflow.setdefault("entry_inputs", {})["function_code"] = code
 
-    if use_openai:
+def make_runner(use_openai: bool = False, cassette: str = None, cassette_mode: str = "replay") -> WorkflowRunner:
+    if cassette and cassette_mode == "replay":
+        adapter = CassetteLLM(cassette)
+    elif use_openai:
         adapter = OpenAIAdapter()
     else:
         adapter = MockLLM()
+    if cassette and cassette_mode != "replay":
+        # record the adapter's traffic for later offline replay and benchmarks
+        adapter = CassetteLLM(cassette, mode=cassette_mode, inner=adapter)
 
     tools = {
         "search": tools_mod.search_tool,
         "run_tests": tools_mod.run_tests_tool,
     }
 
-    runner = WorkflowRunner(adapter, tools=tools)
+    return WorkflowRunner(adapter, tools=tools)
+
+
+async def main(use_openai: bool = False, code: str | None = None, cassette: str = None, cassette_mode: str = "replay"):
+    # load workflow
+    workflow = load_workflow()
+
+    # If code provided, inject into entry_inputs.function_code
+    if code:
+        workflow.setdefault("entry_inputs", {})["function_code"] = code
+
+    runner = make_runner(use_openai, cassette, cassette_mode)
     result = await runner.run(workflow)
+    if cassette:
+        runner.llm.close()
     print("--- RUN RESULT ---")
     print(json.dumps(result, indent=2))
 
 
+def read_batch(path: str):
+    """Yield entry_inputs overrides from a JSONL file; a line may also be a bare JSON string of code.
+    A line that is not valid JSON is yielded as a ValueError, which `run_many` reports as that item's error."""
+    with open(path, "r", encoding="utf-8") as f:
+        for n, line in enumerate(f, start=1):
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                item = json.loads(line)
+            except ValueError as e:
+                yield ValueError(f"line {n}: invalid JSON: {e}")
+                continue
+            yield item if isinstance(item, dict) else {"function_code": item}
+
+
+async def run_batch(path: str, use_openai: bool = False, concurrency: int = 8, cassette: str = None,
+                    cassette_mode: str = "replay"):
+    runner = make_runner(use_openai, cassette, cassette_mode)
+    # one JSON line per item, written as soon as that item finishes
+    async for out in runner.run_many(load_workflow(), read_batch(path), max_concurrency=concurrency):
+        sys.stdout.write(json.dumps(out, default=str) + "\n")
+        sys.stdout.flush()
+    if cassette:
+        runner.llm.close()
+
+
 if __name__ == "__main__":
     parser = argparse.ArgumentParser()
     parser.add_argument("--use-openai", action="store_true", help="Use OpenAI adapter instead of mock")
     parser.add_argument("--code", type=str, help="Provide code as a string to override entry input function_code")
     parser.add_argument("--code-file", type=str, help="Path to a file containing code to run through the workflow")
+    parser.add_argument("--batch", type=str, help="Path to a JSONL file of entry_inputs overrides; prints JSONL results")
+    parser.add_argument("--concurrency", type=int, default=8, help="Maximum concurrent runs in --batch mode")
+    parser.add_argument("--cassette", type=str, help="Cassette file to record LLM traffic to or replay it from")
+    parser.add_argument("--cassette-mode", choices=("record", "replay", "auto"), default="replay")
     args = parser.parse_args()
+    if args.batch:
+        asyncio.run(run_batch(args.batch, use_openai=args.use_openai, concurrency=args.concurrency,
+                              cassette=args.cassette, cassette_mode=args.cassette_mode))
+        sys.exit(0)
+
     code = None
     if args.code_file:
         with open(args.code_file, "r", encoding="utf-8") as cf:
@@ -44,4 +96,4 @@ if __name__ == "__main__":
     elif args.code:
         code = args.code
 
-    asyncio.run(main(use_openai=args.use_openai, code=code))
+    asyncio.run(main(use_openai=args.use_openai, code=code, cassette=args.cassette, cassette_mode=args.cassette_mode))
@@ -0,0 +1,177 @@
+import os
+import re
+import json
+import mmap
+import time
+import hashlib
+from pathlib import Path
+from typing import Any, Dict, Optional, Tuple
+
+# artifact ids are content hashes, so anything else is rejected before it reaches the filesystem
+_ID_RE = re.compile(r"^[0-9a-f]{64}$")
+PREVIEW_CHARS = 200
+
+
+def is_artifact_ref(value: Any) -> bool:
+    return isinstance(value, dict) and value.get("$ref") == "artifact" and "id" in value
+
+
+def encode_value(value: Any) -> Tuple[bytes, str]:
+    """Serialize a step output: strings as UTF-8 text, anything else as JSON."""
+    if isinstance(value, str):
+        return value.encode("utf-8"), "text/plain; charset=utf-8"
+    return json.dumps(value, default=str).encode("utf-8"), "application/json"
+
+
+class ArtifactStore:
+    """Content-addressed storage for step outputs too large to copy into every event and response.
+
+    `offload(value)` stores a value bigger than `threshold` bytes once (identical content is stored once) and
+    returns a compact reference in its place:
+
+        {"$ref": "artifact", "id": sha256, "size": bytes, "content_type": ..., "preview": first characters}
+
+    Readers fetch the content lazily with `read` (a byte range) or `load` (the decoded value).
+    """
+
+    def __init__(self, threshold: int = 64 * 1024):
+        self.threshold = threshold
+
+    def put(self, data: bytes, content_type: str) -> str:
+        raise NotImplementedError()
+
+    def read(self, artifact_id: str, start: int = 0, end: Optional[int] = None) -> bytes:
+        """Bytes `start:end` of an artifact; raises KeyError for an unknown id."""
+        raise NotImplementedError()
+
+    def info(self, artifact_id: str) -> Dict[str, Any]:
+        """`{"id", "size", "content_type"}`; raises KeyError for an unknown id."""
+        raise NotImplementedError()
+
+    def offload(self, value: Any) -> Any:
+        """`value` itself when it is small (or already a reference), else a reference to the stored copy."""
+        if value is None or isinstance(value, (bool, int, float)) or is_artifact_ref(value):
+            return value
+        data, content_type = encode_value(value)
+        if len(data) <= self.threshold:
+            return value
+        artifact_id = self.put(data, content_type)
+        preview = value if isinstance(value, str) else data.decode("utf-8")
+        return {"$ref": "artifact", "id": artifact_id, "size": len(data), "content_type": content_type,
+                "preview": preview[:PREVIEW_CHARS]}
+
+    def offload_all(self, values: Dict[str, Any]) -> Dict[str, Any]:
+        """A copy of a dict (e.g. run memory) with each large value replaced by a reference."""
+        return {k: self.offload(v) for k, v in values.items()}
+
+    def load(self, ref: Any) -> Any:
+        """Resolve a reference back into its value (anything else is returned unchanged)."""
+        if not is_artifact_ref(ref):
+            return ref
+        data = self.read(ref["id"])
+        if self.info(ref["id"])["content_type"] == "application/json":
+            return json.loads(data)
+        return data.decode("utf-8")
+
+    def purge(self, older_than: Optional[float] = None) -> int:
+        """Delete artifacts unused for `older_than` seconds; returns how many were removed."""
+        return 0
+
+    @staticmethod
+    def _check_id(artifact_id: str) -> None:
+        if not _ID_RE.match(artifact_id or ""):
+            raise KeyError(artifact_id)
+
+
+class MemoryArtifactStore(ArtifactStore):
+    """Artifacts in a dict: for tests and single-process use where outputs need not outlive the process."""
+
+    def __init__(self, threshold: int = 64 * 1024):
+        super().__init__(threshold)
+        self._items: Dict[str, Tuple[bytes, str]] = {}
+
+    def put(self, data: bytes, content_type: str) -> str:
+        artifact_id = hashlib.sha256(data).hexdigest()
+        self._items.setdefault(artifact_id, (data, content_type))
+        return artifact_id
+
+    def read(self, artifact_id: str, start: int = 0, end: Optional[int] = None) -> bytes:
+        return self._items[artifact_id][0][start:end]
+
+    def info(self, artifact_id: str) -> Dict[str, Any]:
+        data, content_type = self._items[artifact_id]
+        return {"id": artifact_id, "size": len(data), "content_type": content_type}
+
+
+class FileArtifactStore(ArtifactStore):
+    """One file per artifact under `<directory>/<id[:2]>/`, written atomically and read through `mmap`, so range
+    reads only touch the pages they need. Several worker processes can share the directory."""
+
+    def __init__(self, directory: str, threshold: int = 64 * 1024, retention: float = 7 * 24 * 3600.0):
+        super().__init__(threshold)
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.retention = retention
+
+    def _path(self, artifact_id: str, suffix: str = ".bin") -> Path:
+        self._check_id(artifact_id)
+        return self.directory / artifact_id[:2] / (artifact_id + suffix)
+
+    def put(self, data: bytes, content_type: str) -> str:
+        artifact_id = hashlib.sha256(data).hexdigest()
+        path = self._path(artifact_id)
+        if path.exists():
+            # same content already stored: just mark it as recently used
+            os.utime(path)
+            return artifact_id
+        path.parent.mkdir(exist_ok=True)
+        # the content type goes first, so a reader never sees a blob without it
+        for target, payload in ((self._path(artifact_id, ".type"), content_type.encode("utf-8")), (path, data)):
+            tmp = target.with_suffix(f".{os.getpid()}.tmp")
+            tmp.write_bytes(payload)
+            os.replace(tmp, target)
+        return artifact_id
+
+    def read(self, artifact_id: str, start: int = 0, end: Optional[int] = None) -> bytes:
+        try:
+            with self._path(artifact_id).open("rb") as f:
+                if os.fstat(f.fileno()).st_size == 0:
+                    return b""
+                with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as m:
+                    return m[start:end]
+        except FileNotFoundError:
+            raise KeyError(artifact_id) from None
+
+    def info(self, artifact_id: str) -> Dict[str, Any]:
+        try:
+            size = self._path(artifact_id).stat().st_size
+            content_type = self._path(artifact_id, ".type").read_text(encoding="utf-8")
+        except FileNotFoundError:
+            raise KeyError(artifact_id) from None
+        return {"id": artifact_id, "size": size, "content_type": content_type}
+
+    def purge(self, older_than: Optional[float] = None) -> int:
+        """Delete artifacts not written or re-used for `older_than` seconds (default: `retention`)."""
+        cutoff = time.time() - (self.retention if older_than is None else older_than)
+        removed = 0
+        for path in self.directory.glob("*/*.bin"):
+            try:
+                if path.stat().st_mtime < cutoff:
+                    path.unlink()
+                    path.with_suffix(".type").unlink(missing_ok=True)
+                    removed += 1
+            except FileNotFoundError:
+                continue
+        return removed
+
+
+def open_artifact_store(location: Optional[str], threshold: int = 64 * 1024,
+                        retention: Optional[float] = None) -> Optional[ArtifactStore]:
+    """Open a file store in a directory, an in-memory store for ":memory:", or None to keep outputs inline."""
+    if not location:
+        return None
+    if location == ":memory:":
+        return MemoryArtifactStore(threshold)
+    if retention is None:
+        return FileArtifactStore(location, threshold)
+    return FileArtifactStore(location, threshold, retention)
@@ -0,0 +1,139 @@
+import time
+import asyncio
+import contextvars
+from contextlib import contextmanager
+from typing import Any, Awaitable, Dict, Iterator, Optional
+
+from .history import CHARS_PER_TOKEN
+
+_current: contextvars.ContextVar[Optional["RunBudget"]] = contextvars.ContextVar("agent_demo_budget", default=None)
+
+# why a run stopped early (RunBudget.stop_reason)
+STOP_REASONS = ("deadline", "deadline_near", "tokens", "llm_calls", "tool_calls")
+
+
+class BudgetExceeded(Exception):
+    """Raised when a call is cut off by the run's deadline or a spent budget."""
+
+    def __init__(self, reason: str):
+        super().__init__(f"run budget exhausted: {reason}")
+        self.reason = reason
+
+
+class RunBudget:
+    """Wall-clock deadline and cost limits for one run, shared by everything the run calls.
+
+    `timeout` (seconds from creation), `max_tokens` (prompt + reply, from `usage` when the adapter reports it,
+    else ~4 characters per token), `max_llm_calls` and `max_tool_calls` are each optional. The budget travels in
+    a context variable (see `use_budget`), so the runner, ReAct agents, LLM adapters and the tool executor all
+    see the budget of the run they are working for without extra arguments.
+
+    - `should_stop()` says whether to start another unit of work: it also stops when less time is left than a
+      typical LLM call has taken so far in this run ("deadline_near"), since that call would be cut off anyway.
+    - `call(awaitable)` bounds an awaitable by the time left and cancels it at the deadline.
+    - `report()` summarizes usage and the `stop_reason`, if the run was stopped.
+    """
+
+    def __init__(self, timeout: Optional[float] = None, max_tokens: Optional[int] = None,
+                 max_llm_calls: Optional[int] = None, max_tool_calls: Optional[int] = None):
+        self.started = time.monotonic()
+        self.timeout = timeout
+        self.deadline = self.started + timeout if timeout is not None else None
+        self.max_tokens = max_tokens
+        self.max_llm_calls = max_llm_calls
+        self.max_tool_calls = max_tool_calls
+        self.tokens_used = 0
+        self.llm_calls = 0
+        self.tool_calls = 0
+        self.stop_reason: Optional[str] = None
+        self._llm_seconds = 0.0
+
+    def remaining(self) -> Optional[float]:
+        """Seconds until the deadline (never negative), or None without a deadline."""
+        if self.deadline is None:
+            return None
+        return max(0.0, self.deadline - time.monotonic())
+
+    def exhausted(self) -> Optional[str]:
+        """The limit that has been hit, if any."""
+        if self.deadline is not None and time.monotonic() >= self.deadline:
+            return "deadline"
+        if self.max_tokens is not None and self.tokens_used >= self.max_tokens:
+            return "tokens"
+        if self.max_llm_calls is not None and self.llm_calls >= self.max_llm_calls:
+            return "llm_calls"
+        return None
+
+    def should_stop(self) -> Optional[str]:
+        """The reason not to start another LLM round, if any; the first reason given is recorded."""
+        reason = self.exhausted()
+        if reason is None and self.deadline is not None and self.llm_calls:
+            if self.remaining() < self._llm_seconds / self.llm_calls:
+                reason = "deadline_near"
+        if reason is not None:
+            self.stop(reason)
+        return reason
+
+    def stop(self, reason: str) -> None:
+        if self.stop_reason is None:
+            self.stop_reason = reason
+
+    def charge_llm(self, prompt: str, text: str, usage: Optional[Dict[str, Any]] = None,
+                   seconds: float = 0.0) -> None:
+        self.llm_calls += 1
+        self._llm_seconds += seconds
+        if usage and usage.get("total_tokens") is not None:
+            self.tokens_used += int(usage["total_tokens"])
+        else:
+            self.tokens_used += (len(prompt) + len(text)) // CHARS_PER_TOKEN
+
+    def charge_tool(self) -> Optional[str]:
+        """Count a tool call; returns the reason it must not run, if the budget does not allow it."""
+        reason = self.exhausted()
+        if reason is None and self.max_tool_calls is not None and self.tool_calls >= self.max_tool_calls:
+            reason = "tool_calls"
+        if reason is not None:
+            self.stop(reason)
+            return reason
+        self.tool_calls += 1
+        return None
+
+    def clamp(self, timeout: Optional[float]) -> Optional[float]:
+        """The smaller of `timeout` and the time left (None means unbounded)."""
+        left = self.remaining()
+        if left is None:
+            return timeout
+        return left if timeout is None else min(timeout, left)
+
+    async def call(self, awaitable: Awaitable[Any]) -> Any:
+        """Await `awaitable`, cancelling it and raising `BudgetExceeded` when the deadline passes."""
+        try:
+            return await asyncio.wait_for(awaitable, self.remaining())
+        except asyncio.TimeoutError:
+            self.stop("deadline")
+            raise BudgetExceeded("deadline") from None
+
+    def report(self) -> Dict[str, Any]:
+        return {
+            "elapsed": round(time.monotonic() - self.started, 3),
+            "timeout": self.timeout,
+            "tokens_used": self.tokens_used,
+            "max_tokens": self.max_tokens,
+            "llm_calls": self.llm_calls,
+            "tool_calls": self.tool_calls,
+            "stop_reason": self.stop_reason,
+        }
+
+
+def current_budget() -> Optional[RunBudget]:
+    return _current.get()
+
+
+@contextmanager
+def use_budget(budget: Optional[RunBudget]) -> Iterator[Optional[RunBudget]]:
+    """Make `budget` the current run's budget for this context (tasks created inside inherit it)."""
+    token = _current.set(budget)
+    try:
+        yield budget
+    finally:
+        _current.reset(token)
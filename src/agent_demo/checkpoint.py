@@ -0,0 +1,159 @@
+import os
+import json
+import time
+import hashlib
+import sqlite3
+from pathlib import Path
+from typing import Any, Dict, Optional
+
+
+def content_hash(value: Any) -> str:
+    """Stable SHA-256 of a JSON-serializable value (strings are hashed as-is)."""
+    raw = value if isinstance(value, str) else json.dumps(value, sort_keys=True, default=str)
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+class CheckpointStore:
+    """Persists the result of each completed workflow step under a run key.
+
+    A record is a dict with `prompt_hash` (hash of the step's parser and rendered prompt), `upstream_hash`
+    (hash of the outputs of the steps it depends on) and `parsed` (the step's parsed output).
+    Runs whose checkpoints have not been written for `retention` seconds are removed by `purge()`.
+    """
+
+    retention = 7 * 24 * 3600.0
+
+    def load(self, run_key: str) -> Dict[str, Dict[str, Any]]:
+        """Return {step_id: record} for a run key."""
+        raise NotImplementedError()
+
+    def save(self, run_key: str, step_id: str, record: Dict[str, Any]) -> None:
+        raise NotImplementedError()
+
+    def clear(self, run_key: str) -> None:
+        raise NotImplementedError()
+
+    def purge(self, older_than: Optional[float] = None) -> int:
+        """Delete the checkpoints of run keys last written more than `older_than` seconds ago (default:
+        `retention`). Returns the number of run keys removed."""
+        raise NotImplementedError()
+
+
+class FileCheckpointStore(CheckpointStore):
+    """One JSON file per step under `<directory>/<hash of run key>/`, written atomically."""
+
+    def __init__(self, directory: str, retention: Optional[float] = None):
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        if retention is not None:
+            self.retention = retention
+
+    def _run_dir(self, run_key: str) -> Path:
+        return self.directory / content_hash(run_key)[:32]
+
+    def load(self, run_key: str) -> Dict[str, Dict[str, Any]]:
+        records = {}
+        run_dir = self._run_dir(run_key)
+        if not run_dir.is_dir():
+            return records
+        for path in run_dir.glob("*.json"):
+            try:
+                with path.open("r", encoding="utf-8") as f:
+                    record = json.load(f)
+            except (OSError, ValueError):
+                # a torn or unreadable checkpoint just means the step runs again
+                continue
+            records[record["step_id"]] = record
+        return records
+
+    def save(self, run_key: str, step_id: str, record: Dict[str, Any]) -> None:
+        run_dir = self._run_dir(run_key)
+        run_dir.mkdir(parents=True, exist_ok=True)
+        path = run_dir / (content_hash(step_id)[:32] + ".json")
+        tmp = path.with_suffix(f".{os.getpid()}.tmp")
+        with tmp.open("w", encoding="utf-8") as f:
+            json.dump(dict(record, step_id=step_id, run_key=run_key), f, default=str)
+        os.replace(tmp, path)
+
+    def clear(self, run_key: str) -> None:
+        self._remove(self._run_dir(run_key))
+
+    @staticmethod
+    def _remove(run_dir: Path) -> None:
+        if run_dir.is_dir():
+            for path in run_dir.iterdir():
+                path.unlink(missing_ok=True)
+            run_dir.rmdir()
+
+    def purge(self, older_than: Optional[float] = None) -> int:
+        cutoff = time.time() - (self.retention if older_than is None else older_than)
+        removed = 0
+        for run_dir in self.directory.iterdir():
+            try:
+                newest = max((p.stat().st_mtime for p in run_dir.iterdir()), default=run_dir.stat().st_mtime)
+                if newest < cutoff:
+                    self._remove(run_dir)
+                    removed += 1
+            except OSError:
+                # written to or removed concurrently: leave it for the next purge
+                continue
+        return removed
+
+
+class SQLiteCheckpointStore(CheckpointStore):
+    """All checkpoints in one SQLite table keyed by (run_key, step_id)."""
+
+    def __init__(self, path: str, retention: Optional[float] = None):
+        if retention is not None:
+            self.retention = retention
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS checkpoints ("
+            "run_key TEXT NOT NULL, step_id TEXT NOT NULL, prompt_hash TEXT, upstream_hash TEXT, "
+            "parsed TEXT, created REAL NOT NULL, PRIMARY KEY (run_key, step_id))"
+        )
+        self._db.commit()
+
+    def load(self, run_key: str) -> Dict[str, Dict[str, Any]]:
+        rows = self._db.execute(
+            "SELECT step_id, prompt_hash, upstream_hash, parsed FROM checkpoints WHERE run_key = ?", (run_key,)
+        ).fetchall()
+        return {
+            step_id: {"prompt_hash": ph, "upstream_hash": uh, "parsed": json.loads(parsed)}
+            for step_id, ph, uh, parsed in rows
+        }
+
+    def save(self, run_key: str, step_id: str, record: Dict[str, Any]) -> None:
+        self._db.execute(
+            "INSERT OR REPLACE INTO checkpoints (run_key, step_id, prompt_hash, upstream_hash, parsed, created) "
+            "VALUES (?, ?, ?, ?, ?, ?)",
+            (run_key, step_id, record.get("prompt_hash"), record.get("upstream_hash"),
+             json.dumps(record.get("parsed"), default=str), time.time()),
+        )
+        self._db.commit()
+
+    def clear(self, run_key: str) -> None:
+        self._db.execute("DELETE FROM checkpoints WHERE run_key = ?", (run_key,))
+        self._db.commit()
+
+    def purge(self, older_than: Optional[float] = None) -> int:
+        cutoff = time.time() - (self.retention if older_than is None else older_than)
+        old = self._db.execute("SELECT run_key FROM checkpoints GROUP BY run_key HAVING MAX(created) < ?",
+                               (cutoff,)).fetchall()
+        if old:
+            self._db.executemany("DELETE FROM checkpoints WHERE run_key = ?", old)
+            self._db.commit()
+        return len(old)
+
+    def close(self) -> None:
+        self._db.close()
+
+
+def open_checkpoint_store(location: Optional[str], retention: Optional[float] = None) -> Optional[CheckpointStore]:
+    """Open a store from a path: `*.db`/`*.sqlite` files use SQLite, anything else is a directory."""
+    if not location:
+        return None
+    if location.endswith((".db", ".sqlite", ".sqlite3")):
+        return SQLiteCheckpointStore(location, retention)
+    return FileCheckpointStore(location, retention)
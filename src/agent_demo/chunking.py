@@ -0,0 +1,89 @@
+import re
+from typing import List
+
+from .history import CHARS_PER_TOKEN
+
+# a top-level definition (optionally decorated) starts a new block of Python code
+_TOP_LEVEL_RE = re.compile(r"^(?:@|def\s|async\s+def\s|class\s)")
+_CODE_HINT_RE = re.compile(r"^(?:def|class|async\s+def|import|from)\s", re.M)
+
+
+def estimate_tokens(text: str) -> int:
+    return -(-len(text) // CHARS_PER_TOKEN)
+
+
+def looks_like_code(text: str) -> bool:
+    return bool(_CODE_HINT_RE.search(text))
+
+
+def _pack(pieces: List[str], max_chars: int) -> List[str]:
+    """Greedily concatenate consecutive pieces into chunks of at most `max_chars` (oversized pieces stand alone)."""
+    chunks: List[str] = []
+    cur = ""
+    for piece in pieces:
+        if cur and len(cur) + len(piece) > max_chars:
+            chunks.append(cur)
+            cur = ""
+        cur += piece
+    if cur:
+        chunks.append(cur)
+    return chunks
+
+
+def split_text(text: str, max_tokens: int) -> List[str]:
+    """Split prose into chunks of at most `max_tokens`, on blank lines, then lines, then hard character cuts."""
+    max_chars = max(1, max_tokens * CHARS_PER_TOKEN)
+    pieces: List[str] = []
+    for para in re.split(r"(?<=\n\n)", text):
+        if len(para) <= max_chars:
+            pieces.append(para)
+            continue
+        for line in para.splitlines(keepends=True):
+            if len(line) <= max_chars:
+                pieces.append(line)
+            else:
+                pieces.extend(line[i:i + max_chars] for i in range(0, len(line), max_chars))
+    return _pack(pieces, max_chars)
+
+
+def code_blocks(source: str) -> List[str]:
+    """Split Python source into top-level blocks: each def/class (with its decorators and any comments
+    directly above it) is one block, and the module-level code between definitions forms blocks of its own."""
+    lines = source.splitlines(keepends=True)
+    blocks: List[str] = []
+    cur: List[str] = []
+    for line in lines:
+        if _TOP_LEVEL_RE.match(line):
+            # decorators and comments right above a definition belong to it
+            head: List[str] = []
+            if not (cur and cur[-1].startswith("@")):
+                while cur and cur[-1].startswith("#"):
+                    head.insert(0, cur.pop())
+                if cur:
+                    blocks.append("".join(cur))
+                cur = head
+        cur.append(line)
+    if cur:
+        blocks.append("".join(cur))
+    return blocks
+
+
+def split_code(source: str, max_tokens: int) -> List[str]:
+    """Split Python source into chunks of at most `max_tokens`, only ever cutting between top-level
+    definitions unless a single definition is larger than the budget (then it is split on lines)."""
+    max_chars = max(1, max_tokens * CHARS_PER_TOKEN)
+    pieces: List[str] = []
+    for block in code_blocks(source):
+        pieces.extend([block] if len(block) <= max_chars else split_text(block, max_tokens))
+    return _pack(pieces, max_chars)
+
+
+def chunk_input(text: str, max_tokens: int, mode: str = "auto") -> List[str]:
+    """Split `text` for a map-reduce step. `mode` is "code", "text" or "auto" (code if it looks like Python)."""
+    if mode not in ("auto", "code", "text"):
+        raise ValueError(f"unknown chunking mode: {mode}")
+    if not text:
+        return []
+    if mode == "code" or (mode == "auto" and looks_like_code(text)):
+        return split_code(text, max_tokens)
+    return split_text(text, max_tokens)
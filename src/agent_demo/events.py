@@ -0,0 +1,150 @@
+import json
+import asyncio
+from collections import deque
+from typing import Any, Callable, Deque, Dict, Iterable, List, Optional, Tuple
+
+# event types after which a run produces nothing more
+TERMINAL_EVENTS = ("done", "error", "cancelled")
+
+POLICIES = ("block", "drop", "disconnect")
+
+
+def sse_frame(seq: int, event: Dict[str, Any]) -> bytes:
+    """Serialize an event as one SSE frame carrying its sequence number as the event id."""
+    return f"id: {seq}\ndata: {json.dumps(event, default=str)}\n\n".encode("utf-8")
+
+
+class Subscription:
+    """One consumer of a `RunEventHub`. Iterate it with `async for frame in sub` to receive SSE frames (bytes)."""
+
+    def __init__(self, hub: "RunEventHub", maxsize: int, policy: str, replay: Iterable[bytes] = ()):
+        self.hub = hub
+        self.maxsize = maxsize
+        self.policy = policy
+        self.dropped = 0
+        self.closed = False
+        self._frames: Deque[bytes] = deque(replay)
+        self._ready = asyncio.Event()
+        self._space = asyncio.Event()
+        if self._frames:
+            self._ready.set()
+
+    def full(self) -> bool:
+        return len(self._frames) >= self.maxsize
+
+    def push(self, frame: bytes) -> None:
+        self._frames.append(frame)
+        self._ready.set()
+
+    async def wait_for_space(self) -> None:
+        while self.full() and not self.closed:
+            self._space.clear()
+            await self._space.wait()
+
+    def close(self) -> None:
+        self.closed = True
+        self._ready.set()
+        self._space.set()
+
+    def __aiter__(self) -> "Subscription":
+        return self
+
+    async def __anext__(self) -> bytes:
+        while not self._frames:
+            if self.closed:
+                raise StopAsyncIteration
+            self._ready.clear()
+            await self._ready.wait()
+        frame = self._frames.popleft()
+        self._space.set()
+        return frame
+
+
+class RunEventHub:
+    """Fan-out of one run's events to any number of SSE subscribers.
+
+    `put()` has the same signature as `asyncio.Queue.put`, so a hub can be passed directly as the
+    `event_queue` of `WorkflowRunner.run`. Each event is serialized once into an SSE frame with an increasing
+    id and shared by all subscribers. The last `buffer_size` frames are kept in a ring buffer so that late or
+    reconnecting clients can replay from a `Last-Event-ID`.
+
+    Each subscriber has a bounded queue of `subscriber_queue_size` frames. When it is full, the hub's
+    `policy` decides what happens: "block" makes the publisher wait for the subscriber, "drop" discards that
+    subscriber's oldest queued frame (counted in `Subscription.dropped`), and "disconnect" ends the
+    subscription so the client can reconnect and replay from its last id.
+
+    `sink(seq, event)`, if given, is called for every event, e.g. to mirror it to a shared run registry.
+    """
+
+    def __init__(self, run_id: str, buffer_size: int = 1024, subscriber_queue_size: int = 256,
+                 policy: str = "drop", sink: Optional[Callable[[int, Dict[str, Any]], None]] = None):
+        if policy not in POLICIES:
+            raise ValueError(f"unknown slow-consumer policy: {policy}")
+        self.run_id = run_id
+        self.policy = policy
+        self.subscriber_queue_size = subscriber_queue_size
+        self.closed = False
+        self._seq = 0
+        self._buffer: Deque[Tuple[int, bytes]] = deque(maxlen=buffer_size)
+        self._subscribers: List[Subscription] = []
+        self.sink = sink
+
+    @property
+    def last_id(self) -> int:
+        return self._seq
+
+    async def put(self, event: Dict[str, Any]) -> None:
+        if self.closed:
+            return
+        self._seq += 1
+        frame = sse_frame(self._seq, event)
+        self._buffer.append((self._seq, frame))
+        if self.sink is not None:
+            self.sink(self._seq, event)
+        for sub in list(self._subscribers):
+            if sub.full():
+                if self.policy == "block":
+                    await sub.wait_for_space()
+                elif self.policy == "drop":
+                    sub._frames.popleft()
+                    sub.dropped += 1
+                else:
+                    self.unsubscribe(sub)
+                    continue
+            if not sub.closed:
+                sub.push(frame)
+        if event.get("type") in TERMINAL_EVENTS:
+            self.close()
+
+    def subscribe(self, last_event_id: Optional[int] = None) -> Subscription:
+        """Attach a subscriber. With `last_event_id`, buffered frames after that id are replayed first;
+        if some of them already fell out of the buffer, a `replay_gap` event is sent before the replay."""
+        replay: List[bytes] = []
+        if last_event_id is not None:
+            oldest = self._buffer[0][0] if self._buffer else self._seq + 1
+            if last_event_id + 1 < oldest:
+                replay.append(sse_frame(0, {"type": "replay_gap", "run_id": self.run_id,
+                                            "missed": [last_event_id + 1, oldest - 1]}))
+            replay.extend(frame for seq, frame in self._buffer if seq > last_event_id)
+        sub = Subscription(self, self.subscriber_queue_size, self.policy, replay)
+        if self.closed:
+            sub.close()
+        else:
+            self._subscribers.append(sub)
+        return sub
+
+    def unsubscribe(self, sub: Subscription) -> None:
+        sub.close()
+        if sub in self._subscribers:
+            self._subscribers.remove(sub)
+
+    def close(self) -> None:
+        """Stop accepting events; subscribers finish after draining what they have queued."""
+        self.closed = True
+        for sub in self._subscribers:
+            sub.close()
+        self._subscribers.clear()
+
+    @property
+    def subscriber_count(self) -> int:
+        return len(self._subscribers)
@@ -0,0 +1,124 @@
+from typing import Callable, List, Optional, Union
+
+# rough characters-per-token ratio used to turn token budgets into character budgets
+CHARS_PER_TOKEN = 4
+# space reserved for the "... [truncated N chars]" marker, and the shortest useful truncated entry
+_TRUNCATION_MARKER = 32
+_MIN_KEPT = 40
+
+
+def _truncate(text: str, limit: int) -> str:
+    if len(text) <= limit:
+        return text
+    return text[:limit] + f"... [truncated {len(text) - limit} chars]"
+
+
+def summarize_entries(entries: List[str], per_entry: int = 80) -> str:
+    """Default summarizer: collapse entries into one line keeping the head of each."""
+    heads = "; ".join(_truncate(e.replace("\n", " "), per_entry) for e in entries)
+    return f"{_SUMMARY_PREFIX} {len(entries)} earlier entries: {heads}"
+
+
+_SUMMARY_PREFIX = "Summary of"
+
+
+class PromptHistory:
+    """Builds the ReAct prompt incrementally under a size budget.
+
+    The rendered prompt is `prompt + "\\n\\nHistory:\\n" + entries joined by newlines`, kept as a cached string
+    that is extended on each `append` instead of being rebuilt. When the history section exceeds `budget`
+    characters (or `max_tokens` tokens), everything but the `keep_recent` newest entries is compacted in one go:
+
+    - "truncate": shorten each old entry to `truncate_to` characters
+    - "summarize": collapse the old entries into a single summary line (pass a callable to supply your own)
+
+    Compaction rewrites a whole block at once, so between compactions the prompt only grows at the end and its
+    prefix stays byte-identical across iterations, which keeps provider-side prompt caching effective. Entries
+    are compacted once: later compactions only touch entries that aged out since. If the history is still over
+    budget after compacting, the oldest entries are dropped ("truncate" drops down to half the budget, so the
+    following appends fit again without another rewrite).
+    """
+
+    def __init__(self, prompt: str, budget: Optional[int] = None, max_tokens: Optional[int] = None,
+                 strategy: Union[str, Callable[[List[str]], str]] = "truncate", keep_recent: int = 2,
+                 truncate_to: int = 200):
+        if budget is None and max_tokens is not None:
+            budget = max_tokens * CHARS_PER_TOKEN
+        if isinstance(strategy, str) and strategy not in ("truncate", "summarize"):
+            raise ValueError(f"unknown history strategy: {strategy}")
+        self.prompt = prompt
+        self.budget = budget
+        self.strategy = strategy
+        self.keep_recent = max(0, keep_recent)
+        self.truncate_to = truncate_to
+        self.entries: List[str] = []
+        self.compactions = 0
+        # number of entries folded into the leading summary entry ("summarize" strategy)
+        self._summarized = 0
+        # number of leading entries that are already compacted and must not be compacted again
+        self._compacted = 0
+        self._header = prompt + "\n\nHistory:\n"
+        self._body = ""
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+    def append(self, entry: str) -> None:
+        self._body += ("\n" if self.entries else "") + entry
+        self.entries.append(entry)
+        if self.budget is not None and len(self._body) > self.budget:
+            self._compact()
+
+    def extend(self, entries: List[str]) -> None:
+        for e in entries:
+            self.append(e)
+
+    def render(self) -> str:
+        return self._header + self._body
+
+    def _summarize(self, old: List[str]) -> str:
+        # fold into the existing summary instead of summarizing the summary
+        if self._summarized and old[0].startswith(_SUMMARY_PREFIX):
+            if len(old) == 1:
+                return old[0]
+            prev_heads = old[0].split(": ", 1)[1] if ": " in old[0] else ""
+            fresh = summarize_entries(old[1:]).split(": ", 1)[1]
+            self._summarized += len(old) - 1
+            return f"{_SUMMARY_PREFIX} {self._summarized} earlier entries: {prev_heads}; {fresh}"
+        self._summarized = len(old)
+        return summarize_entries(old)
+
+    def _compact(self) -> None:
+        split = max(0, len(self.entries) - self.keep_recent)
+        old, recent = self.entries[:split], self.entries[split:]
+        # only entries that aged out since the last compaction are compacted; the compacted prefix is left alone
+        if split > self._compacted:
+            if callable(self.strategy):
+                old = [self.strategy(old)]
+            elif self.strategy == "summarize":
+                old = [self._summarize(old)]
+            else:
+                old = old[:self._compacted] + [_truncate(e, self.truncate_to) for e in old[self._compacted:]]
+            self.compactions += 1
+        self._compacted = len(old)
+        entries = old + recent
+        if self.strategy == "truncate" and len("\n".join(entries)) > self.budget:
+            # drop truncated entries down to half the budget in one go, so the next few appends fit without
+            # rewriting the start of the history again
+            while self._compacted and len("\n".join(entries)) > self.budget // 2:
+                entries.pop(0)
+                self._compacted -= 1
+        # still too large: shorten the oldest entry if there is room for it, otherwise drop it,
+        # always keeping at least the newest entry (truncated entries are dropped, never truncated twice)
+        while len(entries) > 1 and len("\n".join(entries)) > self.budget:
+            room = self.budget - len("\n".join(entries[1:])) - 1 - _TRUNCATION_MARKER
+            if room >= _MIN_KEPT and not (self.strategy == "truncate" and self._compacted):
+                entries[0] = _truncate(entries[0], room)
+                self._compacted = max(self._compacted, 1)
+                break
+            entries.pop(0)
+            self._compacted = max(0, self._compacted - 1)
+        if len(entries) == 1 and len(entries[0]) > self.budget:
+            entries[0] = _truncate(entries[0], self.budget)
+        self.entries = entries
+        self._body = "\n".join(entries)
@@ -1,23 +1,67 @@
 import os
 import json
+import time
+import math
+import random
+import hashlib
+import sqlite3
 import asyncio
-from typing import Dict, Any
+from collections import OrderedDict, deque
+from typing import AsyncIterator, Dict, Any, List, Optional
+
+from .budget import current_budget
 
 try:
     import openai
 except Exception:
     openai = None
 
+try:
+    import httpx
+except Exception:
+    httpx = None
+
+try:
+    import h2  # noqa: F401  (enables HTTP/2 in httpx)
+    HTTP2_AVAILABLE = True
+except Exception:
+    HTTP2_AVAILABLE = False
+
+
+class LLMServiceError(RuntimeError):
+    """A failed LLM call carrying an HTTP-style status code (e.g. 429 rate limited, 503 overloaded)."""
+
+    def __init__(self, message: str, status_code: int = 503):
+        super().__init__(message)
+        self.status_code = status_code
+
 
 class LLMAdapter:
     async def generate(self, prompt: str, **opts) -> Dict[str, Any]:
         raise NotImplementedError()
 
+    async def generate_stream(self, prompt: str, **opts) -> AsyncIterator[str]:
+        """Yield the reply as text chunks. Adapters without native streaming yield the full text once."""
+        resp = await self.generate(prompt, **opts)
+        text = resp.get("text", "")
+        if text:
+            yield text
+
 
 class MockLLM(LLMAdapter):
     """A deterministic mock LLM for offline demos. It inspects the prompt and returns predictable JSON/text.
     """
 
+    # size of the chunks yielded by generate_stream
+    stream_chunk_size = 16
+
+    async def generate_stream(self, prompt: str, **opts) -> AsyncIterator[str]:
+        text = (await self.generate(prompt, **opts)).get("text", "")
+        for i in range(0, len(text), self.stream_chunk_size):
+            yield text[i:i + self.stream_chunk_size]
+            # give other tasks (e.g. the SSE writer) a chance to run between chunks
+            await asyncio.sleep(0)
+
     async def generate(self, prompt: str, **opts) -> Dict[str, Any]:
         # Very small heuristic-based mock responses for demo purposes
         lower = prompt.lower()
@@ -75,6 +119,43 @@ class MockLLM(LLMAdapter):
         return {"text": "I don't know exactly; please provide more details."}
 
 
+def build_chat_messages(prompt: str, mode: str = None) -> List[Dict[str, str]]:
+    """Build the chat-completions `messages` list for a prompt.
+
+    If the caller requests ReAct mode, prepend a system instruction and a small few-shot exchange to encourage strict JSON.
+    """
+    if mode != "react":
+        return [{"role": "user", "content": prompt}]
+    system_msg = (
+        "You are an assistant that follows the ReAct protocol. "
+        "All replies MUST be valid JSON and use only the following keys: \n"
+        "- thought (string)\n- action (string or null)\n- action_input (object or null)\n- final_answer (string or null)\n"
+        "To run several independent tools at once, use actions (list of {action, action_input} objects) instead of action.\n"
+    )
+    # small few-shot example
+    example_user = (
+        "Question: Is 2+2 equal to 4?\nRespond with a short chain-of-thought as 'thought', then 'action': null and 'final_answer'."
+    )
+    example_assistant = json.dumps({
+        "thought": "This is basic arithmetic.",
+        "action": None,
+        "action_input": None,
+        "final_answer": "Yes, 2+2 equals 4."
+    })
+    return [
+        {"role": "system", "content": system_msg},
+        {"role": "user", "content": example_user},
+        {"role": "assistant", "content": example_assistant},
+        {"role": "user", "content": prompt},
+    ]
+
+
+def _budget_timeout(timeout: Optional[float]) -> Optional[float]:
+    """`timeout` shortened to the time left before the current run's deadline (None: no limit)."""
+    budget = current_budget()
+    return budget.clamp(timeout) if budget is not None else timeout
+
+
 class OpenAIAdapter(LLMAdapter):
     def __init__(self, api_key: str = None):
         if openai is None:
@@ -94,46 +175,731 @@ class OpenAIAdapter(LLMAdapter):
         # openai Python client is sync; run in thread
         loop = asyncio.get_event_loop()
 
-        def _call():
-            # If caller requests ReAct mode, provide a few-shot prompt + system instruction to encourage strict JSON
-            if mode == "react":
-                system_msg = (
-                    "You are an assistant that follows the ReAct protocol. "
-                    "All replies MUST be valid JSON and use only the following keys: \n"
-                    "- thought (string)\n- action (string or null)\n- action_input (object or null)\n- final_answer (string or null)\n"
-                )
-                # small few-shot example
-                example_user = (
-                    "Question: Is 2+2 equal to 4?\nRespond with a short chain-of-thought as 'thought', then 'action': null and 'final_answer'."
-                )
-                example_assistant = json.dumps({
-                    "thought": "This is basic arithmetic.",
-                    "action": None,
-                    "action_input": None,
-                    "final_answer": "Yes, 2+2 equals 4."
-                })
+        # the worker thread cannot be cancelled, so bound the request itself by the run's deadline
+        request_timeout = _budget_timeout(opts.get("timeout"))
 
-                messages = [
-                    {"role": "system", "content": system_msg},
-                    {"role": "user", "content": example_user},
-                    {"role": "assistant", "content": example_assistant},
-                    {"role": "user", "content": prompt},
-                ]
-                resp = openai.ChatCompletion.create(
-                    model=model,
-                    messages=messages,
-                    max_tokens=max_tokens,
-                    temperature=temperature,
-                )
-            else:
-                resp = openai.ChatCompletion.create(
-                    model=model,
-                    messages=[{"role": "user", "content": prompt}],
-                    max_tokens=max_tokens,
-                    temperature=temperature,
-                )
-            return resp
+        def _call():
+            return openai.ChatCompletion.create(
+                model=model,
+                messages=build_chat_messages(prompt, mode),
+                max_tokens=max_tokens,
+                temperature=temperature,
+                request_timeout=request_timeout,
+            )
 
         resp = await loop.run_in_executor(None, _call)
         text = resp.choices[0].message.content
         return {"text": text}
+
+    async def generate_stream(self, prompt: str, **opts) -> AsyncIterator[str]:
+        # the sync client iterates the stream in a worker thread and hands chunks to the loop
+        loop = asyncio.get_event_loop()
+        queue: asyncio.Queue = asyncio.Queue()
+        done = object()
+        request_timeout = _budget_timeout(opts.get("timeout"))
+
+        def _call():
+            try:
+                stream = openai.ChatCompletion.create(
+                    model=opts.get("model", "gpt-3.5-turbo"),
+                    messages=build_chat_messages(prompt, opts.get("mode")),
+                    max_tokens=opts.get("max_tokens", 512),
+                    temperature=opts.get("temperature", 0.2),
+                    stream=True,
+                    request_timeout=request_timeout,
+                )
+                for chunk in stream:
+                    piece = chunk["choices"][0].get("delta", {}).get("content")
+                    if piece:
+                        loop.call_soon_threadsafe(queue.put_nowait, piece)
+            except Exception as e:
+                loop.call_soon_threadsafe(queue.put_nowait, e)
+            finally:
+                loop.call_soon_threadsafe(queue.put_nowait, done)
+
+        fut = loop.run_in_executor(None, _call)
+        while True:
+            item = await queue.get()
+            if item is done:
+                break
+            if isinstance(item, Exception):
+                raise item
+            yield item
+        await fut
+
+
+class AsyncOpenAIAdapter(LLMAdapter):
+    """OpenAI-compatible chat-completions adapter built on a shared `httpx.AsyncClient`.
+
+    Unlike `OpenAIAdapter` it does not occupy a worker thread per call: requests are issued natively on the
+    event loop over a keep-alive connection pool (HTTP/2 when the `h2` package is installed). Create one
+    instance and share it across requests. `base_url` can point at any server speaking the
+    `/chat/completions` API; `transport` is passed through to httpx (e.g. `httpx.ASGITransport` in tests).
+    """
+
+    def __init__(self, api_key: str = None, base_url: str = None, model: str = "gpt-3.5-turbo",
+                 timeout: float = 60.0, connect_timeout: float = 5.0, max_connections: int = 100,
+                 max_keepalive_connections: int = 20, keepalive_expiry: float = 30.0,
+                 http2: bool = None, client: "httpx.AsyncClient" = None, transport: Any = None):
+        if httpx is None:
+            raise RuntimeError("httpx package not installed. Install it or use MockLLM")
+        self.key = api_key or os.getenv("OPENAI_API_KEY")
+        self.base_url = (base_url or os.getenv("OPENAI_BASE_URL") or "https://api.openai.com/v1").rstrip("/")
+        self.model = model
+        self._owns_client = client is None
+        if client is None:
+            headers = {"Authorization": f"Bearer {self.key}"} if self.key else {}
+            client = httpx.AsyncClient(
+                base_url=self.base_url,
+                headers=headers,
+                http2=HTTP2_AVAILABLE if http2 is None else http2,
+                timeout=httpx.Timeout(timeout, connect=connect_timeout),
+                limits=httpx.Limits(
+                    max_connections=max_connections,
+                    max_keepalive_connections=max_keepalive_connections,
+                    keepalive_expiry=keepalive_expiry,
+                ),
+                transport=transport,
+            )
+        self.client = client
+
+    def _payload(self, prompt: str, opts: Dict[str, Any]) -> Dict[str, Any]:
+        return {
+            "model": opts.get("model", self.model),
+            "messages": build_chat_messages(prompt, opts.get("mode")),
+            "max_tokens": opts.get("max_tokens", 512),
+            "temperature": opts.get("temperature", 0.2),
+        }
+
+    def _timeout(self, opts: Dict[str, Any]) -> Any:
+        # a request never outlives the deadline of the run it belongs to
+        timeout = _budget_timeout(opts.get("timeout"))
+        return httpx.USE_CLIENT_DEFAULT if timeout is None else timeout
+
+    async def generate(self, prompt: str, **opts) -> Dict[str, Any]:
+        resp = await self.client.post("/chat/completions", json=self._payload(prompt, opts), timeout=self._timeout(opts))
+        resp.raise_for_status()
+        data = resp.json()
+        text = data["choices"][0]["message"]["content"]
+        out = {"text": text}
+        if "usage" in data:
+            out["usage"] = data["usage"]
+        return out
+
+    async def generate_stream(self, prompt: str, **opts) -> AsyncIterator[str]:
+        payload = dict(self._payload(prompt, opts), stream=True)
+        async with self.client.stream("POST", "/chat/completions", json=payload, timeout=self._timeout(opts)) as resp:
+            resp.raise_for_status()
+            async for line in resp.aiter_lines():
+                if not line.startswith("data:"):
+                    continue
+                data = line[len("data:"):].strip()
+                if data == "[DONE]":
+                    break
+                choices = json.loads(data).get("choices") or [{}]
+                piece = (choices[0].get("delta") or {}).get("content")
+                if piece:
+                    yield piece
+
+    async def aclose(self) -> None:
+        if self._owns_client:
+            await self.client.aclose()
+
+
+class LatencyMockLLM(LLMAdapter):
+    """Wrap an adapter (MockLLM by default) and make it behave like a remote model: slow, variable and fallible.
+
+    Each call waits for a time-to-first-token drawn from `distribution`:
+    - "fixed": always `latency` seconds
+    - "lognormal": median `latency`, shape `sigma` (a long right tail)
+    - "trace": replays the values in `trace` in order, cycling
+
+    and then for the reply's generation time at `tokens_per_second` (~4 characters per token; None means
+    instant). With probability `error_rate` a call fails with `LLMServiceError(error_status)` instead.
+    `time_scale` multiplies every delay so benchmarks can compress time; `seed` makes runs reproducible.
+    """
+
+    def __init__(self, inner: LLMAdapter = None, distribution: str = "lognormal", latency: float = 0.8,
+                 sigma: float = 0.6, trace: List[float] = None, max_latency: float = None,
+                 tokens_per_second: float = None, error_rate: float = 0.0, error_status: int = 503,
+                 time_scale: float = 1.0, seed: int = None):
+        if distribution not in ("fixed", "lognormal", "trace"):
+            raise ValueError(f"unknown latency distribution: {distribution}")
+        if distribution == "trace" and not trace:
+            raise ValueError("trace distribution needs a non-empty trace")
+        self.inner = inner or MockLLM()
+        self.distribution = distribution
+        self.latency = latency
+        self.sigma = sigma
+        self.trace = list(trace or [])
+        self.max_latency = max_latency
+        self.tokens_per_second = tokens_per_second
+        self.error_rate = error_rate
+        self.error_status = error_status
+        self.time_scale = time_scale
+        self._rng = random.Random(seed)
+        self._trace_pos = 0
+        self.calls = 0
+        self.errors = 0
+
+    def sample_latency(self) -> float:
+        if self.distribution == "fixed":
+            value = self.latency
+        elif self.distribution == "lognormal":
+            value = self._rng.lognormvariate(math.log(self.latency), self.sigma)
+        else:
+            value = self.trace[self._trace_pos % len(self.trace)]
+            self._trace_pos += 1
+        if self.max_latency is not None:
+            value = min(value, self.max_latency)
+        return value
+
+    def _generation_time(self, text: str) -> float:
+        if not self.tokens_per_second:
+            return 0.0
+        return (len(text) / 4.0) / self.tokens_per_second
+
+    async def _first_token(self) -> None:
+        self.calls += 1
+        delay = self.sample_latency()
+        failed = self._rng.random() < self.error_rate
+        await asyncio.sleep(delay * self.time_scale)
+        if failed:
+            self.errors += 1
+            raise LLMServiceError(f"mock backend error {self.error_status}", self.error_status)
+
+    async def generate(self, prompt: str, **opts) -> Dict[str, Any]:
+        await self._first_token()
+        resp = await self.inner.generate(prompt, **opts)
+        await asyncio.sleep(self._generation_time(resp.get("text", "")) * self.time_scale)
+        return resp
+
+    async def generate_stream(self, prompt: str, **opts) -> AsyncIterator[str]:
+        await self._first_token()
+        async for piece in self.inner.generate_stream(prompt, **opts):
+            yield piece
+            # pace the following chunk at the configured token throughput
+            await asyncio.sleep(self._generation_time(piece) * self.time_scale)
+
+
+def request_key(prompt: str, opts: Dict[str, Any], fields) -> str:
+    """Hash of a prompt plus the opts (among `fields`) that affect the reply."""
+    relevant = {k: opts.get(k) for k in fields if opts.get(k) is not None}
+    raw = json.dumps([prompt, relevant], sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+class CachingLLM(LLMAdapter):
+    """Wrap another adapter and cache `generate()` results by content.
+
+    The cache key is a hash of the prompt plus the opts that affect the output (`CACHE_KEY_OPTS`).
+    Lookups go to a bounded in-memory LRU first and then, if `db_path` is given, to a SQLite tier
+    that survives restarts. Entries in both tiers expire after `ttl` seconds; least recently used
+    disk entries are evicted once the tier exceeds `max_disk_entries` or `max_disk_bytes`. A disk hit
+    records its access time at most once per `touch_interval` seconds, so hot keys do not turn every
+    read into a write.
+    """
+
+    CACHE_KEY_OPTS = ("model", "temperature", "mode", "max_tokens")
+
+    def __init__(self, inner: LLMAdapter, max_entries: int = 1024, db_path: Optional[str] = None,
+                 ttl: Optional[float] = None, max_disk_entries: int = 100_000, max_disk_bytes: Optional[int] = None,
+                 touch_interval: float = 60.0):
+        self.inner = inner
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.max_disk_entries = max_disk_entries
+        self.max_disk_bytes = max_disk_bytes
+        self.touch_interval = touch_interval
+        # key -> (stored_at, response)
+        self._memory: "OrderedDict[str, tuple]" = OrderedDict()
+        self.stats = {"hits": 0, "disk_hits": 0, "misses": 0, "evictions": 0}
+        self._db = None
+        if db_path:
+            self._db = sqlite3.connect(db_path, check_same_thread=False)
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS llm_cache ("
+                "key TEXT PRIMARY KEY, value TEXT NOT NULL, size INTEGER NOT NULL, "
+                "created REAL NOT NULL, accessed REAL NOT NULL)"
+            )
+            self._db.execute("CREATE INDEX IF NOT EXISTS llm_cache_accessed ON llm_cache(accessed)")
+            self._db.commit()
+
+    def cache_key(self, prompt: str, **opts) -> str:
+        return request_key(prompt, opts, self.CACHE_KEY_OPTS)
+
+    async def generate(self, prompt: str, **opts) -> Dict[str, Any]:
+        key = self.cache_key(prompt, **opts)
+        cached = self._lookup(key)
+        if cached is not None:
+            return cached
+
+        self.stats["misses"] += 1
+        resp = await self.inner.generate(prompt, **opts)
+        self._store(key, resp)
+        return resp
+
+    def _lookup(self, key: str) -> Optional[Dict[str, Any]]:
+        entry = self._memory.get(key)
+        if entry is not None and (self.ttl is None or time.time() - entry[0] <= self.ttl):
+            self._memory.move_to_end(key)
+            self.stats["hits"] += 1
+            return dict(entry[1])
+
+        if self._db is not None:
+            row = self._disk_get(key)
+            if row is not None:
+                created, cached = row
+                self.stats["disk_hits"] += 1
+                # keep the disk entry's age, so the memory copy expires when the disk row does
+                self._remember(key, cached, created)
+                return dict(cached)
+        return None
+
+    def _store(self, key: str, resp: Dict[str, Any]) -> None:
+        self._remember(key, resp)
+        if self._db is not None:
+            self._disk_put(key, resp)
+
+    async def generate_stream(self, prompt: str, **opts) -> AsyncIterator[str]:
+        key = self.cache_key(prompt, **opts)
+        cached = self._lookup(key)
+        if cached is not None:
+            text = cached.get("text", "")
+            if text:
+                yield text
+            return
+
+        self.stats["misses"] += 1
+        parts = []
+        async for piece in self.inner.generate_stream(prompt, **opts):
+            parts.append(piece)
+            yield piece
+        self._store(key, {"text": "".join(parts)})
+
+    def _remember(self, key: str, resp: Dict[str, Any], stored_at: Optional[float] = None) -> None:
+        self._memory[key] = (time.time() if stored_at is None else stored_at, dict(resp))
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_entries:
+            self._memory.popitem(last=False)
+            self.stats["evictions"] += 1
+
+    def _disk_get(self, key: str) -> Optional[tuple]:
+        """`(created, response)` for a live disk entry, else None."""
+        row = self._db.execute("SELECT value, created, accessed FROM llm_cache WHERE key = ?", (key,)).fetchone()
+        if row is None:
+            return None
+        value, created, accessed = row
+        now = time.time()
+        if self.ttl is not None and now - created > self.ttl:
+            self._db.execute("DELETE FROM llm_cache WHERE key = ?", (key,))
+            self._db.commit()
+            return None
+        # LRU order only needs to be roughly right: skip the write if the key was touched recently
+        if now - accessed >= self.touch_interval:
+            self._db.execute("UPDATE llm_cache SET accessed = ? WHERE key = ?", (now, key))
+            self._db.commit()
+        return created, json.loads(value)
+
+    def _disk_put(self, key: str, resp: Dict[str, Any]) -> None:
+        value = json.dumps(resp, default=str)
+        now = time.time()
+        self._db.execute(
+            "INSERT OR REPLACE INTO llm_cache (key, value, size, created, accessed) VALUES (?, ?, ?, ?, ?)",
+            (key, value, len(value), now, now),
+        )
+        self._evict_disk(now)
+        self._db.commit()
+
+    def _evict_disk(self, now: float) -> None:
+        if self.ttl is not None:
+            self._db.execute("DELETE FROM llm_cache WHERE created < ?", (now - self.ttl,))
+        count, total = self._db.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM llm_cache").fetchone()
+        if self.max_disk_bytes is not None and total > self.max_disk_bytes:
+            # keep the most recently accessed rows that fit both limits; drop the rest in one statement
+            cur = self._db.execute(
+                "DELETE FROM llm_cache WHERE key IN (SELECT key FROM ("
+                "SELECT key, ROW_NUMBER() OVER w AS n, SUM(size) OVER w AS kept FROM llm_cache "
+                "WINDOW w AS (ORDER BY accessed DESC, key)) WHERE n > ? OR kept > ?)",
+                (self.max_disk_entries, self.max_disk_bytes),
+            )
+        elif count > self.max_disk_entries:
+            cur = self._db.execute(
+                "DELETE FROM llm_cache WHERE key IN (SELECT key FROM llm_cache ORDER BY accessed LIMIT ?)",
+                (count - self.max_disk_entries,),
+            )
+        else:
+            return
+        self.stats["evictions"] += cur.rowcount
+
+    def close(self) -> None:
+        if self._db is not None:
+            self._db.close()
+            self._db = None
+
+
+class CassetteMiss(LookupError):
+    """Raised in replay mode when the cassette holds no recording for a request."""
+
+
+class CassetteLLM(LLMAdapter):
+    """Record real LLM traffic to a cassette file and replay it offline.
+
+    Modes:
+    - "record": every call goes to `inner` and the reply is appended to the cassette
+    - "replay": calls are answered from the cassette only; an unknown request raises `CassetteMiss`
+    - "auto": replay what is recorded, record what is not
+
+    The cassette is JSON lines: a header, then one compact record per call holding the request hash (prompt +
+    `KEY_OPTS`), the reply text, usage, total latency and time to first token, and for streamed calls the chunk
+    sizes. Prompts are only stored with `store_prompts=True`. A sidecar `<path>.idx` maps each hash to the byte
+    offsets of its records, so replay loads only the index and reads a record with one seek; the
+    index is rewritten by `close()` and rebuilt by a scan when it is missing or stale. A request recorded
+    several times (e.g. the same ReAct prompt in different runs) replays its recordings in order, cycling.
+
+    With `replay_latency=True`, replies arrive after the recorded latency (streams: the recorded time to first
+    token, then the rest spread over the chunks), multiplied by `time_scale`.
+    """
+
+    KEY_OPTS = CachingLLM.CACHE_KEY_OPTS
+    VERSION = 1
+
+    def __init__(self, path: str, mode: str = "replay", inner: LLMAdapter = None, replay_latency: bool = False,
+                 time_scale: float = 1.0, store_prompts: bool = False):
+        if mode not in ("record", "replay", "auto"):
+            raise ValueError(f"unknown cassette mode: {mode}")
+        if mode != "replay" and inner is None:
+            raise ValueError(f"cassette mode {mode!r} needs an inner adapter to record from")
+        self.path = path
+        self.mode = mode
+        self.inner = inner
+        self.replay_latency = replay_latency
+        self.time_scale = time_scale
+        self.store_prompts = store_prompts
+        self.stats = {"hits": 0, "misses": 0, "recorded": 0}
+        # request hash -> byte offsets of its records, in recording order
+        self._index: Dict[str, List[int]] = {}
+        self._cursor: Dict[str, int] = {}
+        if not os.path.exists(path) and mode != "replay":
+            with open(path, "w", encoding="utf-8") as f:
+                f.write(json.dumps({"cassette": self.VERSION}) + "\n")
+        self._file = open(path, "r+b" if mode != "replay" else "rb")
+        if not self._load_index():
+            try:
+                self._save_index()
+            except OSError:
+                pass
+
+    def cache_key(self, prompt: str, **opts) -> str:
+        return request_key(prompt, opts, self.KEY_OPTS)
+
+    # -- index -------------------------------------------------------------------------------------------------
+
+    def _load_index(self) -> bool:
+        """Load the sidecar index; returns False if it had to be rebuilt from the cassette."""
+        size = os.fstat(self._file.fileno()).st_size
+        self._file.seek(max(0, size - 1))
+        complete = self._file.read(1) in (b"\n", b"")
+        try:
+            with open(self.path + ".idx", "r", encoding="utf-8") as f:
+                saved = json.load(f)
+            # an index that covers a torn last record still needs the rebuild below to cut it off
+            if saved.get("size") == size and complete:
+                self._index = saved["offsets"]
+                return True
+        except (OSError, ValueError, KeyError):
+            pass
+        # missing or stale (e.g. recording was interrupted): rebuild from the records
+        self._index = {}
+        self._file.seek(0)
+        offset = 0
+        for line in self._file:
+            if not line.endswith(b"\n"):
+                # a record torn by an interrupted recording: drop it so new records start on a fresh line
+                if self.mode != "replay":
+                    self._file.truncate(offset)
+                break
+            if line.startswith(b'{"k":'):
+                try:
+                    key = json.loads(line)["k"]
+                except (ValueError, KeyError):
+                    key = None
+                if key is not None:
+                    self._index.setdefault(key, []).append(offset)
+            offset += len(line)
+        return False
+
+    def _save_index(self) -> None:
+        size = os.fstat(self._file.fileno()).st_size
+        tmp = self.path + ".idx.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump({"size": size, "offsets": self._index}, f, separators=(",", ":"))
+        os.replace(tmp, self.path + ".idx")
+
+    def _read(self, key: str) -> Optional[Dict[str, Any]]:
+        offsets = self._index.get(key)
+        if not offsets:
+            return None
+        n = self._cursor.get(key, 0)
+        self._cursor[key] = n + 1
+        self._file.seek(offsets[n % len(offsets)])
+        return json.loads(self._file.readline())
+
+    def _append(self, key: str, prompt: str, record: Dict[str, Any]) -> None:
+        record = dict(k=key, **record)
+        if self.store_prompts:
+            record["p"] = prompt
+        line = (json.dumps(record, separators=(",", ":"), ensure_ascii=False) + "\n").encode("utf-8")
+        self._file.seek(0, os.SEEK_END)
+        offset = self._file.tell()
+        self._file.write(line)
+        self._file.flush()
+        self._index.setdefault(key, []).append(offset)
+        self.stats["recorded"] += 1
+
+    def _lookup(self, key: str) -> Optional[Dict[str, Any]]:
+        if self.mode == "record":
+            return None
+        record = self._read(key)
+        if record is None:
+            self.stats["misses"] += 1
+            if self.mode == "replay":
+                raise CassetteMiss(f"no recording for request {key[:12]} in {self.path}")
+            return None
+        self.stats["hits"] += 1
+        return record
+
+    async def _sleep(self, seconds: float) -> None:
+        if self.replay_latency and seconds > 0:
+            await asyncio.sleep(seconds * self.time_scale)
+
+    # -- adapter API -------------------------------------------------------------------------------------------
+
+    async def generate(self, prompt: str, **opts) -> Dict[str, Any]:
+        key = self.cache_key(prompt, **opts)
+        record = self._lookup(key)
+        if record is not None:
+            await self._sleep(record.get("l", 0.0))
+            out = {"text": record["t"]}
+            if record.get("u"):
+                out["usage"] = record["u"]
+            return out
+
+        start = time.monotonic()
+        resp = await self.inner.generate(prompt, **opts)
+        latency = time.monotonic() - start
+        entry = {"t": resp.get("text", ""), "l": round(latency, 4), "f": round(latency, 4)}
+        if resp.get("usage"):
+            entry["u"] = resp["usage"]
+        self._append(key, prompt, entry)
+        return resp
+
+    async def generate_stream(self, prompt: str, **opts) -> AsyncIterator[str]:
+        key = self.cache_key(prompt, **opts)
+        record = self._lookup(key)
+        if record is not None:
+            text = record["t"]
+            sizes = record.get("c") or [len(text)]
+            await self._sleep(record.get("f", record.get("l", 0.0)))
+            rest = max(0.0, record.get("l", 0.0) - record.get("f", record.get("l", 0.0)))
+            pos = 0
+            for n, size in enumerate(sizes):
+                if n:
+                    await self._sleep(rest / max(1, len(sizes) - 1))
+                yield text[pos:pos + size]
+                pos += size
+            return
+
+        start = time.monotonic()
+        first = None
+        parts: List[str] = []
+        async for piece in self.inner.generate_stream(prompt, **opts):
+            if first is None:
+                first = time.monotonic() - start
+            parts.append(piece)
+            yield piece
+        latency = time.monotonic() - start
+        self._append(key, prompt, {"t": "".join(parts), "l": round(latency, 4), "f": round(first or latency, 4),
+                                   "c": [len(p) for p in parts]})
+
+    def close(self) -> None:
+        if self._file is None:
+            return
+        if self.mode != "replay":
+            self._save_index()
+        self._file.close()
+        self._file = None
+
+
+class _Backend:
+    __slots__ = ("adapter", "name", "outstanding", "ewma", "calls", "errors", "wins", "cancelled")
+
+    def __init__(self, adapter: LLMAdapter, name: str):
+        self.adapter = adapter
+        self.name = name
+        self.outstanding = 0
+        self.ewma: Optional[float] = None
+        self.calls = 0
+        self.errors = 0
+        self.wins = 0
+        self.cancelled = 0
+
+    def observe(self, seconds: float, alpha: float) -> None:
+        self.ewma = seconds if self.ewma is None else alpha * seconds + (1 - alpha) * self.ewma
+
+    def state(self) -> Dict[str, Any]:
+        return {"name": self.name, "outstanding": self.outstanding, "ewma": self.ewma, "calls": self.calls,
+                "errors": self.errors, "wins": self.wins, "cancelled": self.cancelled}
+
+
+class RouterLLM(LLMAdapter):
+    """Spread calls over several backend adapters and hedge slow ones.
+
+    Routing `policy`:
+    - "least_outstanding": the backend with the fewest calls in flight (ties rotate)
+    - "ewma": the backend with the lowest latency EWMA, weighted by its calls in flight; backends without
+      samples yet are tried first
+
+    Hedging: if the first attempt has not answered (for streams: produced its first chunk) within
+    `hedge_delay()`, a duplicate goes to the next best backend and whichever answers first wins; the other call
+    is cancelled. The delay is the `hedge_percentile` of recent response times (`hedge_initial` until
+    `min_samples` have been seen), never below `hedge_min_delay`, so only the slow tail is duplicated. A
+    backend that fails is failed over to another one right away. `stats()` exposes per-backend state.
+    """
+
+    def __init__(self, backends: List[LLMAdapter], names: List[str] = None, policy: str = "ewma",
+                 hedge: bool = True, hedge_percentile: float = 0.95, hedge_initial: float = 1.0,
+                 hedge_min_delay: float = 0.01, min_samples: int = 20, window: int = 500, alpha: float = 0.2):
+        if not backends:
+            raise ValueError("RouterLLM needs at least one backend")
+        if policy not in ("least_outstanding", "ewma"):
+            raise ValueError(f"unknown routing policy: {policy}")
+        names = names or [f"{type(b).__name__}-{i}" for i, b in enumerate(backends)]
+        self.backends = [_Backend(b, n) for b, n in zip(backends, names)]
+        self.policy = policy
+        self.hedge = hedge
+        self.hedge_percentile = hedge_percentile
+        self.hedge_initial = hedge_initial
+        self.hedge_min_delay = hedge_min_delay
+        self.min_samples = min_samples
+        self.alpha = alpha
+        self._latencies: "deque[float]" = deque(maxlen=window)
+        self._rotation = 0
+        self.counters = {"calls": 0, "hedged": 0, "hedge_wins": 0, "failovers": 0}
+
+    def hedge_delay(self) -> float:
+        if len(self._latencies) < self.min_samples:
+            return max(self.hedge_min_delay, self.hedge_initial)
+        ordered = sorted(self._latencies)
+        value = ordered[min(len(ordered) - 1, int(self.hedge_percentile * len(ordered)))]
+        return max(self.hedge_min_delay, value)
+
+    def _pick(self, exclude=()) -> Optional[_Backend]:
+        candidates = [b for b in self.backends if b not in exclude]
+        if not candidates:
+            return None
+        self._rotation = (self._rotation + 1) % len(candidates)
+        candidates = candidates[self._rotation:] + candidates[:self._rotation]
+        if self.policy == "least_outstanding":
+            return min(candidates, key=lambda b: b.outstanding)
+        return min(candidates, key=lambda b: (b.ewma is not None, (b.ewma or 0.0) * (b.outstanding + 1)))
+
+    async def _attempt(self, backend: _Backend, call):
+        """Run `call(adapter)` on a backend, keeping its outstanding count and latency stats."""
+        backend.outstanding += 1
+        backend.calls += 1
+        start = time.monotonic()
+        try:
+            result = await call(backend.adapter)
+        except asyncio.CancelledError:
+            backend.cancelled += 1
+            # a cancelled loser took at least this long: count it so a slow backend stops looking fast
+            backend.observe(time.monotonic() - start, self.alpha)
+            raise
+        except Exception:
+            backend.errors += 1
+            raise
+        finally:
+            backend.outstanding -= 1
+        elapsed = time.monotonic() - start
+        backend.observe(elapsed, self.alpha)
+        self._latencies.append(elapsed)
+        return result
+
+    async def _race(self, call):
+        """Return `(backend, result)` of the first successful attempt, hedging and failing over as needed."""
+        self.counters["calls"] += 1
+        tried: List[_Backend] = []
+        hedges: List[_Backend] = []
+        tasks: Dict[asyncio.Task, _Backend] = {}
+
+        def launch() -> bool:
+            backend = self._pick(exclude=tried)
+            if backend is None:
+                return False
+            tried.append(backend)
+            tasks[asyncio.ensure_future(self._attempt(backend, call))] = backend
+            return True
+
+        launch()
+        error: Optional[BaseException] = None
+        try:
+            timeout = self.hedge_delay() if self.hedge else None
+            while tasks:
+                done, _ = await asyncio.wait(tasks, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+                if not done:
+                    # the attempt is in the slow tail: hedge once with another backend
+                    timeout = None
+                    if launch():
+                        hedges.append(tried[-1])
+                        self.counters["hedged"] += 1
+                    continue
+                for task in done:
+                    backend = tasks.pop(task)
+                    if task.exception() is None:
+                        backend.wins += 1
+                        if backend in hedges:
+                            self.counters["hedge_wins"] += 1
+                        return backend, task.result()
+                    error = task.exception()
+                if not tasks:
+                    # every attempt so far failed: fail over to a backend not tried yet
+                    if not launch():
+                        break
+                    self.counters["failovers"] += 1
+            raise error
+        finally:
+            for task in tasks:
+                task.cancel()
+            if tasks:
+                await asyncio.gather(*tasks, return_exceptions=True)
+
+    async def generate(self, prompt: str, **opts) -> Dict[str, Any]:
+        _, resp = await self._race(lambda adapter: adapter.generate(prompt, **opts))
+        return resp
+
+    async def generate_stream(self, prompt: str, **opts) -> AsyncIterator[str]:
+        async def first_chunk(adapter: LLMAdapter):
+            stream = adapter.generate_stream(prompt, **opts)
+            try:
+                return stream, await stream.__anext__()
+            except StopAsyncIteration:
+                return stream, None
+            except BaseException:
+                await stream.aclose()
+                raise
+
+        # the race is decided by time to first chunk; the winner's stream is then consumed as usual
+        _, (stream, piece) = await self._race(first_chunk)
+        try:
+            if piece is None:
+                return
+            yield piece
+            async for piece in stream:
+                yield piece
+        finally:
+            await stream.aclose()
+
+    def stats(self) -> Dict[str, Any]:
+        return dict(self.counters, hedge_delay=self.hedge_delay(), policy=self.policy,
+                    backends=[b.state() for b in self.backends])
@@ -0,0 +1,175 @@
+import math
+import threading
+from typing import Dict, Iterable, List, Optional, Tuple
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+LabelKey = Tuple[Tuple[str, str], ...]
+
+
+def _labels(labels: Dict[str, str]) -> LabelKey:
+    return tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+
+def _fmt_labels(key: LabelKey, extra: Iterable[Tuple[str, str]] = ()) -> str:
+    pairs = list(key) + list(extra)
+    if not pairs:
+        return ""
+    body = ",".join('{}="{}"'.format(k, v.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")) for k, v in pairs)
+    return "{" + body + "}"
+
+
+def _fmt_value(v: float) -> str:
+    if math.isinf(v):
+        return "+Inf" if v > 0 else "-Inf"
+    return repr(float(v)) if not float(v).is_integer() else str(int(v))
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, help: str):
+        self.name = name
+        self.help = help
+        self._lock = threading.Lock()
+
+    def render(self) -> List[str]:
+        return [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"] + self._samples()
+
+    def _samples(self) -> List[str]:
+        raise NotImplementedError()
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(self, name: str, help: str):
+        super().__init__(name, help)
+        self._values: Dict[LabelKey, float] = {}
+
+    def inc(self, amount: float = 1.0, **labels) -> None:
+        key = _labels(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def set_total(self, value: float, **labels) -> None:
+        """Mirror a total that is counted elsewhere (e.g. the scheduler's own counters)."""
+        with self._lock:
+            self._values[_labels(labels)] = value
+
+    def value(self, **labels) -> float:
+        return self._values.get(_labels(labels), 0.0)
+
+    def _samples(self) -> List[str]:
+        return [f"{self.name}{_fmt_labels(k)} {_fmt_value(v)}" for k, v in sorted(self._values.items())]
+
+
+class Gauge(_Metric):
+    kind = "gauge"
+
+    def __init__(self, name: str, help: str):
+        super().__init__(name, help)
+        self._values: Dict[LabelKey, float] = {}
+
+    def set(self, value: float, **labels) -> None:
+        with self._lock:
+            self._values[_labels(labels)] = value
+
+    def inc(self, amount: float = 1.0, **labels) -> None:
+        key = _labels(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def dec(self, amount: float = 1.0, **labels) -> None:
+        self.inc(-amount, **labels)
+
+    def value(self, **labels) -> float:
+        return self._values.get(_labels(labels), 0.0)
+
+    def _samples(self) -> List[str]:
+        return [f"{self.name}{_fmt_labels(k)} {_fmt_value(v)}" for k, v in sorted(self._values.items())]
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, help: str, buckets: Iterable[float] = DEFAULT_BUCKETS):
+        super().__init__(name, help)
+        self.buckets = tuple(sorted(buckets)) + (math.inf,)
+        # label key -> ([per-bucket counts], sum, count)
+        self._values: Dict[LabelKey, list] = {}
+
+    def observe(self, value: float, **labels) -> None:
+        key = _labels(labels)
+        with self._lock:
+            entry = self._values.get(key)
+            if entry is None:
+                entry = self._values[key] = [[0] * len(self.buckets), 0.0, 0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    entry[0][i] += 1
+                    break
+            entry[1] += value
+            entry[2] += 1
+
+    def count(self, **labels) -> int:
+        entry = self._values.get(_labels(labels))
+        return entry[2] if entry else 0
+
+    def _samples(self) -> List[str]:
+        lines = []
+        for key, (counts, total, n) in sorted(self._values.items()):
+            cumulative = 0
+            for bound, c in zip(self.buckets, counts):
+                cumulative += c
+                lines.append(f"{self.name}_bucket{_fmt_labels(key, [('le', _fmt_value(bound))])} {cumulative}")
+            lines.append(f"{self.name}_sum{_fmt_labels(key)} {_fmt_value(total)}")
+            lines.append(f"{self.name}_count{_fmt_labels(key)} {n}")
+        return lines
+
+
+class Registry:
+    """A set of metrics rendered together in the Prometheus text exposition format."""
+
+    def __init__(self):
+        self._metrics: Dict[str, _Metric] = {}
+
+    def _add(self, metric: _Metric) -> _Metric:
+        existing = self._metrics.get(metric.name)
+        if existing is not None:
+            return existing
+        self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name: str, help: str) -> Counter:
+        return self._add(Counter(name, help))
+
+    def gauge(self, name: str, help: str) -> Gauge:
+        return self._add(Gauge(name, help))
+
+    def histogram(self, name: str, help: str, buckets: Optional[Iterable[float]] = None) -> Histogram:
+        return self._add(Histogram(name, help, buckets or DEFAULT_BUCKETS))
+
+    def render(self) -> str:
+        lines: List[str] = []
+        for metric in self._metrics.values():
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+SPAN_SECONDS = REGISTRY.histogram("agent_span_duration_seconds", "Duration of traced operations by span name.")
+SPANS_IN_FLIGHT = REGISTRY.gauge("agent_spans_in_flight", "Traced operations currently running, by span name.")
+SPAN_ERRORS = REGISTRY.counter("agent_span_errors_total", "Traced operations that raised, by span name.")
+LLM_PROMPT_CHARS = REGISTRY.counter("agent_llm_prompt_chars_total", "Characters sent to the LLM.")
+LLM_RESPONSE_CHARS = REGISTRY.counter("agent_llm_response_chars_total", "Characters received from the LLM.")
+REACT_JSON_RETRIES = REGISTRY.counter("agent_react_json_retries_total", "ReAct re-prompts caused by invalid JSON.")
+REACT_REPLIES_REPAIRED = REGISTRY.counter("agent_react_replies_repaired_total",
+                                          "ReAct replies recovered locally instead of re-prompting, by repair.")
+REACT_ROUNDTRIPS_SAVED = REGISTRY.counter("agent_react_roundtrips_saved_total",
+                                          "LLM re-prompt round trips avoided by local reply repair.")
+REACT_BRANCHES = REGISTRY.counter("agent_react_branches_total",
+                                  "Speculative ReAct branches, by outcome (won, rejected, cancelled, ...).")
+REACT_SPECULATIVE_SECONDS_SAVED = REGISTRY.counter("agent_react_speculative_seconds_saved_total",
+                                                   "Estimated latency saved by speculative ReAct runs.")
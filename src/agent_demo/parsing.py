@@ -0,0 +1,247 @@
+import re
+import json
+from typing import Any, Dict, Optional, Tuple
+
+_WS = " \t\r\n"
+
+
+def _scan_string(buf: str, i: int) -> Optional[int]:
+    """Return the index just past the JSON string starting at buf[i] (a quote), or None if incomplete."""
+    j = i + 1
+    n = len(buf)
+    while j < n:
+        c = buf[j]
+        if c == "\\":
+            j += 2
+            continue
+        if c == '"':
+            return j + 1
+        j += 1
+    return None
+
+
+def _scan_value(buf: str, i: int) -> Optional[int]:
+    """Return the index just past the JSON value starting at buf[i], or None if it is not complete yet."""
+    c = buf[i]
+    if c == '"':
+        return _scan_string(buf, i)
+    if c in "{[":
+        depth = 0
+        j = i
+        n = len(buf)
+        while j < n:
+            c = buf[j]
+            if c == '"':
+                end = _scan_string(buf, j)
+                if end is None:
+                    return None
+                j = end
+                continue
+            if c in "{[":
+                depth += 1
+            elif c in "}]":
+                depth -= 1
+                if depth == 0:
+                    return j + 1
+            j += 1
+        return None
+    # number / true / false / null: complete once a delimiter follows
+    j = i
+    n = len(buf)
+    while j < n and buf[j] not in ",}]" + _WS:
+        j += 1
+    return j if j < n else None
+
+
+class IncrementalJSONObject:
+    """Parse a streamed JSON object and expose its top-level members as soon as each value is complete.
+
+    Feed text chunks with `feed()`; completed members accumulate in `members`. Leading text before the first
+    `{` (e.g. a markdown fence) is skipped. `failed` is set when the stream stops looking like a JSON object,
+    in which case callers should fall back to parsing the full reply.
+    """
+
+    def __init__(self):
+        self.buf = ""
+        self.members: Dict[str, Any] = {}
+        self.done = False
+        self.failed = False
+        self._pos = 0
+        self._started = False
+
+    def feed(self, chunk: str) -> Dict[str, Any]:
+        """Append a chunk and return the members completed by it."""
+        self.buf += chunk
+        if self.done or self.failed:
+            return {}
+        before = set(self.members)
+        self._advance()
+        return {k: v for k, v in self.members.items() if k not in before}
+
+    def _skip_ws(self, i: int) -> int:
+        while i < len(self.buf) and self.buf[i] in _WS:
+            i += 1
+        return i
+
+    def _advance(self) -> None:
+        buf = self.buf
+        if not self._started:
+            start = buf.find("{", self._pos)
+            if start < 0:
+                self._pos = len(buf)
+                return
+            self._started = True
+            self._pos = start + 1
+
+        while True:
+            i = self._skip_ws(self._pos)
+            if i < len(buf) and buf[i] == ",":
+                i = self._skip_ws(i + 1)
+            if i >= len(buf):
+                return
+            if buf[i] == "}":
+                self.done = True
+                self._pos = i + 1
+                return
+            if buf[i] != '"':
+                self.failed = True
+                return
+            key_end = _scan_string(buf, i)
+            if key_end is None:
+                return
+            j = self._skip_ws(key_end)
+            if j >= len(buf):
+                return
+            if buf[j] != ":":
+                self.failed = True
+                return
+            j = self._skip_ws(j + 1)
+            if j >= len(buf):
+                return
+            value_end = _scan_value(buf, j)
+            if value_end is None:
+                return
+            try:
+                key = json.loads(buf[i:key_end])
+                self.members[key] = json.loads(buf[j:value_end])
+            except ValueError:
+                self.failed = True
+                return
+            self._pos = value_end
+
+
+_FENCE_RE = re.compile(r"```[A-Za-z0-9_-]*[ \t]*\r?\n?(.*?)```", re.S)
+_PY_LITERALS = {"True": "true", "False": "false", "None": "null"}
+
+
+def _outside_strings(text: str, fix) -> str:
+    """Apply `fix` to every stretch of `text` that is not inside a JSON string literal."""
+    out = []
+    i = start = 0
+    n = len(text)
+    while i < n:
+        if text[i] == '"':
+            out.append(fix(text[start:i]))
+            end = _scan_string(text, i)
+            if end is None:
+                # unterminated string: leave the rest alone
+                out.append(text[i:])
+                return "".join(out)
+            out.append(text[i:end])
+            i = start = end
+            continue
+        i += 1
+    out.append(fix(text[start:]))
+    return "".join(out)
+
+
+def _drop_trailing_commas(segment: str) -> str:
+    return re.sub(r",(\s*[}\]])", r"\1", segment)
+
+
+def _python_literals(segment: str) -> str:
+    return re.sub(r"\b(True|False|None)\b", lambda m: _PY_LITERALS[m.group(1)], segment)
+
+
+def _candidates(text: str):
+    """Yield substrings of a model reply that may hold the JSON object, most likely first."""
+    stripped = text.strip()
+    yield "fenced", [m.group(1).strip() for m in _FENCE_RE.finditer(stripped)]
+    # the first balanced {...} block, skipping any prose around it
+    blocks = []
+    i = stripped.find("{")
+    while i >= 0:
+        end = _scan_value(stripped, i)
+        if end is None:
+            break
+        blocks.append(stripped[i:end])
+        i = stripped.find("{", end)
+    yield "extracted", blocks
+
+
+def repair_json_object(text: str) -> Tuple[Optional[Dict[str, Any]], Optional[str]]:
+    """Recover a JSON object from a sloppy model reply without another model call.
+
+    Handles markdown code fences, prose before/after the object, trailing commas and Python-style
+    `True`/`False`/`None`. Returns `(obj, repair)` where `repair` names the fix that worked ("fenced",
+    "extracted", with "+commas"/"+literals" appended when those were needed), or `(None, None)`.
+    """
+    for kind, pieces in _candidates(text):
+        for piece in pieces:
+            for fixes, suffix in (((), ""), ((_drop_trailing_commas,), "+commas"),
+                                  ((_drop_trailing_commas, _python_literals), "+literals")):
+                candidate = piece
+                for fix in fixes:
+                    candidate = _outside_strings(candidate, fix)
+                try:
+                    obj = json.loads(candidate)
+                except ValueError:
+                    continue
+                if isinstance(obj, dict):
+                    return obj, kind + suffix
+    return None, None
+
+
+REACT_KEYS = ("thought", "action", "action_input", "actions", "final_answer")
+
+
+def validate_react_reply(payload: Any) -> Optional[str]:
+    """Check a parsed ReAct reply against the expected shape. Returns an error message, or None if valid.
+
+    Schema: an object with at least one of `thought` (string|null), `action` (string|null),
+    `action_input` (object|string|null), `actions` (list of {action, action_input}) or `final_answer`.
+    """
+    if not isinstance(payload, dict):
+        return f"expected a JSON object, got {type(payload).__name__}"
+    if not any(k in payload for k in REACT_KEYS):
+        return "none of the keys " + ", ".join(REACT_KEYS) + " present"
+    for key in ("thought", "action"):
+        if payload.get(key) is not None and not isinstance(payload[key], str):
+            return f"{key} must be a string or null"
+    if payload.get("action_input") is not None and not isinstance(payload["action_input"], (dict, str)):
+        return "action_input must be an object, a string or null"
+    actions = payload.get("actions")
+    if actions is not None:
+        if not isinstance(actions, list):
+            return "actions must be a list"
+        for a in actions:
+            if not isinstance(a, dict) or not isinstance(a.get("action"), str):
+                return "each entry of actions needs a string action"
+    return None
+
+
+def parse_react_reply(text: str) -> Tuple[Optional[Dict[str, Any]], Optional[str]]:
+    """Parse a ReAct reply strictly, then through `repair_json_object`; only schema-valid objects count.
+
+    Returns `(payload, how)` with `how` in ("strict", a repair name) or `(None, None)` when unrecoverable.
+    """
+    try:
+        payload = json.loads(text)
+    except ValueError:
+        payload = None
+    if payload is not None and validate_react_reply(payload) is None:
+        return payload, "strict"
+    payload, repair = repair_json_object(text)
+    if payload is not None and validate_react_reply(payload) is None:
+        return payload, repair
+    return None, None
@@ -0,0 +1,275 @@
+import time
+import random
+import asyncio
+from typing import Any, AsyncIterator, Dict, Optional
+
+from .budget import current_budget
+from .history import CHARS_PER_TOKEN
+from .llm import LLMAdapter
+from .metrics import REGISTRY
+
+# statuses that mean "slow down": the limiter backs off and retries them
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+OVERLOAD_STATUSES = (429, 503)
+
+LIMITER_CONCURRENCY = REGISTRY.gauge("agent_llm_limiter_concurrency", "Adaptive LLM concurrency limit, by limiter.")
+LIMITER_INFLIGHT = REGISTRY.gauge("agent_llm_limiter_inflight", "LLM calls in flight through a limiter.")
+LIMITER_RETRIES = REGISTRY.counter("agent_llm_limiter_retries_total", "LLM calls retried after a retryable error.")
+
+
+class TokenBucket:
+    """Classic token bucket: `rate_per_minute` tokens refill continuously up to `capacity` (default: one
+    second's worth, at least 1). `acquire(n)` waits until `n` tokens are available; waiters are served in order."""
+
+    def __init__(self, rate_per_minute: float, capacity: Optional[float] = None):
+        self.rate = rate_per_minute / 60.0
+        self.capacity = capacity if capacity is not None else max(1.0, self.rate)
+        self.tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    async def acquire(self, amount: float = 1.0) -> float:
+        """Take `amount` tokens, waiting as needed. Returns the seconds waited.
+
+        A request bigger than the capacity waits for a full bucket and is then charged in full: the balance goes
+        into debt, which later callers wait out, so large requests still average out to the configured rate."""
+        needed = min(amount, self.capacity)
+        waited = 0.0
+        async with self._lock:
+            while True:
+                self._refill()
+                if self.tokens >= needed:
+                    self.tokens -= amount
+                    return waited
+                delay = (needed - self.tokens) / self.rate
+                waited += delay
+                await asyncio.sleep(delay)
+
+    def adjust(self, amount: float) -> None:
+        """Give back (positive) or charge extra (negative) tokens once the real cost of a call is known.
+        The balance may go negative, which delays later callers until the debt is paid off."""
+        self._refill()
+        self.tokens = min(self.capacity, self.tokens + amount)
+
+    def available(self) -> float:
+        self._refill()
+        return self.tokens
+
+
+class AdaptiveConcurrency:
+    """AIMD concurrency limit: +1 per `limit` successful calls (about +1 per round of calls in flight), and
+    multiplied by `decrease` on an overload error. Only errors from calls started after the last decrease
+    shrink the limit again, so one burst of 429s counts as a single congestion signal."""
+
+    def __init__(self, initial: int = 8, minimum: int = 1, maximum: int = 64, decrease: float = 0.5):
+        self.limit = float(initial)
+        self.minimum = minimum
+        self.maximum = maximum
+        self.decrease = decrease
+        self.inflight = 0
+        self._last_decrease = 0.0
+        self._cond = asyncio.Condition()
+
+    async def acquire(self) -> float:
+        """Wait for a slot; returns the monotonic start time to hand back to `release`."""
+        async with self._cond:
+            await self._cond.wait_for(lambda: self.inflight < int(self.limit))
+            self.inflight += 1
+        return time.monotonic()
+
+    async def release(self, started: float, outcome: str) -> None:
+        """`outcome` is "ok", "overload" or "error" (other failures leave the limit alone)."""
+        async with self._cond:
+            self.inflight -= 1
+            if outcome == "ok":
+                self.limit = min(self.maximum, self.limit + 1.0 / self.limit)
+            elif outcome == "overload" and started >= self._last_decrease:
+                self.limit = max(self.minimum, self.limit * self.decrease)
+                self._last_decrease = time.monotonic()
+            self._cond.notify_all()
+
+
+def error_status(exc: BaseException) -> Optional[int]:
+    """HTTP-style status of an LLM failure (LLMServiceError, openai 0.x errors, httpx HTTPStatusError), if any."""
+    status = getattr(exc, "status_code", None)
+    if status is None:
+        # openai 0.x (used by OpenAIAdapter) puts it in `http_status`
+        status = getattr(exc, "http_status", None)
+    if status is None:
+        response = getattr(exc, "response", None)
+        status = getattr(response, "status_code", None)
+    return status
+
+
+def _retry_after(exc: BaseException) -> Optional[float]:
+    headers = getattr(exc, "headers", None) or getattr(getattr(exc, "response", None), "headers", None) or {}
+    value = headers.get("retry-after") or headers.get("Retry-After")
+    try:
+        return float(value) if value is not None else None
+    except ValueError:
+        return None
+
+
+class RateLimiter:
+    """Client-side limits shared by every adapter (and run) that calls one provider.
+
+    Combines a requests-per-minute and a tokens-per-minute `TokenBucket` (either may be None) with an
+    `AdaptiveConcurrency` limit. Token cost is estimated up front from the prompt plus `max_tokens` (or
+    `reply_tokens`), charged in full (even past the bucket's burst) and corrected from the reply's `usage`
+    afterwards. Retryable failures (`RETRY_STATUSES`)
+    are retried up to `max_retries` times with full-jitter exponential backoff (at least any Retry-After the
+    provider sent), never past the current run's deadline. `state()` reports everything for monitoring.
+    """
+
+    def __init__(self, name: str = "default", requests_per_minute: Optional[float] = None,
+                 tokens_per_minute: Optional[float] = None, request_burst: Optional[float] = None,
+                 token_burst: Optional[float] = None, initial_concurrency: int = 8, min_concurrency: int = 1,
+                 max_concurrency: int = 64, max_retries: int = 4, base_delay: float = 0.5, max_delay: float = 30.0,
+                 reply_tokens: int = 256, seed: Optional[int] = None):
+        self.name = name
+        self.requests = TokenBucket(requests_per_minute, request_burst) if requests_per_minute else None
+        self.tokens = TokenBucket(tokens_per_minute, token_burst) if tokens_per_minute else None
+        self.concurrency = AdaptiveConcurrency(initial_concurrency, min_concurrency, max_concurrency)
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.reply_tokens = reply_tokens
+        self._rng = random.Random(seed)
+        self.counters = {"calls": 0, "retries": 0, "overloads": 0, "errors": 0, "wait_seconds": 0.0}
+        self._publish()
+
+    def estimate_tokens(self, prompt: str, opts: Dict[str, Any]) -> int:
+        return len(prompt) // CHARS_PER_TOKEN + int(opts.get("max_tokens") or self.reply_tokens)
+
+    async def _admit(self, estimate: int) -> float:
+        waited = 0.0
+        if self.requests is not None:
+            waited += await self.requests.acquire(1)
+        if self.tokens is not None:
+            waited += await self.tokens.acquire(estimate)
+        self.counters["wait_seconds"] += waited
+        return await self.concurrency.acquire()
+
+    def _settle(self, estimate: int, prompt: str, resp: Optional[Dict[str, Any]]) -> None:
+        if self.tokens is None or resp is None:
+            return
+        usage = resp.get("usage") or {}
+        actual = usage.get("total_tokens")
+        if actual is None:
+            actual = (len(prompt) + len(resp.get("text", ""))) // CHARS_PER_TOKEN
+        self.tokens.adjust(estimate - actual)
+
+    def backoff(self, attempt: int, exc: BaseException) -> float:
+        delay = self._rng.uniform(0, min(self.max_delay, self.base_delay * (2 ** attempt)))
+        return max(delay, _retry_after(exc) or 0.0)
+
+    async def _retry_wait(self, attempt: int, exc: BaseException) -> bool:
+        """Sleep before retry `attempt`; False if the error is not retryable or no retry fits the deadline."""
+        if attempt >= self.max_retries or error_status(exc) not in RETRY_STATUSES:
+            return False
+        delay = self.backoff(attempt, exc)
+        budget = current_budget()
+        if budget is not None and budget.remaining() is not None and budget.remaining() <= delay:
+            return False
+        self.counters["retries"] += 1
+        LIMITER_RETRIES.inc(limiter=self.name)
+        await asyncio.sleep(delay)
+        return True
+
+    def _outcome(self, exc: BaseException) -> str:
+        if error_status(exc) in OVERLOAD_STATUSES:
+            self.counters["overloads"] += 1
+            return "overload"
+        self.counters["errors"] += 1
+        return "error"
+
+    async def call(self, prompt: str, opts: Dict[str, Any], make_call) -> Dict[str, Any]:
+        """Run `make_call()` (a coroutine factory for one LLM request) under the limits, with retries."""
+        self.counters["calls"] += 1
+        estimate = self.estimate_tokens(prompt, opts)
+        attempt = 0
+        while True:
+            started = await self._admit(estimate)
+            self._publish()
+            try:
+                resp = await make_call()
+            except asyncio.CancelledError:
+                await self.concurrency.release(started, "cancelled")
+                raise
+            except Exception as e:
+                await self.concurrency.release(started, self._outcome(e))
+                self._publish()
+                if not await self._retry_wait(attempt, e):
+                    raise
+                attempt += 1
+                continue
+            await self.concurrency.release(started, "ok")
+            self._settle(estimate, prompt, resp)
+            self._publish()
+            return resp
+
+    async def stream(self, prompt: str, opts: Dict[str, Any], make_stream) -> AsyncIterator[str]:
+        """Stream `make_stream()` under the limits; failures before the first chunk are retried."""
+        self.counters["calls"] += 1
+        estimate = self.estimate_tokens(prompt, opts)
+        attempt = 0
+        while True:
+            started = await self._admit(estimate)
+            self._publish()
+            parts = []
+            outcome = "cancelled"
+            failure = None
+            try:
+                async for piece in make_stream():
+                    parts.append(piece)
+                    yield piece
+                outcome = "ok"
+            except Exception as e:
+                outcome = self._outcome(e)
+                if parts:
+                    raise
+                failure = e
+            finally:
+                await self.concurrency.release(started, outcome)
+                self._publish()
+            if failure is None:
+                self._settle(estimate, prompt, {"text": "".join(parts)})
+                return
+            # the slot is released before backing off, as in `call`
+            if not await self._retry_wait(attempt, failure):
+                raise failure
+            attempt += 1
+
+    def _publish(self) -> None:
+        LIMITER_CONCURRENCY.set(self.concurrency.limit, limiter=self.name)
+        LIMITER_INFLIGHT.set(self.concurrency.inflight, limiter=self.name)
+
+    def state(self) -> Dict[str, Any]:
+        return dict(
+            self.counters,
+            name=self.name,
+            concurrency_limit=round(self.concurrency.limit, 3),
+            inflight=self.concurrency.inflight,
+            requests_available=self.requests.available() if self.requests is not None else None,
+            tokens_available=self.tokens.available() if self.tokens is not None else None,
+        )
+
+
+class RateLimitedLLM(LLMAdapter):
+    """Send an adapter's calls through a (possibly shared) `RateLimiter`."""
+
+    def __init__(self, inner: LLMAdapter, limiter: RateLimiter = None, **limits):
+        self.inner = inner
+        self.limiter = limiter or RateLimiter(**limits)
+
+    async def generate(self, prompt: str, **opts) -> Dict[str, Any]:
+        return await self.limiter.call(prompt, opts, lambda: self.inner.generate(prompt, **opts))
+
+    async def generate_stream(self, prompt: str, **opts) -> AsyncIterator[str]:
+        async for piece in self.limiter.stream(prompt, opts, lambda: self.inner.generate_stream(prompt, **opts)):
+            yield piece
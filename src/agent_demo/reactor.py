@@ -1,6 +1,52 @@
-import json
+import re
+import time
 import asyncio
-from typing import Dict, Any, Callable
+from typing import Dict, Any, Callable, List, Optional, Set, Tuple, Union
+from .history import PromptHistory
+from .parsing import IncrementalJSONObject, parse_react_reply
+from .tools import MemoizingToolRegistry, ToolExecutor
+from .budget import BudgetExceeded, RunBudget, current_budget, use_budget
+from .metrics import (LLM_PROMPT_CHARS, LLM_RESPONSE_CHARS, REACT_BRANCHES, REACT_JSON_RETRIES,
+                      REACT_REPLIES_REPAIRED, REACT_ROUNDTRIPS_SAVED, REACT_SPECULATIVE_SECONDS_SAVED)
+from .tracing import Span, attach_span, span
+
+# keys of a speculative variant that are not LLM options
+_VARIANT_KEYS = ("name", "prompt_suffix")
+
+
+def accept_answer(pattern: Optional[str] = None, min_chars: int = 1) -> Callable[[Dict[str, Any]], bool]:
+    """Acceptance check for `run_speculative`: a final answer of at least `min_chars` characters that matches
+    `pattern` (searched as a regular expression), if one is given."""
+    regex = re.compile(pattern) if pattern else None
+
+    def accept(result: Dict[str, Any]) -> bool:
+        answer = result.get("final_answer")
+        if not isinstance(answer, str) or len(answer.strip()) < min_chars:
+            return False
+        return regex is None or bool(regex.search(answer))
+
+    return accept
+
+
+def speculative_variants(variants: Union[int, List[Dict[str, Any]]]) -> List[Dict[str, Any]]:
+    """Normalize branch variants; an int n means n branches on a ladder of temperatures from 0.2 to 1.0."""
+    if isinstance(variants, int):
+        return [{"temperature": round(0.2 + 0.8 * i / max(1, variants - 1), 2)} for i in range(variants)]
+    return [dict(v) for v in variants]
+
+
+class _BranchEvents:
+    """Queue proxy that tags a speculative branch's events with its index; its final event becomes branch_end."""
+
+    def __init__(self, queue: "asyncio.Queue", branch: int):
+        self.queue = queue
+        self.branch = branch
+
+    async def put(self, event: Dict[str, Any]) -> None:
+        event = dict(event, branch=self.branch)
+        if event.get("type") == "final":
+            event["type"] = "branch_end"
+        await self.queue.put(event)
 
 
 class ReActAgent:
@@ -9,92 +55,378 @@ class ReActAgent:
     The agent expects the LLM to return a JSON string like:
     {"thought": "...", "action": "search", "action_input": {"query":"..."}, "final_answer": null}
 
+    To request several independent tool calls in one turn, the reply may instead carry
+    "actions": [{"action": "search", "action_input": {...}}, ...]; these run concurrently through the
+    `ToolExecutor` (per-tool timeouts and concurrency limits) and their observations are appended to the
+    history in the order the actions were listed.
+
+    The history is kept by a `PromptHistory`; `history_budget` (characters of history) and `history_strategy`
+    ("truncate", "summarize" or a callable) bound how large the prompt can grow. By default it is unbounded.
+
     The controller will invoke the matching tool (from tools dict) and feed observation back to the agent until
     a `final_answer` is returned or max_iters is reached.
+
+    When an event_queue is given and `stream_tokens` is true, replies are streamed with `llm.generate_stream`,
+    forwarded as token events, and parsed incrementally so the tool is dispatched as soon as `action` and
+    `action_input` are complete rather than after the whole reply has arrived.
+
+    Replies that are not strict JSON (markdown fences, prose around the object, trailing commas) are repaired
+    locally by `parse_react_reply`; the model is only re-prompted when that fails. `parse_stats` counts strict
+    parses, local repairs and re-prompts.
+
+    `llm_opts` (e.g. temperature) are passed to every LLM call. `run_speculative` runs several variants of the
+    loop at once and keeps the first acceptable answer.
     """
 
-    def __init__(self, llm, tools: Dict[str, Callable[..., Any]], max_iters: int = 6):
+    def __init__(self, llm, tools: Dict[str, Callable[..., Any]], max_iters: int = 6, stream_tokens: bool = True,
+                 executor: ToolExecutor = None, history_budget: Optional[int] = None,
+                 history_strategy: Union[str, Callable[[List[str]], str]] = "truncate",
+                 llm_opts: Optional[Dict[str, Any]] = None):
         self.llm = llm
         self.tools = tools
         self.max_iters = max_iters
+        self.stream_tokens = stream_tokens
+        self.executor = executor or ToolExecutor()
+        self.history_budget = history_budget
+        self.history_strategy = history_strategy
+        self.parse_stats = {"strict": 0, "fenced": 0, "extracted": 0, "reprompts": 0}
+        self.llm_opts = dict(llm_opts or {})
+        # progress counters, read by run_speculative for branches it had to cancel
+        self.llm_calls = 0
+        self.iterations = 0
 
-    async def run(self, prompt: str, context: Dict[str, Any] = None, event_queue: "asyncio.Queue" = None) -> Dict[str, Any]:
+    async def run(self, prompt: str, context: Dict[str, Any] = None, event_queue: "asyncio.Queue" = None,
+                  budget: Optional[RunBudget] = None) -> Dict[str, Any]:
         """Run the ReAct loop. If event_queue is provided, push events as dicts into it for streaming.
 
         Events pushed:
+        - {"type": "token", "text": str} (streaming only)
         - {"type": "thought", "thought": str}
         - {"type": "action", "action": str, "action_input": obj}
         - {"type": "observation", "observation": str}
         - {"type": "final", "final_answer": str}
+
+        `budget` (default: the budget of the enclosing run, see `use_budget`) bounds the loop by time and cost:
+        no new iteration starts once it is spent or too little time is left for another LLM call, and calls in
+        flight at the deadline are cancelled. The result then has reason "budget_exhausted" and a `stop_reason`.
         """
-        context = context or {}
-        history = []
+        budget = budget or current_budget()
+        with use_budget(budget), span("react.run", max_iters=self.max_iters) as run_span:
+            try:
+                return await self._run(prompt, event_queue, run_span, budget)
+            except BudgetExceeded as e:
+                return await self._budget_stop(e.reason, run_span.attributes.get("iterations", 0),
+                                               event_queue, run_span)
+
+    async def run_speculative(self, prompt: str, variants: Union[int, List[Dict[str, Any]]],
+                              accept: Optional[Callable[[Dict[str, Any]], bool]] = None,
+                              event_queue: "asyncio.Queue" = None,
+                              budget: Optional[RunBudget] = None) -> Dict[str, Any]:
+        """Run one ReAct branch per variant concurrently and return the first result that `accept` approves
+        (default: any non-empty final answer); the other branches are cancelled at that point.
+
+        A variant is a dict of LLM options (e.g. {"temperature": 0.7}) plus an optional "prompt_suffix" appended
+        to the prompt and a "name"; an int n means n branches with temperatures from 0.2 to 1.0. Branches share
+        one memoizing view of the tools, so a tool call made by several branches runs once.
+
+        Branch events carry "branch": index, and each branch's own final event is sent as "branch_end"; one
+        "final" event follows for the chosen result. If no branch is accepted, the earliest finished branch with
+        an answer (else the earliest finished branch) is returned. The result's "speculation" reports per-branch
+        status, total and extra LLM calls, shared tool results and `latency_saved_estimate`: the time branch 0
+        alone would have taken (measured if it finished, else its elapsed time plus one more iteration at its
+        average pace) minus the speculative run's elapsed time.
+        """
+        variants = speculative_variants(variants)
+        accept = accept or accept_answer()
+        budget = budget or current_budget()
+        tools = MemoizingToolRegistry(self.tools, ttl=float("inf"))
+        agents = [
+            ReActAgent(self.llm, tools, max_iters=self.max_iters, stream_tokens=self.stream_tokens,
+                       executor=self.executor, history_budget=self.history_budget,
+                       history_strategy=self.history_strategy,
+                       llm_opts=dict(self.llm_opts, **{k: v for k, v in variant.items() if k not in _VARIANT_KEYS}))
+            for variant in variants
+        ]
+        with use_budget(budget), span("react.speculate", branches=len(agents)) as spec_span:
+            start = time.monotonic()
+            tasks = {}
+            for n, (agent, variant) in enumerate(zip(agents, variants)):
+                queue = _BranchEvents(event_queue, n) if event_queue is not None else None
+                branch_prompt = prompt + variant.get("prompt_suffix", "")
+                tasks[asyncio.ensure_future(agent.run(branch_prompt, event_queue=queue, budget=budget))] = n
+
+            finished: Dict[int, Tuple[float, Any]] = {}
+            accepted = set()
+            winner = None
+            pending = set(tasks)
+            try:
+                while pending and winner is None:
+                    done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                    for task in sorted(done, key=tasks.get):
+                        n = tasks[task]
+                        outcome = task.exception() or task.result()
+                        finished[n] = (time.monotonic() - start, outcome)
+                        if not isinstance(outcome, BaseException) and accept(outcome):
+                            accepted.add(n)
+                            winner = n if winner is None else winner
+            finally:
+                for task in pending:
+                    task.cancel()
+                await asyncio.gather(*pending, return_exceptions=True)
+                # shared tool calls only the cancelled branches were waiting for
+                tools.cancel_inflight()
+            elapsed = time.monotonic() - start
+
+            chosen = winner
+            if chosen is None:
+                ok = [n for n in sorted(finished, key=lambda n: finished[n][0])
+                      if not isinstance(finished[n][1], BaseException)]
+                if not ok:
+                    raise finished[min(finished)][1]
+                chosen = next((n for n in ok if finished[n][1].get("final_answer")), ok[0])
+
+            report = self._speculation_report(agents, variants, finished, accepted, winner, chosen, elapsed, tools)
+            spec_span.set(winner=winner, llm_calls=report["llm_calls"])
+            result = dict(finished[chosen][1], branch=chosen, speculation=report)
+            if event_queue is not None:
+                await event_queue.put(attach_span(dict(result, type="final"), spec_span))
+            return result
+
+    @staticmethod
+    def _speculation_report(agents: List["ReActAgent"], variants: List[Dict[str, Any]],
+                            finished: Dict[int, Tuple[float, Any]], accepted: Set[int], winner: Optional[int],
+                            chosen: int, elapsed: float, tools: MemoizingToolRegistry) -> Dict[str, Any]:
+        branches = []
+        for n, (agent, variant) in enumerate(zip(agents, variants)):
+            if n not in finished:
+                status = "cancelled"
+            elif isinstance(finished[n][1], BaseException):
+                status = "error"
+            elif n == winner:
+                status = "won"
+            else:
+                # finished in the same round as the winner, with or without an acceptable answer
+                status = "also_accepted" if n in accepted else "rejected"
+            REACT_BRANCHES.inc(outcome=status)
+            branches.append({
+                "branch": n,
+                "variant": variant,
+                "status": status,
+                "iterations": agent.iterations,
+                "llm_calls": agent.llm_calls,
+                "seconds": round(finished[n][0], 4) if n in finished else None,
+            })
+
+        primary = agents[0]
+        if 0 in finished:
+            baseline = finished[0][0]
+        else:
+            # branch 0 had not finished: it needed at least one more iteration at its average pace
+            baseline = elapsed + elapsed / max(1, primary.iterations)
+        saved = baseline - elapsed
+        if saved > 0:
+            REACT_SPECULATIVE_SECONDS_SAVED.inc(saved)
+
+        llm_calls = sum(a.llm_calls for a in agents)
+        return {
+            "winner": winner,
+            "accepted": winner is not None,
+            "elapsed": round(elapsed, 4),
+            "llm_calls": llm_calls,
+            "extra_llm_calls": llm_calls - agents[chosen].llm_calls,
+            "tool_calls": tools.stats["misses"],
+            "shared_tool_results": tools.stats["hits"] + tools.stats["coalesced"],
+            "latency_saved_estimate": round(saved, 4) or 0.0,
+            "branches": branches,
+        }
+
+    async def _budget_stop(self, reason: str, iterations: int, event_queue: "asyncio.Queue",
+                           run_span: Span) -> Dict[str, Any]:
+        result = {"final_answer": None, "reason": "budget_exhausted", "stop_reason": reason, "iterations": iterations}
+        if event_queue is not None:
+            await event_queue.put(attach_span(dict(result, type="final"), run_span))
+        return result
+
+    async def _run(self, prompt: str, event_queue: "asyncio.Queue", run_span: Span,
+                   budget: Optional[RunBudget]) -> Dict[str, Any]:
+        history = PromptHistory(prompt, budget=self.history_budget, strategy=self.history_strategy)
         for i in range(self.max_iters):
-            # Construct the prompt: include history of observations
-            full_prompt = prompt + "\n\nHistory:\n" + "\n".join(history)
-            resp = await self.llm.generate(full_prompt)
-            text = resp.get("text", "")
-            # try to parse JSON, with a simple re-prompt-on-invalid-JSON fallback
-            payload = None
-            attempts = 0
-            while attempts < 2 and payload is None:
-                try:
-                    payload = json.loads(text)
-                except Exception:
+            reason = budget.should_stop() if budget is not None else None
+            if reason is not None:
+                return await self._budget_stop(reason, i, event_queue, run_span)
+            run_span.set(iterations=i + 1)
+            self.iterations = i + 1
+            with span("react.iteration", iteration=i + 1) as iteration_span:
+                # Construct the prompt: include history of observations
+                full_prompt = history.render()
+                early = None
+                if event_queue is not None and self.stream_tokens and hasattr(self.llm, "generate_stream"):
+                    text, early = await self._stream_reply(full_prompt, event_queue, i + 1)
+                else:
+                    text = await self._generate(full_prompt)
+                # parse the reply, repairing common formatting slips locally; re-prompt only if that fails
+                payload = self._parse_reply(text, iteration_span)
+                attempts = 0
+                while attempts < 2 and payload is None:
                     # re-prompt the model to return valid JSON only
                     attempts += 1
                     warn = (
                         "Your previous reply was not valid JSON. "
                         "Please respond with ONLY valid JSON with keys: thought (string), action (string|null), action_input (object|null), final_answer (string|null)."
                     )
-                    resp = await self.llm.generate(full_prompt + "\n\n" + warn)
-                    text = resp.get("text", "")
-            if payload is None:
-                # still invalid — return the raw text as final answer for debugging
+                    iteration_span.add("json_retries")
+                    REACT_JSON_RETRIES.inc()
+                    self.parse_stats["reprompts"] += 1
+                    text = await self._generate(full_prompt + "\n\n" + warn, reprompt=True)
+                    payload = self._parse_reply(text, iteration_span)
+                if early is not None and (payload is None or payload.get("final_answer")
+                                          or self._parse_actions(payload)[:1] != [early[0]]):
+                    # the completed reply does not confirm the speculatively dispatched call
+                    early[1].cancel()
+                    early = None
+                if payload is None:
+                    # still invalid — return the raw text as final answer for debugging
+                    if event_queue is not None:
+                        await event_queue.put(attach_span({"type": "final", "final_answer": text, "iterations": i + 1, "note": "invalid_json"}, run_span))
+                    return {"final_answer": text, "iterations": i + 1, "note": "invalid_json"}
+
+                thought = payload.get("thought")
+                actions = self._parse_actions(payload)
+                final_answer = payload.get("final_answer")
+
+                # emit thought event
                 if event_queue is not None:
-                    await event_queue.put({"type": "final", "final_answer": text, "iterations": i + 1, "note": "invalid_json"})
-                return {"final_answer": text, "iterations": i + 1, "note": "invalid_json"}
+                    await event_queue.put({"type": "thought", "thought": thought, "iteration": i + 1})
 
-            thought = payload.get("thought")
-            action = payload.get("action")
-            action_input = payload.get("action_input")
-            final_answer = payload.get("final_answer")
+                if final_answer:
+                    if event_queue is not None:
+                        await event_queue.put(attach_span({"type": "final", "final_answer": final_answer, "iteration": i + 1}, run_span))
+                    return {"final_answer": final_answer, "iterations": i + 1}
 
-            # emit thought event
-            if event_queue is not None:
-                await event_queue.put({"type": "thought", "thought": thought, "iteration": i + 1})
+                if not actions:
+                    # nothing to do
+                    if event_queue is not None:
+                        await event_queue.put(attach_span({"type": "final", "final_answer": None, "reason": "no action", "iteration": i + 1}, run_span))
+                    return {"final_answer": None, "reason": "no action", "iterations": i + 1}
 
-            if final_answer:
-                if event_queue is not None:
-                    await event_queue.put({"type": "final", "final_answer": final_answer, "iteration": i + 1})
-                return {"final_answer": final_answer, "iterations": i + 1}
+                observations = await self._run_actions(actions, early, event_queue, i + 1)
 
-            if not action:
-                # nothing to do
-                if event_queue is not None:
-                    await event_queue.put({"type": "final", "final_answer": None, "reason": "no action", "iteration": i + 1})
-                return {"final_answer": None, "reason": "no action", "iterations": i + 1}
+                # Append observations to history for next prompt, in the order the actions were requested
+                if len(observations) == 1:
+                    history.append(f"Observation: {observations[0]}")
+                else:
+                    for n, ((action, _), observation) in enumerate(zip(actions, observations), start=1):
+                        history.append(f"Observation {n} ({action}): {observation}")
+
+        if event_queue is not None:
+            await event_queue.put(attach_span({"type": "final", "final_answer": None, "reason": "max_iters_reached", "iterations": self.max_iters}, run_span))
+        return {"final_answer": None, "reason": "max_iters_reached", "iterations": self.max_iters}
+
+    def _parse_reply(self, text: str, iteration_span: Span) -> Optional[Dict[str, Any]]:
+        payload, how = parse_react_reply(text)
+        if how is None:
+            return None
+        self.parse_stats[how.split("+")[0]] += 1
+        if how != "strict":
+            # a reply that needed local repair would otherwise have cost a re-prompt round trip
+            iteration_span.set(reply_repair=how)
+            REACT_REPLIES_REPAIRED.inc(repair=how)
+            REACT_ROUNDTRIPS_SAVED.inc()
+        return payload
+
+    @staticmethod
+    def _parse_actions(payload: Dict[str, Any]) -> List[Tuple[Any, Any]]:
+        """Return the requested tool calls as (action, action_input) pairs."""
+        many = payload.get("actions")
+        if isinstance(many, list) and many:
+            return [(a.get("action"), a.get("action_input")) for a in many if isinstance(a, dict) and a.get("action")]
+        if payload.get("action"):
+            return [(payload.get("action"), payload.get("action_input"))]
+        return []
+
+    async def _run_actions(self, actions: List[Tuple[Any, Any]], early, event_queue: "asyncio.Queue",
+                           iteration: int) -> List[Any]:
+        """Run the requested tool calls concurrently and return their observations in request order."""
+        multi = len(actions) > 1
 
+        async def run_one(n: int, action: Any, action_input: Any) -> Any:
             tool = self.tools.get(action)
             if not tool:
                 observation = f"Unknown tool: {action}"
             else:
                 # emit action event
                 if event_queue is not None:
-                    await event_queue.put({"type": "action", "action": action, "action_input": action_input, "iteration": i + 1})
-                # Support async tool
-                if asyncio.iscoroutinefunction(tool):
-                    observation = await tool(action_input or {})
+                    ev = {"type": "action", "action": action, "action_input": action_input, "iteration": iteration}
+                    if multi:
+                        ev["index"] = n
+                    await event_queue.put(ev)
+                if early is not None and n == 0:
+                    observation = await early[1]
                 else:
-                    observation = tool(action_input or {})
+                    observation = await self._call_tool(action, tool, action_input)
 
             # emit observation event
             if event_queue is not None:
-                await event_queue.put({"type": "observation", "observation": observation, "iteration": i + 1})
+                ev = {"type": "observation", "observation": observation, "iteration": iteration}
+                if multi:
+                    ev.update(index=n, action=action)
+                await event_queue.put(ev)
+            return observation
 
-            # Append observation to history for next prompt
-            history.append(f"Observation: {observation}")
+        return list(await asyncio.gather(*(run_one(n, a, ai) for n, (a, ai) in enumerate(actions))))
 
-        if event_queue is not None:
-            await event_queue.put({"type": "final", "final_answer": None, "reason": "max_iters_reached", "iterations": self.max_iters})
-        return {"final_answer": None, "reason": "max_iters_reached", "iterations": self.max_iters}
+    async def _call_tool(self, name: str, tool: Callable[..., Any], action_input: Any) -> Any:
+        return await self.executor.call(name, tool, action_input)
+
+    async def _generate(self, prompt: str, **attrs) -> str:
+        budget = current_budget()
+        start = time.monotonic()
+        with span("llm.generate", prompt_chars=len(prompt), **attrs) as s:
+            self.llm_calls += 1
+            call = self.llm.generate(prompt, **self.llm_opts)
+            resp = await (budget.call(call) if budget is not None else call)
+            text = resp.get("text", "")
+            s.set(response_chars=len(text))
+        if budget is not None:
+            budget.charge_llm(prompt, text, resp.get("usage"), time.monotonic() - start)
+        LLM_PROMPT_CHARS.inc(len(prompt))
+        LLM_RESPONSE_CHARS.inc(len(text))
+        return text
+
+    async def _stream_reply(self, full_prompt: str, event_queue: "asyncio.Queue",
+                            iteration: int) -> Tuple[str, Optional[Tuple[Tuple[Any, Any], "asyncio.Future"]]]:
+        """Stream one reply, forwarding token events. Returns the full text and, if the tool call was
+        dispatched before the reply finished, `((action, action_input), task)`."""
+        budget = current_budget()
+        start = time.monotonic()
+        with span("llm.generate", prompt_chars=len(full_prompt), stream=True) as s:
+            self.llm_calls += 1
+            call = self._stream_reply_inner(full_prompt, event_queue, iteration)
+            text, early = await (budget.call(call) if budget is not None else call)
+            s.set(response_chars=len(text), early_dispatch=early is not None)
+        if budget is not None:
+            budget.charge_llm(full_prompt, text, None, time.monotonic() - start)
+        LLM_PROMPT_CHARS.inc(len(full_prompt))
+        LLM_RESPONSE_CHARS.inc(len(text))
+        return text, early
+
+    async def _stream_reply_inner(self, full_prompt: str, event_queue: "asyncio.Queue", iteration: int):
+        parser = IncrementalJSONObject()
+        early = None
+        try:
+            async for piece in self.llm.generate_stream(full_prompt, **self.llm_opts):
+                await event_queue.put({"type": "token", "text": piece, "iteration": iteration})
+                parser.feed(piece)
+                if early is None and not parser.failed:
+                    m = parser.members
+                    if m.get("action") and "action_input" in m and not m.get("final_answer"):
+                        tool = self.tools.get(m["action"])
+                        if tool:
+                            task = asyncio.ensure_future(self._call_tool(m["action"], tool, m["action_input"]))
+                            early = ((m["action"], m["action_input"]), task)
+        except BaseException:
+            # the reply never completed (provider error, deadline, cancellation): nobody will await the tool
+            if early is not None:
+                early[1].cancel()
+            raise
+        return parser.buf, early
@@ -0,0 +1,96 @@
+import json
+import asyncio
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+from .templating import precompile_workflow
+from .workflow import validate_workflow
+
+
+class WorkflowRegistry:
+    """Loads, validates and precompiles every workflow JSON file in a directory, keyed by workflow id.
+
+    Lookups with `get()` are plain dict reads. `refresh()` stats the files and reloads any whose mtime changed
+    (new files are added, deleted ones dropped); `watch()` runs it periodically in the background so request
+    handlers never touch the disk. A file that fails to load or validate keeps its previous good version and
+    the error is recorded in `errors`.
+    """
+
+    def __init__(self, directory: str, pattern: str = "*.json"):
+        self.directory = Path(directory)
+        self.pattern = pattern
+        self.errors: Dict[str, str] = {}
+        self._workflows: Dict[str, Dict[str, Any]] = {}
+        # path -> (mtime_ns, workflow id)
+        self._files: Dict[Path, tuple] = {}
+
+    def get(self, workflow_id: str) -> Dict[str, Any]:
+        """Return the workflow with this id. Raises KeyError if it is unknown."""
+        return self._workflows[workflow_id]
+
+    def ids(self) -> List[str]:
+        return sorted(self._workflows)
+
+    def __contains__(self, workflow_id: str) -> bool:
+        return workflow_id in self._workflows
+
+    def _load(self, path: Path) -> Dict[str, Any]:
+        with path.open("r", encoding="utf-8") as f:
+            workflow = json.load(f)
+        validate_workflow(workflow)
+        precompile_workflow(workflow)
+        workflow.setdefault("id", path.stem)
+        return workflow
+
+    def refresh(self) -> List[str]:
+        """Reload changed files and return the ids that were (re)loaded or removed."""
+        changed = []
+        seen = set()
+        for path in sorted(self.directory.glob(self.pattern)):
+            seen.add(path)
+            try:
+                mtime = path.stat().st_mtime_ns
+            except OSError:
+                continue
+            known = self._files.get(path)
+            if known is not None and known[0] == mtime:
+                continue
+            try:
+                workflow = self._load(path)
+            except Exception as e:
+                self.errors[str(path)] = f"{type(e).__name__}: {e}"
+                # remember the mtime so a broken file is not re-parsed until it changes again
+                self._files[path] = (mtime, known[1] if known else None)
+                continue
+            self.errors.pop(str(path), None)
+            if known is not None and known[1] not in (None, workflow["id"]):
+                self._workflows.pop(known[1], None)
+            self._workflows[workflow["id"]] = workflow
+            self._files[path] = (mtime, workflow["id"])
+            changed.append(workflow["id"])
+
+        for path in set(self._files) - seen:
+            _, workflow_id = self._files.pop(path)
+            self.errors.pop(str(path), None)
+            if workflow_id is not None:
+                self._workflows.pop(workflow_id, None)
+                changed.append(workflow_id)
+        return changed
+
+    async def watch(self, interval: float = 2.0) -> None:
+        """Call `refresh()` every `interval` seconds until cancelled."""
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                self.refresh()
+            except Exception:
+                # keep serving the last good set of workflows
+                pass
+
+
+def default_registry(directory: Optional[str] = None) -> WorkflowRegistry:
+    """Create and load a registry over the repository's `examples/` directory (or `directory`)."""
+    root = Path(directory) if directory else Path(__file__).resolve().parents[2] / "examples"
+    registry = WorkflowRegistry(str(root))
+    registry.refresh()
+    return registry
@@ -0,0 +1,195 @@
+import os
+import json
+import time
+import uuid
+import socket
+import asyncio
+import sqlite3
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, List, Optional, Tuple
+
+from .events import TERMINAL_EVENTS
+
+RUN_STATES = ("queued", "running", "finished")
+
+
+class SQLiteRunRegistry:
+    """Run ownership, cancel signalling and event relay shared by several server processes.
+
+    Every worker process opens the same SQLite file (WAL mode, so readers never block the writer) under its own
+    `worker_id`. The worker that admits a run `register`s it as owner and mirrors the run's events into the
+    database with `publish`; any other worker can then
+    - find out who owns a run and whether it is still going (`info`),
+    - ask the owner to cancel it (`request_cancel`); the owner's `maintain` loop picks the request up and
+      calls back into its local scheduler,
+    - relay the run's events to its own SSE clients (`relay`), with replay from a Last-Event-ID.
+
+    Workers heartbeat from `maintain`; a run whose owner has not been seen for `heartbeat_timeout` seconds is
+    reported as lost instead of being waited on forever. Events are buffered and written in batches every
+    `poll_interval` (terminal events immediately), so token streams do not cost one commit each.
+    """
+
+    def __init__(self, path: str, worker_id: Optional[str] = None, poll_interval: float = 0.1,
+                 heartbeat_timeout: float = 10.0, retention: float = 3600.0):
+        self.path = path
+        self.worker_id = worker_id or f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:6]}"
+        self.poll_interval = poll_interval
+        self.heartbeat_timeout = heartbeat_timeout
+        self.retention = retention
+        self._pending: List[Tuple[str, int, str]] = []
+        self._db = sqlite3.connect(path, check_same_thread=False, timeout=5.0)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.executescript(
+            "CREATE TABLE IF NOT EXISTS workers (worker_id TEXT PRIMARY KEY, pid INTEGER, heartbeat REAL NOT NULL);"
+            "CREATE TABLE IF NOT EXISTS runs (run_id TEXT PRIMARY KEY, owner TEXT NOT NULL, state TEXT NOT NULL, "
+            "cancel_requested INTEGER NOT NULL DEFAULT 0, created REAL NOT NULL, updated REAL NOT NULL);"
+            "CREATE INDEX IF NOT EXISTS runs_owner ON runs (owner, cancel_requested);"
+            "CREATE TABLE IF NOT EXISTS run_events (run_id TEXT NOT NULL, seq INTEGER NOT NULL, event TEXT NOT NULL, "
+            "PRIMARY KEY (run_id, seq));"
+        )
+        self.heartbeat()
+
+    # -- ownership ---------------------------------------------------------------------------------------------
+
+    def heartbeat(self) -> None:
+        self._db.execute("INSERT OR REPLACE INTO workers (worker_id, pid, heartbeat) VALUES (?, ?, ?)",
+                         (self.worker_id, os.getpid(), time.time()))
+        self._db.commit()
+
+    def register(self, run_id: str, state: str = "queued") -> None:
+        now = time.time()
+        self._db.execute(
+            "INSERT OR REPLACE INTO runs (run_id, owner, state, cancel_requested, created, updated) "
+            "VALUES (?, ?, ?, 0, ?, ?)", (run_id, self.worker_id, state, now, now))
+        self._db.commit()
+
+    def set_state(self, run_id: str, state: str) -> None:
+        if state not in RUN_STATES:
+            raise ValueError(f"unknown run state: {state}")
+        if state == "finished":
+            # make sure relays see every event before they see the run as finished
+            self.flush()
+        self._db.execute("UPDATE runs SET state = ?, updated = ? WHERE run_id = ?", (state, time.time(), run_id))
+        self._db.commit()
+
+    def info(self, run_id: str) -> Optional[Dict[str, Any]]:
+        """Owner and state of a run, plus whether the owning worker is still alive; None if unknown."""
+        row = self._db.execute(
+            "SELECT r.owner, r.state, r.cancel_requested, w.heartbeat FROM runs r "
+            "LEFT JOIN workers w ON w.worker_id = r.owner WHERE r.run_id = ?", (run_id,)).fetchone()
+        if row is None:
+            return None
+        owner, state, cancel_requested, heartbeat = row
+        return {
+            "run_id": run_id,
+            "owner": owner,
+            "state": state,
+            "local": owner == self.worker_id,
+            "cancel_requested": bool(cancel_requested),
+            "owner_alive": heartbeat is not None and time.time() - heartbeat < self.heartbeat_timeout,
+        }
+
+    # -- cancel signalling -------------------------------------------------------------------------------------
+
+    def request_cancel(self, run_id: str) -> Optional[Dict[str, Any]]:
+        """Flag an unfinished run for cancellation by its owner. Returns its `info()` or None if unknown."""
+        self._db.execute("UPDATE runs SET cancel_requested = 1, updated = ? WHERE run_id = ? AND state != 'finished' "
+                         "AND cancel_requested = 0", (time.time(), run_id))
+        self._db.commit()
+        return self.info(run_id)
+
+    def take_cancel_requests(self) -> List[str]:
+        """Runs owned by this worker with an undelivered cancel request (each is returned once)."""
+        rows = self._db.execute("SELECT run_id FROM runs WHERE owner = ? AND cancel_requested = 1",
+                                (self.worker_id,)).fetchall()
+        if rows:
+            self._db.executemany("UPDATE runs SET cancel_requested = 2 WHERE run_id = ?", rows)
+            self._db.commit()
+        return [r[0] for r in rows]
+
+    # -- event relay -------------------------------------------------------------------------------------------
+
+    def publish(self, run_id: str, seq: int, event: Dict[str, Any]) -> None:
+        """Mirror one event of a locally owned run (usable as a `RunEventHub` sink)."""
+        self._pending.append((run_id, seq, json.dumps(event, default=str)))
+        if event.get("type") in TERMINAL_EVENTS:
+            self.flush()
+
+    def flush(self) -> None:
+        if not self._pending:
+            return
+        batch, self._pending = self._pending, []
+        self._db.executemany("INSERT OR REPLACE INTO run_events (run_id, seq, event) VALUES (?, ?, ?)", batch)
+        self._db.commit()
+
+    def events_after(self, run_id: str, seq: int, limit: int = 500) -> List[Tuple[int, Dict[str, Any]]]:
+        rows = self._db.execute("SELECT seq, event FROM run_events WHERE run_id = ? AND seq > ? ORDER BY seq LIMIT ?",
+                                (run_id, seq, limit)).fetchall()
+        return [(s, json.loads(e)) for s, e in rows]
+
+    def last_seq(self, run_id: str) -> int:
+        row = self._db.execute("SELECT MAX(seq) FROM run_events WHERE run_id = ?", (run_id,)).fetchone()
+        return row[0] or 0
+
+    async def relay(self, run_id: str, last_id: Optional[int] = None) -> AsyncIterator[Tuple[int, Dict[str, Any]]]:
+        """Yield `(seq, event)` for a run owned by any worker, starting after `last_id` (default: only new
+        events), until a terminal event, the run finishing, or its owner disappearing."""
+        seq = self.last_seq(run_id) if last_id is None else last_id
+        while True:
+            # read the state before the events so nothing published in between is missed
+            info = self.info(run_id)
+            batch = self.events_after(run_id, seq)
+            for seq, event in batch:
+                yield seq, event
+                if event.get("type") in TERMINAL_EVENTS:
+                    return
+            if batch:
+                continue
+            if info is None or info["state"] == "finished":
+                return
+            if not info["owner_alive"]:
+                yield 0, {"type": "error", "run_id": run_id, "error": f"worker {info['owner']} is gone"}
+                return
+            await asyncio.sleep(self.poll_interval)
+
+    # -- housekeeping ------------------------------------------------------------------------------------------
+
+    def purge(self, older_than: Optional[float] = None) -> int:
+        """Delete finished runs (and their events) last updated more than `older_than` seconds ago."""
+        cutoff = time.time() - (self.retention if older_than is None else older_than)
+        old = self._db.execute("SELECT run_id FROM runs WHERE state = 'finished' AND updated < ?",
+                               (cutoff,)).fetchall()
+        if old:
+            self._db.executemany("DELETE FROM run_events WHERE run_id = ?", old)
+            self._db.executemany("DELETE FROM runs WHERE run_id = ?", old)
+            self._db.commit()
+        return len(old)
+
+    async def maintain(self, on_cancel: Callable[[str], Awaitable[Any]]) -> None:
+        """Background loop for the owning side: flush events, heartbeat, deliver cancel requests, purge."""
+        last_beat = last_purge = 0.0
+        while True:
+            self.flush()
+            now = time.monotonic()
+            if now - last_beat >= self.heartbeat_timeout / 4:
+                self.heartbeat()
+                last_beat = now
+            if now - last_purge >= 60.0:
+                self.purge()
+                last_purge = now
+            for run_id in self.take_cancel_requests():
+                await on_cancel(run_id)
+            await asyncio.sleep(self.poll_interval)
+
+    def close(self) -> None:
+        self.flush()
+        self._db.execute("DELETE FROM workers WHERE worker_id = ?", (self.worker_id,))
+        self._db.commit()
+        self._db.close()
+
+
+def open_run_registry(location: Optional[str]) -> Optional[SQLiteRunRegistry]:
+    """Open the shared run registry at a SQLite path, or None for single-process mode."""
+    if not location:
+        return None
+    return SQLiteRunRegistry(location)
@@ -0,0 +1,173 @@
+import time
+import asyncio
+from collections import OrderedDict, deque
+from typing import Any, Awaitable, Callable, Deque, Dict, Optional
+
+
+class SchedulerFull(Exception):
+    """Raised by `RunScheduler.submit` when the pending queue is full."""
+
+    def __init__(self, retry_after: float):
+        super().__init__(f"run queue is full; retry after {retry_after:.0f}s")
+        self.retry_after = retry_after
+
+
+class _Run:
+    __slots__ = ("run_id", "factory", "client", "priority", "enqueued", "started", "task", "future")
+
+    def __init__(self, run_id: str, factory: Callable[[], Awaitable[Any]], client: str, priority: int):
+        self.run_id = run_id
+        self.factory = factory
+        self.client = client
+        self.priority = priority
+        self.enqueued = time.monotonic()
+        self.started: Optional[float] = None
+        self.task: Optional[asyncio.Task] = None
+        self.future: asyncio.Future = asyncio.get_running_loop().create_future()
+
+
+def _percentile(values, q: float) -> Optional[float]:
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+class RunScheduler:
+    """Admission control for workflow runs.
+
+    At most `max_concurrent` runs execute at once; up to `max_pending` more wait in a queue and anything beyond
+    that is rejected immediately with `SchedulerFull` (carrying a Retry-After estimate). Waiting runs are
+    started by priority (higher first) and, within a priority, round-robin across clients so one busy client
+    cannot starve the others. `cancel()` works for queued and running runs alike.
+    """
+
+    def __init__(self, max_concurrent: int = 8, max_pending: int = 64):
+        self.max_concurrent = max(1, max_concurrent)
+        self.max_pending = max(0, max_pending)
+        # priority -> client -> queued runs (client order is the round-robin rotation)
+        self._queues: Dict[int, "OrderedDict[str, Deque[_Run]]"] = {}
+        self._runs: Dict[str, _Run] = {}
+        self._pending = 0
+        self._running = 0
+        self._waits: Deque[float] = deque(maxlen=1000)
+        self._durations: Deque[float] = deque(maxlen=1000)
+        self.counters = {"submitted": 0, "rejected": 0, "completed": 0, "cancelled": 0}
+
+    def submit(self, run_id: str, factory: Callable[[], Awaitable[Any]], client: str = "anonymous",
+               priority: int = 0) -> asyncio.Future:
+        """Queue `factory()` to run under `run_id`. Returns a future resolved with the run's result."""
+        if self._running >= self.max_concurrent and self._pending >= self.max_pending:
+            self.counters["rejected"] += 1
+            raise SchedulerFull(self.retry_after())
+        run = _Run(run_id, factory, client, priority)
+        self._runs[run_id] = run
+        self._queues.setdefault(priority, OrderedDict()).setdefault(client, deque()).append(run)
+        self._pending += 1
+        self.counters["submitted"] += 1
+        self._dispatch()
+        return run.future
+
+    def state(self, run_id: str) -> Optional[str]:
+        run = self._runs.get(run_id)
+        if run is None:
+            return None
+        return "running" if run.task is not None else "queued"
+
+    def position(self, run_id: str) -> Optional[int]:
+        """Approximate 0-based position of a queued run (runs of higher priority count as ahead of it)."""
+        run = self._runs.get(run_id)
+        if run is None or run.task is not None:
+            return None
+        ahead = 0
+        for prio, clients in self._queues.items():
+            for q in clients.values():
+                if prio > run.priority:
+                    ahead += len(q)
+                elif prio == run.priority:
+                    ahead += sum(1 for r in q if r.enqueued < run.enqueued)
+        return ahead
+
+    def cancel(self, run_id: str) -> Optional[str]:
+        """Cancel a run. Returns its state before cancelling ("queued"/"running") or None if unknown."""
+        run = self._runs.get(run_id)
+        if run is None:
+            return None
+        if run.task is not None:
+            run.task.cancel()
+            return "running"
+        clients = self._queues[run.priority]
+        clients[run.client].remove(run)
+        if not clients[run.client]:
+            del clients[run.client]
+        self._pending -= 1
+        self._runs.pop(run_id, None)
+        self.counters["cancelled"] += 1
+        run.future.cancel()
+        return "queued"
+
+    def _next(self) -> Optional[_Run]:
+        for prio in sorted(self._queues, reverse=True):
+            clients = self._queues[prio]
+            if not clients:
+                continue
+            client, q = next(iter(clients.items()))
+            run = q.popleft()
+            # rotate: this client goes to the back of the line at this priority
+            del clients[client]
+            if q:
+                clients[client] = q
+            return run
+        return None
+
+    def _dispatch(self) -> None:
+        while self._running < self.max_concurrent:
+            run = self._next()
+            if run is None:
+                return
+            self._pending -= 1
+            self._running += 1
+            run.started = time.monotonic()
+            self._waits.append(run.started - run.enqueued)
+            run.task = asyncio.ensure_future(run.factory())
+            run.task.add_done_callback(lambda t, run=run: self._finished(run, t))
+
+    def _finished(self, run: _Run, task: asyncio.Task) -> None:
+        self._running -= 1
+        self._runs.pop(run.run_id, None)
+        self._durations.append(time.monotonic() - run.started)
+        try:
+            if task.cancelled():
+                self.counters["cancelled"] += 1
+                run.future.cancel()
+            else:
+                self.counters["completed"] += 1
+                # the caller may have cancelled the future already; the slot must be freed regardless
+                if not run.future.done():
+                    if task.exception() is not None:
+                        run.future.set_exception(task.exception())
+                    else:
+                        run.future.set_result(task.result())
+        finally:
+            self._dispatch()
+
+    def retry_after(self) -> float:
+        """Rough seconds until a queue slot frees up, from recent run durations."""
+        if not self._durations:
+            return 1.0
+        avg = sum(self._durations) / len(self._durations)
+        return max(1.0, avg * (self._pending + 1) / self.max_concurrent)
+
+    def stats(self) -> Dict[str, Any]:
+        waits = list(self._waits)
+        return dict(
+            self.counters,
+            running=self._running,
+            pending=self._pending,
+            max_concurrent=self.max_concurrent,
+            max_pending=self.max_pending,
+            pending_by_priority={p: sum(len(q) for q in c.values()) for p, c in self._queues.items() if c},
+            wait_avg=sum(waits) / len(waits) if waits else None,
+            wait_p50=_percentile(waits, 0.50),
+            wait_p95=_percentile(waits, 0.95),
+        )
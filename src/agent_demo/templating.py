@@ -1,8 +1,15 @@
-from jinja2 import Environment, StrictUndefined
+import hashlib
+from collections import OrderedDict
+from jinja2 import Environment, StrictUndefined, Template
 from typing import Any, Dict
 
 env = Environment(undefined=StrictUndefined)
 
+# Bounded LRU of compiled templates keyed by a hash of the template source.
+TEMPLATE_CACHE_SIZE = 256
+_template_cache: "OrderedDict[str, Template]" = OrderedDict()
+_cache_stats = {"hits": 0, "misses": 0, "evictions": 0}
+
 
 def _safe_get(obj: Dict[str, Any], path: str, default: Any = None) -> Any:
     """Safely get a nested value from a dict-like object using dot notation.
@@ -28,11 +35,62 @@ def _safe_get(obj: Dict[str, Any], path: str, default: Any = None) -> Any:
 env.globals["get"] = _safe_get
 
 
+def _source_key(template_str: str) -> str:
+    return hashlib.sha1(template_str.encode("utf-8")).hexdigest()
+
+
+def get_template(template_str: str) -> Template:
+    """Return the compiled template for `template_str`, compiling it at most once while cached."""
+    key = _source_key(template_str)
+    template = _template_cache.get(key)
+    if template is not None:
+        _template_cache.move_to_end(key)
+        _cache_stats["hits"] += 1
+        return template
+
+    _cache_stats["misses"] += 1
+    template = env.from_string(template_str)
+    _template_cache[key] = template
+    while len(_template_cache) > TEMPLATE_CACHE_SIZE:
+        _template_cache.popitem(last=False)
+        _cache_stats["evictions"] += 1
+    return template
+
+
+def precompile_workflow(workflow: Dict[str, Any]) -> int:
+    """Compile every `steps[*].template` (and map-reduce `steps[*].map.template`) into the template cache.
+
+    Call this when a workflow is loaded so that template syntax errors surface early and the
+    first run does not pay for compilation. Returns the number of templates compiled.
+    """
+    count = 0
+    for step in workflow.get("steps", []):
+        spec = step.get("map")
+        for tmpl in (step.get("template"), spec.get("template") if isinstance(spec, dict) else None):
+            if tmpl:
+                get_template(tmpl)
+                count += 1
+    return count
+
+
+def template_cache_stats() -> Dict[str, int]:
+    """Return hit/miss/eviction counters and the current size of the template cache."""
+    return dict(_cache_stats, size=len(_template_cache), max_size=TEMPLATE_CACHE_SIZE)
+
+
+def clear_template_cache() -> None:
+    """Drop all compiled templates and reset the counters."""
+    _template_cache.clear()
+    for k in _cache_stats:
+        _cache_stats[k] = 0
+
+
 def render_template(template_str: str, context: Dict[str, Any]) -> str:
     """Render a Jinja2 template with the provided context.
 
     The context can contain nested dictionaries (memory, inputs, etc.).
     Use the `get(obj, 'a.b.c', default)` helper in templates for safe nested access.
+    Compiled templates are cached (see `get_template`), so repeated renders of the same source skip parsing.
     """
-    template = env.from_string(template_str)
+    template = get_template(template_str)
     return template.render(**context)
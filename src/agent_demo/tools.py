@@ -1,4 +1,24 @@
-from typing import Dict, Any
+import json
+import time
+import asyncio
+import functools
+from collections import OrderedDict
+from collections.abc import Mapping
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Iterable, Optional
+
+from .tracing import span
+from .budget import current_budget
+
+# Shared worker pool for synchronous tools so they never block the event loop.
+_TOOL_POOL: Optional[ThreadPoolExecutor] = None
+
+
+def _tool_pool() -> ThreadPoolExecutor:
+    global _TOOL_POOL
+    if _TOOL_POOL is None:
+        _TOOL_POOL = ThreadPoolExecutor(max_workers=16, thread_name_prefix="tool")
+    return _TOOL_POOL
 
 
 async def search_tool(input: Dict[str, Any]) -> str:
@@ -15,3 +35,184 @@ async def run_tests_tool(input: Dict[str, Any]) -> str:
     if "factorial" in code and "if n < 0" not in code:
         return "Tests failed: no negative input guard; stack depth may be exceeded for large inputs."
     return "Tests passed: all checks OK."
+
+
+class ToolExecutor:
+    """Invoke tools with per-tool timeouts and concurrency limits.
+
+    Async tools are awaited on the loop; sync tools run in a shared thread pool. `timeouts` and `concurrency`
+    map tool names to overrides of `default_timeout` / `default_concurrency` (None means unlimited). Share one
+    executor between agents to make the concurrency limits apply across runs. Timeouts and tool errors are
+    returned as observation strings so the agent can react to them.
+
+    Under a run budget (`budget.use_budget`), timeouts are shortened to the time left before the run's
+    deadline and calls beyond the budget's `max_tool_calls` are skipped.
+    """
+
+    def __init__(self, default_timeout: Optional[float] = 30.0, timeouts: Dict[str, float] = None,
+                 default_concurrency: Optional[int] = None, concurrency: Dict[str, int] = None,
+                 pool: ThreadPoolExecutor = None):
+        self.default_timeout = default_timeout
+        self.timeouts = dict(timeouts or {})
+        self.default_concurrency = default_concurrency
+        self.concurrency = dict(concurrency or {})
+        self.pool = pool
+        self._semaphores: Dict[str, asyncio.Semaphore] = {}
+
+    def _semaphore(self, name: str) -> Optional[asyncio.Semaphore]:
+        limit = self.concurrency.get(name, self.default_concurrency)
+        if not limit:
+            return None
+        sem = self._semaphores.get(name)
+        if sem is None:
+            sem = self._semaphores[name] = asyncio.Semaphore(limit)
+        return sem
+
+    async def _invoke(self, tool: Callable[..., Any], action_input: Dict[str, Any]) -> Any:
+        if asyncio.iscoroutinefunction(tool):
+            return await tool(action_input)
+        loop = asyncio.get_running_loop()
+        result = await loop.run_in_executor(self.pool or _tool_pool(), functools.partial(tool, action_input))
+        # sync callables may still hand back an awaitable
+        if asyncio.iscoroutine(result):
+            result = await result
+        return result
+
+    async def call(self, name: str, tool: Callable[..., Any], action_input: Any) -> Any:
+        timeout = self.timeouts.get(name, self.default_timeout)
+        budget = current_budget()
+        if budget is not None:
+            reason = budget.charge_tool()
+            if reason is not None:
+                return f"Tool {name} skipped: run budget exhausted ({reason})"
+            limit = timeout
+            timeout = budget.clamp(timeout)
+        sem = self._semaphore(name)
+        with span("tool.call", tool=name) as s:
+            try:
+                if sem is None:
+                    result = await asyncio.wait_for(self._invoke(tool, action_input or {}), timeout)
+                else:
+                    async with sem:
+                        result = await asyncio.wait_for(self._invoke(tool, action_input or {}), timeout)
+            except asyncio.TimeoutError:
+                s.set(outcome="timeout")
+                if budget is not None and timeout != limit:
+                    return f"Tool {name} stopped at the run deadline"
+                return f"Tool {name} timed out after {timeout}s"
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                s.set(outcome="error")
+                return f"Tool {name} failed: {e}"
+            s.set(outcome="ok", result_chars=len(result) if isinstance(result, str) else len(json.dumps(result, default=str)))
+            return result
+
+
+class MemoizingToolRegistry(Mapping):
+    """A tools dict whose entries memoize results by tool name and canonicalized `action_input`.
+
+    Drop-in replacement for the plain `{"name": tool}` mapping handed to `ReActAgent`/`WorkflowRunner`.
+    Results are kept for `ttl` seconds (overridable per tool through `ttls`); tools listed in `no_cache`
+    or with a TTL of 0 are passed through untouched. Identical calls that are in flight at the same time
+    are coalesced so that only one of them executes (singleflight); once every caller waiting on it has given
+    up (e.g. timed out), the shared call is cancelled, so a hung tool is retried by the next caller rather
+    than joined forever. Failed calls are never cached.
+    """
+
+    def __init__(self, tools: Dict[str, Callable[..., Any]], ttl: float = 300.0, ttls: Dict[str, float] = None,
+                 no_cache: Iterable[str] = (), max_entries: int = 4096):
+        self._tools = dict(tools)
+        self.ttl = ttl
+        self.ttls = dict(ttls or {})
+        self.no_cache = set(no_cache)
+        self.max_entries = max_entries
+        self._results: "OrderedDict[str, tuple]" = OrderedDict()
+        self._inflight: Dict[str, asyncio.Future] = {}
+        # in-flight call -> number of callers awaiting it
+        self._waiters: Dict[asyncio.Future, int] = {}
+        self._wrapped: Dict[str, Callable[..., Any]] = {}
+        self.stats = {"hits": 0, "misses": 0, "coalesced": 0}
+
+    def __getitem__(self, name: str) -> Callable[..., Any]:
+        tool = self._tools[name]
+        if name in self.no_cache or self.ttls.get(name, self.ttl) <= 0:
+            return tool
+        wrapped = self._wrapped.get(name)
+        if wrapped is None:
+            wrapped = self._wrapped[name] = self._memoize(name, tool)
+        return wrapped
+
+    def __iter__(self):
+        return iter(self._tools)
+
+    def __len__(self) -> int:
+        return len(self._tools)
+
+    @staticmethod
+    def cache_key(name: str, action_input: Any) -> str:
+        return name + ":" + json.dumps(action_input or {}, sort_keys=True, separators=(",", ":"), default=repr)
+
+    def _memoize(self, name: str, tool: Callable[..., Any]) -> Callable[..., Any]:
+        ttl = self.ttls.get(name, self.ttl)
+
+        async def call(action_input: Dict[str, Any]) -> Any:
+            key = self.cache_key(name, action_input)
+            entry = self._results.get(key)
+            if entry is not None and time.monotonic() < entry[0]:
+                self._results.move_to_end(key)
+                self.stats["hits"] += 1
+                return entry[1]
+
+            fut = self._inflight.get(key)
+            if fut is not None:
+                self.stats["coalesced"] += 1
+            else:
+                self.stats["misses"] += 1
+                fut = asyncio.ensure_future(self._execute(tool, action_input))
+                self._inflight[key] = fut
+                fut.add_done_callback(functools.partial(self._finished, key, ttl))
+            # shield so one caller timing out does not cancel the call for everyone else
+            self._waiters[fut] = self._waiters.get(fut, 0) + 1
+            try:
+                return await asyncio.shield(fut)
+            finally:
+                self._waiters[fut] -= 1
+                if not self._waiters[fut]:
+                    del self._waiters[fut]
+                    if not fut.done():
+                        # the last caller gave up: nobody wants the result, and later calls must not join it
+                        self._drop(key, fut)
+                        fut.cancel()
+
+        call.__name__ = getattr(tool, "__name__", name)
+        return call
+
+    @staticmethod
+    async def _execute(tool: Callable[..., Any], action_input: Dict[str, Any]) -> Any:
+        if asyncio.iscoroutinefunction(tool):
+            return await tool(action_input)
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(_tool_pool(), functools.partial(tool, action_input))
+
+    def _drop(self, key: str, fut: asyncio.Future) -> None:
+        # a newer call for the same key may already have taken the slot
+        if self._inflight.get(key) is fut:
+            del self._inflight[key]
+
+    def _finished(self, key: str, ttl: float, fut: asyncio.Future) -> None:
+        self._drop(key, fut)
+        if fut.cancelled() or fut.exception() is not None:
+            return
+        self._results[key] = (time.monotonic() + ttl, fut.result())
+        self._results.move_to_end(key)
+        while len(self._results) > self.max_entries:
+            self._results.popitem(last=False)
+
+    def cancel_inflight(self) -> None:
+        """Cancel calls that are still running, e.g. once nobody is waiting for their results any more."""
+        for fut in list(self._inflight.values()):
+            fut.cancel()
+
+    def clear(self) -> None:
+        self._results.clear()
@@ -0,0 +1,128 @@
+import os
+import time
+import asyncio
+import contextvars
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, List, Optional
+
+from .metrics import SPAN_ERRORS, SPAN_SECONDS, SPANS_IN_FLIGHT
+
+_current: contextvars.ContextVar[Optional["Span"]] = contextvars.ContextVar("agent_demo_span", default=None)
+
+
+class Span:
+    """A timed operation with attributes. Spans nest through a context variable, so child spans created in
+    tasks spawned inside a span (e.g. concurrent workflow steps) attach to it automatically."""
+
+    __slots__ = ("name", "trace_id", "span_id", "parent", "start_ns", "end_ns", "attributes", "children",
+                 "status", "attach")
+
+    def __init__(self, name: str, parent: Optional["Span"] = None, attach: bool = False, **attributes):
+        self.name = name
+        self.parent = parent
+        self.trace_id = parent.trace_id if parent else os.urandom(16).hex()
+        self.span_id = os.urandom(8).hex()
+        self.start_ns = time.time_ns()
+        self.end_ns: Optional[int] = None
+        self.attributes: Dict[str, Any] = dict(attributes)
+        self.children: List["Span"] = []
+        self.status = "ok"
+        # whether spans should be attached to streamed events (inherited from the root)
+        self.attach = parent.attach if parent else attach
+
+    def set(self, **attributes) -> None:
+        self.attributes.update(attributes)
+
+    def add(self, key: str, amount: int = 1) -> None:
+        self.attributes[key] = self.attributes.get(key, 0) + amount
+
+    @property
+    def duration_ms(self) -> float:
+        end = self.end_ns if self.end_ns is not None else time.time_ns()
+        return (end - self.start_ns) / 1e6
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Compact nested form used in events."""
+        out = {"name": self.name, "duration_ms": round(self.duration_ms, 3)}
+        if self.attributes:
+            out["attributes"] = dict(self.attributes)
+        if self.status != "ok":
+            out["status"] = self.status
+        if self.children:
+            out["children"] = [c.to_dict() for c in self.children]
+        return out
+
+    def walk(self) -> Iterator["Span"]:
+        yield self
+        for c in self.children:
+            yield from c.walk()
+
+
+def current_span() -> Optional[Span]:
+    return _current.get()
+
+
+@contextmanager
+def span(name: str, attach: bool = False, **attributes) -> Iterator[Span]:
+    """Open a span as a child of the current one. `attach` only matters for root spans."""
+    parent = _current.get()
+    s = Span(name, parent, attach=attach, **attributes)
+    token = _current.set(s)
+    SPANS_IN_FLIGHT.inc(span=name)
+    try:
+        yield s
+    except BaseException as e:
+        s.status = "cancelled" if isinstance(e, (asyncio.CancelledError, GeneratorExit)) else "error"
+        s.attributes.setdefault("error", f"{type(e).__name__}: {e}")
+        SPAN_ERRORS.inc(span=name)
+        raise
+    finally:
+        s.end_ns = time.time_ns()
+        _current.reset(token)
+        SPANS_IN_FLIGHT.dec(span=name)
+        SPAN_SECONDS.observe((s.end_ns - s.start_ns) / 1e9, span=name)
+        if parent is not None:
+            parent.children.append(s)
+
+
+def attach_span(event: Dict[str, Any], s: Optional[Span] = None) -> Dict[str, Any]:
+    """Add the current (or given) span tree to an event if the trace asked for attached spans."""
+    s = s or _current.get()
+    if s is not None and s.attach:
+        event["spans"] = s.to_dict()
+    return event
+
+
+def _otlp_value(v: Any) -> Dict[str, Any]:
+    if isinstance(v, bool):
+        return {"boolValue": v}
+    if isinstance(v, int):
+        return {"intValue": str(v)}
+    if isinstance(v, float):
+        return {"doubleValue": v}
+    return {"stringValue": str(v)}
+
+
+def to_otlp(root: Span, service_name: str = "agent-demo") -> Dict[str, Any]:
+    """Export a span tree as OpenTelemetry OTLP/JSON (`ExportTraceServiceRequest`)."""
+    spans = []
+    for s in root.walk():
+        item = {
+            "traceId": s.trace_id,
+            "spanId": s.span_id,
+            "name": s.name,
+            "kind": 1,
+            "startTimeUnixNano": str(s.start_ns),
+            "endTimeUnixNano": str(s.end_ns if s.end_ns is not None else time.time_ns()),
+            "attributes": [{"key": k, "value": _otlp_value(v)} for k, v in s.attributes.items()],
+            "status": {"code": 2 if s.status == "error" else 1},
+        }
+        if s.parent is not None:
+            item["parentSpanId"] = s.parent.span_id
+        spans.append(item)
+    return {
+        "resourceSpans": [{
+            "resource": {"attributes": [{"key": "service.name", "value": {"stringValue": service_name}}]},
+            "scopeSpans": [{"scope": {"name": "agent_demo"}, "spans": spans}],
+        }]
+    }
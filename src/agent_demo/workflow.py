@@ -1,70 +1,533 @@
 import json
-from typing import Any, Dict, List, Optional
+import re
+import time
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, Iterable, List, Optional, Set
 from .templating import render_template
-from .reactor import ReActAgent
+from .reactor import ReActAgent, accept_answer
 from .llm import LLMAdapter
+from .tools import ToolExecutor
+from .checkpoint import CheckpointStore, content_hash
+from .artifacts import ArtifactStore
+from .metrics import LLM_PROMPT_CHARS, LLM_RESPONSE_CHARS
+from .budget import BudgetExceeded, RunBudget, current_budget, use_budget
+from .chunking import chunk_input
+from .tracing import attach_span, span, to_otlp
 import asyncio
 
 
+# Patterns used to discover which memory keys a template reads.
+_MEMORY_ATTR_RE = re.compile(r"\bmemory\.([A-Za-z_]\w*)")
+_MEMORY_ITEM_RE = re.compile(r"\bmemory\[\s*['\"]([^'\"]+)['\"]\s*\]")
+_MEMORY_GET_RE = re.compile(r"\bget\(\s*memory\s*,\s*['\"]([^'\".]+)")
+_MEMORY_ANY_RE = re.compile(r"\bmemory\b")
+# `memory.get(...)`, `memory.items()` etc. call a dict method rather than read a key of that name
+_DICT_METHODS = frozenset(name for name in dir(dict) if not name.startswith("_"))
+
+
+def template_memory_refs(template: str) -> Optional[Set[str]]:
+    """Return the top-level memory keys referenced by a template.
+
+    Recognizes `memory.key`, `memory['key']` and `get(memory, 'key.sub', ...)`. Returns None when
+    the template uses `memory` in some other way (e.g. passes it whole to a filter or calls a dict
+    method such as `memory.get('key')`), in which case callers should assume the step may read
+    anything written before it.
+    """
+    refs: Set[str] = set()
+    matched = 0
+    for rx in (_MEMORY_ATTR_RE, _MEMORY_ITEM_RE, _MEMORY_GET_RE):
+        for m in rx.finditer(template):
+            if rx is _MEMORY_ATTR_RE and m.group(1) in _DICT_METHODS:
+                return None
+            refs.add(m.group(1))
+            matched += 1
+    if len(_MEMORY_ANY_RE.findall(template)) > matched:
+        return None
+    return refs
+
+
+def step_dependencies(steps: List[Dict[str, Any]]) -> Dict[str, List[str]]:
+    """Work out the step ids each step depends on.
+
+    An explicit `depends_on` list on a step is used as-is. Otherwise a step depends on the earlier
+    steps that produce the memory keys its template references (or on all earlier steps if the
+    references cannot be determined). Keys that no step produces are assumed to come from inputs.
+    """
+    producers: Dict[str, str] = {}
+    deps: Dict[str, List[str]] = {}
+    ids = [s.get("id") for s in steps]
+    if len(set(ids)) != len(ids) or None in ids:
+        raise ValueError("every workflow step needs a unique id")
+
+    for step in steps:
+        step_id = step["id"]
+        if "depends_on" in step:
+            explicit = list(step.get("depends_on") or [])
+            unknown = [d for d in explicit if d not in ids]
+            if unknown:
+                raise ValueError(f"step {step_id} depends on unknown steps: {unknown}")
+            deps[step_id] = explicit
+        else:
+            refs = _step_memory_refs(step)
+            if refs is None:
+                found = list(dict.fromkeys(producers.values()))
+            else:
+                found = [producers[r] for r in sorted(refs) if r in producers]
+            deps[step_id] = list(dict.fromkeys(found))
+        for out in step.get("outputs", []):
+            # a later writer of the same key must run after the earlier one
+            if out in producers and producers[out] not in deps[step_id] and producers[out] != step_id:
+                deps[step_id].append(producers[out])
+            producers[out] = step_id
+
+    _check_acyclic(ids, deps)
+    return deps
+
+
+def _step_memory_refs(step: Dict[str, Any]) -> Optional[Set[str]]:
+    refs = template_memory_refs(step.get("template", ""))
+    spec = step.get("map")
+    if refs is None or not isinstance(spec, dict):
+        return refs
+    map_refs = template_memory_refs(spec.get("template", ""))
+    if map_refs is None:
+        return None
+    # the chunked input is read from inputs, or from memory when an earlier step produces it
+    return refs | map_refs | {spec.get("input")}
+
+
+PARSERS = ("json", "react", "text", "map_reduce")
+MAP_DEFAULTS = {"chunk_tokens": 1000, "fan_out": 4, "split": "auto", "parser": "text"}
+
+
+def validate_workflow(workflow: Dict[str, Any]) -> None:
+    """Raise ValueError if `workflow` is not a runnable workflow definition."""
+    if not isinstance(workflow, dict):
+        raise ValueError("workflow must be a JSON object")
+    steps = workflow.get("steps")
+    if not isinstance(steps, list) or not steps:
+        raise ValueError("workflow needs a non-empty steps list")
+    for step in steps:
+        if not isinstance(step, dict):
+            raise ValueError("each workflow step must be an object")
+        step_id = step.get("id")
+        if not isinstance(step.get("template", ""), str):
+            raise ValueError(f"step {step_id}: template must be a string")
+        if step.get("parser", "text") not in PARSERS:
+            raise ValueError(f"step {step_id}: unknown parser {step.get('parser')!r}")
+        if not isinstance(step.get("outputs", []), list):
+            raise ValueError(f"step {step_id}: outputs must be a list")
+        if step.get("parser") == "map_reduce":
+            _validate_map(step_id, step.get("map"), step.get("reduce_parser", "text"))
+        branches = step.get("branches")
+        if branches is not None and not (isinstance(branches, int) and branches > 0 or
+                                         isinstance(branches, list) and all(isinstance(v, dict) for v in branches)):
+            raise ValueError(f"step {step_id}: branches must be a positive number or a list of variant objects")
+        if not isinstance(step.get("accept", {}), dict):
+            raise ValueError(f"step {step_id}: accept must be an object")
+    step_dependencies(steps)
+
+
+def _validate_map(step_id: Any, spec: Any, reduce_parser: str) -> None:
+    if not isinstance(spec, dict):
+        raise ValueError(f"step {step_id}: map_reduce steps need a map object")
+    if not isinstance(spec.get("input"), str) or not isinstance(spec.get("template"), str):
+        raise ValueError(f"step {step_id}: map needs an input name and a template")
+    for key in ("chunk_tokens", "fan_out"):
+        value = spec.get(key, MAP_DEFAULTS[key])
+        if not isinstance(value, int) or value < 1:
+            raise ValueError(f"step {step_id}: map.{key} must be a positive integer")
+    if spec.get("split", "auto") not in ("auto", "code", "text"):
+        raise ValueError(f"step {step_id}: unknown map.split {spec.get('split')!r}")
+    for parser in (spec.get("parser", "text"), reduce_parser):
+        if parser not in ("json", "text"):
+            raise ValueError(f"step {step_id}: map-reduce parsers must be json or text, not {parser!r}")
+
+
+def _check_acyclic(ids: List[str], deps: Dict[str, List[str]]) -> None:
+    state: Dict[str, int] = {}
+
+    def visit(node: str, path: List[str]) -> None:
+        if state.get(node) == 2:
+            return
+        if state.get(node) == 1:
+            raise ValueError("workflow steps form a dependency cycle: " + " -> ".join(path + [node]))
+        state[node] = 1
+        for d in deps.get(node, []):
+            visit(d, path + [node])
+        state[node] = 2
+
+    for i in ids:
+        visit(i, [])
+
+
+class _StepEvents:
+    """Queue proxy that tags the events of a nested agent with the step that produced them."""
+
+    def __init__(self, queue: asyncio.Queue, step_id: str):
+        self.queue = queue
+        self.step_id = step_id
+
+    async def put(self, event: Dict[str, Any]) -> None:
+        event.setdefault("step_id", self.step_id)
+        await self.queue.put(event)
+
+
 class WorkflowRunner:
-    def __init__(self, llm: LLMAdapter, tools: Dict[str, Any] = None):
+    def __init__(self, llm: LLMAdapter, tools: Dict[str, Any] = None, max_concurrency: int = 4,
+                 stream_tokens: bool = True, tool_executor: ToolExecutor = None,
+                 checkpoint_store: CheckpointStore = None, artifact_store: ArtifactStore = None):
         self.llm = llm
         self.tools = tools or {}
+        # shared by every ReAct agent this runner spawns, so per-tool limits hold across runs
+        self.tool_executor = tool_executor or ToolExecutor()
+        # maximum number of independent steps executed at the same time
+        self.max_concurrency = max(1, max_concurrency)
+        # when streaming to an event_queue, forward LLM output as token events
+        self.stream_tokens = stream_tokens
+        # when set, completed steps are checkpointed and reused (see `run`)
+        self.checkpoint_store = checkpoint_store
+        # when set, large outputs leave events and results as artifact references (see `run`)
+        self.artifact_store = artifact_store
 
-    async def run(self, workflow: Dict[str, Any], event_queue: Optional[asyncio.Queue] = None) -> Dict[str, Any]:
+    async def run(self, workflow: Dict[str, Any], event_queue: Optional[asyncio.Queue] = None,
+                  run_key: Optional[str] = None, trace: bool = False,
+                  budget: Optional[RunBudget] = None) -> Dict[str, Any]:
         """Run the workflow. If `event_queue` is provided, emit events as dicts for each step and nested ReAct events.
 
+        Steps are scheduled as a DAG (see `step_dependencies`): a step starts once the steps it depends on have
+        finished, and independent steps run concurrently up to `max_concurrency`.
+
+        With a `checkpoint_store`, every completed step is saved under `run_key` (default: the workflow id)
+        together with the hash of its rendered prompt and of its upstream outputs. A step whose checkpoint
+        matches both is not executed again, so re-running a workflow only recomputes steps downstream of a
+        changed input, and re-running an interrupted run with the same `run_key` resumes after its last
+        completed step.
+
         Emitted events (examples):
         - {"type": "step_start", "step_id": id}
-        - {"type": "step_end", "step_id": id, "parsed": ...}
+        - {"type": "token", "step_id": id, "text": chunk} (when stream_tokens is enabled)
+        - {"type": "step_end", "step_id": id, "parsed": ..., "cached": bool}
+        - {"type": "map_result", "step_id": id, "index": i, "count": n, "parsed": ...} (map_reduce steps, per chunk)
         - ReAct events are forwarded from the agent (thought/action/observation/final)
+
+        Every run is traced as nested spans (run -> step -> ReAct iteration -> LLM/tool call) feeding the
+        latency histograms in `metrics.REGISTRY`. With `trace=True`, step_end and final events also carry the
+        span tree under "spans" and the result includes the whole trace as OTLP/JSON under "trace".
+
+        A `budget` (deadline, token and call limits) is shared by every step, ReAct loop, LLM call and tool call
+        of the run. When it runs out, no further step starts, anything still in flight at the deadline is
+        cancelled, and the result holds the memory computed so far plus `stop_reason`; `budget` in the result
+        reports what was used. ReAct steps cut short by the budget are not checkpointed, so a resumed run redoes them.
+
+        With an `artifact_store`, outputs larger than its threshold are stored once and replaced by compact
+        references (`{"$ref": "artifact", "id", "size", "content_type", "preview"}`) in step_end and map_result
+        events and in the result's memory; steps still read the full values. Dict outputs are offloaded field by
+        field. Fetch the content with `artifact_store.load(ref)` or, over HTTP, `GET /artifacts/{id}`.
         """
-        memory = {}
+        memory: Dict[str, Any] = {}
+        checkpoint_report: Dict[str, Any] = {}
+        with use_budget(budget), span("workflow.run", attach=trace, workflow_id=workflow.get("id", "")) as root:
+            try:
+                dag = self._run_dag(workflow, memory, event_queue, run_key, checkpoint_report)
+                result = await (budget.call(dag) if budget is not None else dag)
+            except BudgetExceeded as e:
+                root.set(stop_reason=e.reason)
+                result = {"memory": memory, "stop_reason": e.reason}
+                if checkpoint_report:
+                    result["checkpoint"] = checkpoint_report
+                if event_queue is not None:
+                    await event_queue.put({"type": "budget_exhausted", "stop_reason": e.reason})
+        if budget is not None:
+            if budget.stop_reason is not None:
+                result["stop_reason"] = budget.stop_reason
+            result["budget"] = budget.report()
+        if self.artifact_store is not None:
+            result["memory"] = {k: self._outbound(v) for k, v in result["memory"].items()}
+        if trace:
+            result["trace"] = to_otlp(root)
+        return result
+
+    async def _run_dag(self, workflow: Dict[str, Any], memory: Dict[str, Any], event_queue: Optional[asyncio.Queue],
+                       run_key: Optional[str], checkpoint_report: Dict[str, Any] = None) -> Dict[str, Any]:
         inputs = workflow.get("entry_inputs", {})
         memory.update(inputs)
         steps: List[Dict[str, Any]] = workflow.get("steps", [])
+        deps = step_dependencies(steps)
+
+        checkpoint = None
+        if self.checkpoint_store is not None:
+            run_key = run_key or workflow.get("id", "workflow")
+            # filled in as steps finish, so a run stopped by its budget can still report it
+            report = checkpoint_report if checkpoint_report is not None else {}
+            report.update(reused=[], computed=[], run_key=run_key)
+            checkpoint = (run_key, self.checkpoint_store.load(run_key), report)
+
+        semaphore = asyncio.Semaphore(self.max_concurrency)
+        tasks: Dict[str, asyncio.Task] = {}
+
+        async def run_node(step: Dict[str, Any]) -> Any:
+            upstream = {}
+            for dep in deps[step["id"]]:
+                upstream[dep] = await tasks[dep]
+            async with semaphore:
+                return await self._run_step(step, memory, inputs, event_queue, upstream, checkpoint)
 
         for step in steps:
-            step_id = step.get("id")
+            tasks[step["id"]] = asyncio.ensure_future(run_node(step))
+        try:
+            await asyncio.gather(*tasks.values())
+        finally:
+            for t in tasks.values():
+                if not t.done():
+                    t.cancel()
+            await asyncio.gather(*tasks.values(), return_exceptions=True)
+
+        if checkpoint is not None:
+            return {"memory": memory, "checkpoint": checkpoint[2]}
+        return {"memory": memory}
+
+    async def run_many(self, workflow: Dict[str, Any], items: Iterable[Dict[str, Any]],
+                       max_concurrency: int = 8,
+                       run: Optional[Callable[[Dict[str, Any]], Awaitable[Any]]] = None) -> AsyncIterator[Dict[str, Any]]:
+        """Run `workflow` once per item and yield results as each run finishes.
+
+        Each item is a dict of `entry_inputs` overrides merged over the workflow's own inputs. At most
+        `max_concurrency` runs are in flight; `items` is consumed lazily, so it can be a large generator.
+        `run(workflow)` executes one item's workflow (default: `self.run`), e.g. to submit it to a scheduler.
+        Yields `{"index": i, "result": ...}` or, if that run raised, `{"index": i, "error": "..."}` — a failing
+        item never aborts the rest of the batch. An item that is an exception instance (e.g. an unparsable input
+        line) is reported as that item's error. If the `items` iterator itself raises, that is reported as an
+        error line for the next index and no further items are taken.
+        """
+        finished: asyncio.Queue = asyncio.Queue()
+        pending = iter(items)
+        taken = {"next": 0, "stopped": False}
+        base_inputs = workflow.get("entry_inputs", {})
+        done = object()
+
+        async def worker() -> None:
+            try:
+                while not taken["stopped"]:
+                    # workers share one iterator; next() never awaits, so each item is taken exactly once
+                    index = taken["next"]
+                    try:
+                        overrides = next(pending)
+                    except StopIteration:
+                        taken["stopped"] = True
+                        return
+                    except Exception as e:
+                        taken["stopped"] = True
+                        await finished.put({"index": index, "error": f"items iterator failed: {type(e).__name__}: {e}"})
+                        return
+                    taken["next"] += 1
+                    try:
+                        if isinstance(overrides, Exception):
+                            raise overrides
+                        wf = dict(workflow, entry_inputs={**base_inputs, **(overrides or {})})
+                        out = {"index": index, "result": await (run or self.run)(wf)}
+                    except Exception as e:
+                        out = {"index": index, "error": f"{type(e).__name__}: {e}"}
+                    await finished.put(out)
+            finally:
+                finished.put_nowait(done)
+
+        workers = [asyncio.ensure_future(worker()) for _ in range(max(1, max_concurrency))]
+        try:
+            remaining = len(workers)
+            while remaining:
+                out = await finished.get()
+                if out is done:
+                    remaining -= 1
+                    continue
+                yield out
+        finally:
+            for w in workers:
+                w.cancel()
+            await asyncio.gather(*workers, return_exceptions=True)
+
+    async def _run_step(self, step: Dict[str, Any], memory: Dict[str, Any], inputs: Dict[str, Any],
+                        event_queue: Optional[asyncio.Queue], upstream: Dict[str, Any] = None,
+                        checkpoint=None) -> Any:
+        step_id = step.get("id")
+        with span("workflow.step", step_id=step_id, parser=step.get("parser", "text")) as step_span:
             if event_queue is not None:
                 await event_queue.put({"type": "step_start", "step_id": step_id, "name": step.get("name")})
 
             tmpl = step.get("template", "")
             parser = step.get("parser", "text")
             ctx = {"memory": memory, "inputs": inputs}
-            rendered = render_template(tmpl, ctx)
+            if parser == "map_reduce":
+                # the map and reduce templates are rendered per chunk later; the input stands in for the prompt
+                rendered = self._map_input(step, ctx)
+            else:
+                with span("template.render", template_chars=len(tmpl)):
+                    rendered = render_template(tmpl, ctx)
+
+            if checkpoint is not None:
+                run_key, records, report = checkpoint
+                # the rest of the step definition (parser, outputs, agent options) counts as part of the prompt
+                config = {k: v for k, v in step.items() if k not in ("name", "template")}
+                prompt_hash = content_hash([config, rendered])
+                upstream_hash = content_hash(upstream or {})
+                record = records.get(step_id)
+                if record and record.get("prompt_hash") == prompt_hash and record.get("upstream_hash") == upstream_hash:
+                    parsed = record["parsed"]
+                    report["reused"].append(step_id)
+                    step_span.set(cached=True)
+                    self._store_outputs(step, parsed, memory)
+                    if event_queue is not None:
+                        await event_queue.put(attach_span({"type": "step_end", "step_id": step_id,
+                                                           "parsed": self._outbound(parsed), "cached": True},
+                                                          step_span))
+                    return parsed
+
+            budget = current_budget()
+            reason = budget.should_stop() if budget is not None else None
+            if reason is not None:
+                raise BudgetExceeded(reason)
+            parsed = await self._execute_step(step, rendered, event_queue, ctx)
+            self._store_outputs(step, parsed, memory)
+
+            if checkpoint is not None:
+                # an agent loop cut short by the budget is not a result to resume from: it is redone next time
+                if not self._cut_short(parsed, budget):
+                    self.checkpoint_store.save(run_key, step_id, {
+                        "prompt_hash": prompt_hash, "upstream_hash": upstream_hash, "parsed": parsed,
+                    })
+                report["computed"].append(step_id)
 
-            resp = await self.llm.generate(rendered)
+            if event_queue is not None:
+                await event_queue.put(attach_span({"type": "step_end", "step_id": step_id,
+                                                   "parsed": self._outbound(parsed), "cached": False}, step_span))
+            return parsed
+
+    @staticmethod
+    def _cut_short(parsed: Any, budget: Optional[RunBudget]) -> bool:
+        agent_result = parsed.get("react_result") if isinstance(parsed, dict) else None
+        if not isinstance(agent_result, dict):
+            return False
+        return agent_result.get("reason") == "budget_exhausted" or (budget is not None and budget.stop_reason is not None)
+
+    async def _execute_step(self, step: Dict[str, Any], rendered: str, event_queue: Optional[asyncio.Queue],
+                            ctx: Dict[str, Any] = None) -> Any:
+        """Make the LLM call(s) for one step and return its parsed output."""
+        step_id = step.get("id")
+        parser = step.get("parser", "text")
+        if parser == "react":
+            # Spawn a ReAct agent and forward its iteration events
+            agent = ReActAgent(
+                self.llm, self.tools, stream_tokens=self.stream_tokens, executor=self.tool_executor,
+                history_budget=step.get("history_budget"), history_strategy=step.get("history_strategy", "truncate"),
+            )
+            agent_events = _StepEvents(event_queue, step_id) if event_queue is not None else None
+            if step.get("branches"):
+                # speculative: several variants of the loop at once, the first acceptable answer wins
+                parsed_agent = await agent.run_speculative(rendered, step["branches"],
+                                                           accept=accept_answer(**step.get("accept", {})),
+                                                           event_queue=agent_events)
+            else:
+                parsed_agent = await agent.run(rendered, event_queue=agent_events)
+            parsed = {"react_result": parsed_agent}
+        elif parser == "map_reduce":
+            parsed = await self._map_reduce(step, rendered, ctx or {}, event_queue)
+        else:
+            text = await self._complete(rendered, step_id, event_queue if self.stream_tokens else None)
+            parsed = self._parse_output(parser, text)
+        return parsed
+
+    async def _complete(self, prompt: str, step_id: Any, event_queue: Optional[asyncio.Queue]) -> str:
+        """One LLM call under the run's budget; streamed as token events when a queue is given."""
+        streaming = event_queue is not None
+        budget = current_budget()
+        start = time.monotonic()
+        with span("llm.generate", prompt_chars=len(prompt), stream=streaming) as llm_span:
+            call = self._stream_text(prompt, step_id, event_queue) if streaming else self.llm.generate(prompt)
+            resp = await (budget.call(call) if budget is not None else call)
             text = resp.get("text", "")
+            llm_span.set(response_chars=len(text))
+        if budget is not None:
+            budget.charge_llm(prompt, text, resp.get("usage"), time.monotonic() - start)
+        LLM_PROMPT_CHARS.inc(len(prompt))
+        LLM_RESPONSE_CHARS.inc(len(text))
+        return text
 
-            if parser == "json":
+    @staticmethod
+    def _parse_output(parser: str, text: str) -> Any:
+        if parser == "json":
+            with span("parse.json", chars=len(text)) as parse_span:
                 try:
-                    parsed = json.loads(text)
+                    return json.loads(text)
                 except Exception:
-                    parsed = {"_raw": text}
-            elif parser == "react":
-                # Spawn a ReAct agent and forward its iteration events
-                agent = ReActAgent(self.llm, self.tools)
-                parsed_agent = await agent.run(rendered, event_queue=event_queue)
-                parsed = {"react_result": parsed_agent}
-            else:
-                parsed = {"_raw": text}
+                    parse_span.set(valid=False)
+                    return {"_raw": text}
+        return {"_raw": text}
 
-            # store outputs
-            outputs = step.get("outputs", [])
-            if outputs:
-                if len(outputs) == 1:
-                    memory[outputs[0]] = parsed
-                else:
-                    # attempt to map by keys
-                    if isinstance(parsed, dict):
-                        for k in outputs:
-                            memory[k] = parsed.get(k)
-                    else:
-                        # fallback
-                        memory[outputs[0]] = parsed
+    @staticmethod
+    def _map_input(step: Dict[str, Any], ctx: Dict[str, Any]) -> str:
+        name = step["map"]["input"]
+        value = ctx["memory"].get(name, ctx["inputs"].get(name, ""))
+        return value if isinstance(value, str) else json.dumps(value, default=str)
 
+    async def _map_reduce(self, step: Dict[str, Any], source: str, ctx: Dict[str, Any],
+                          event_queue: Optional[asyncio.Queue]) -> Dict[str, Any]:
+        """Split `source` into token-budgeted chunks, run the map template over them concurrently (at most
+        `fan_out` at once), then feed the ordered map results to the step's template as the reduce call."""
+        step_id = step.get("id")
+        spec = dict(MAP_DEFAULTS, **step["map"])
+        chunks = chunk_input(source, spec["chunk_tokens"], spec["split"])
+        results: List[Any] = [None] * len(chunks)
+        semaphore = asyncio.Semaphore(spec["fan_out"])
+
+        async def map_one(index: int, chunk: str) -> None:
+            async with semaphore:
+                with span("workflow.map", index=index, chunk_chars=len(chunk)):
+                    prompt = render_template(spec["template"], dict(ctx, chunk=chunk, chunk_index=index,
+                                                                    chunk_count=len(chunks)))
+                    # map calls are not token-streamed: chunks finish out of order, so each streams as a whole
+                    results[index] = self._parse_output(spec["parser"], await self._complete(prompt, step_id, None))
             if event_queue is not None:
-                await event_queue.put({"type": "step_end", "step_id": step_id, "parsed": parsed})
+                await event_queue.put({"type": "map_result", "step_id": step_id, "index": index,
+                                       "count": len(chunks), "parsed": self._outbound(results[index])})
 
-        return {"memory": memory}
+        with span("workflow.map_phase", chunks=len(chunks), fan_out=spec["fan_out"]):
+            tasks = [asyncio.ensure_future(map_one(i, c)) for i, c in enumerate(chunks)]
+            try:
+                await asyncio.gather(*tasks)
+            finally:
+                for t in tasks:
+                    t.cancel()
+        prompt = render_template(step.get("template", ""), dict(ctx, results=results, chunk_count=len(chunks)))
+        text = await self._complete(prompt, step_id, event_queue if self.stream_tokens else None)
+        return {"result": self._parse_output(step.get("reduce_parser", "text"), text), "map_results": results,
+                "chunks": len(chunks)}
+
+    async def _stream_text(self, prompt: str, step_id: Any, event_queue: asyncio.Queue) -> Dict[str, Any]:
+        parts = []
+        async for piece in self.llm.generate_stream(prompt):
+            parts.append(piece)
+            await event_queue.put({"type": "token", "step_id": step_id, "text": piece})
+        return {"text": "".join(parts)}
+
+    def _outbound(self, value: Any) -> Any:
+        """`value` as it should appear in events: large outputs become artifact references."""
+        if self.artifact_store is None:
+            return value
+        if isinstance(value, dict):
+            return self.artifact_store.offload_all(value)
+        return self.artifact_store.offload(value)
+
+    @staticmethod
+    def _store_outputs(step: Dict[str, Any], parsed: Any, memory: Dict[str, Any]) -> None:
+        # store outputs
+        outputs = step.get("outputs", [])
+        if outputs:
+            if len(outputs) == 1:
+                memory[outputs[0]] = parsed
+            else:
+                # attempt to map by keys
+                if isinstance(parsed, dict):
+                    for k in outputs:
+                        memory[k] = parsed.get(k)
+                else:
+                    # fallback
+                    memory[outputs[0]] = parsed
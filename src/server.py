@@ -1,19 +1,140 @@
-from fastapi import FastAPI, Request
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, HTTPException, Request
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import StreamingResponse
-from pathlib import Path
+from fastapi.responses import PlainTextResponse, Response, StreamingResponse
+from pydantic import BaseModel
+from typing import Any, Dict, List, Optional
 import json
 import asyncio
+import functools
 
 from src.agent_demo.llm import MockLLM, OpenAIAdapter
+from src.agent_demo.scheduler import RunScheduler, SchedulerFull
+import os
 import uuid
 
-# In-memory registry for running tasks: run_id -> { task, queue }
-TASK_REGISTRY: dict = {}
+# Admission control for runs: bounded concurrency, bounded priority queue, fair across clients
+SCHEDULER = RunScheduler(
+    max_concurrent=int(os.getenv("MAX_CONCURRENT_RUNS", "8")),
+    max_pending=int(os.getenv("MAX_PENDING_RUNS", "64")),
+)
+# Event hubs by run_id; kept for HUB_LINGER_SECONDS after a run ends for late/reconnecting subscribers
+HUBS: Dict[str, "RunEventHub"] = {}
+HUB_LINGER_SECONDS = 60.0
 from src.agent_demo.workflow import WorkflowRunner
+from src.agent_demo.events import RunEventHub, sse_frame
+from src.agent_demo.runs import open_run_registry
+from src.agent_demo.budget import RunBudget
+from src.agent_demo.templating import template_cache_stats
+from src.agent_demo.registry import default_registry
+from src.agent_demo.checkpoint import open_checkpoint_store
+from src.agent_demo.artifacts import open_artifact_store
+from src.agent_demo.metrics import REGISTRY
+from src.agent_demo.ratelimit import RateLimitedLLM, RateLimiter
 from src.agent_demo import tools as tools_mod
 
-app = FastAPI(title="Agent Demo API")
+DEFAULT_WORKFLOW = "hybrid_demo"
+# seconds between checks of examples/ for changed workflow files
+WORKFLOW_POLL_INTERVAL = 2.0
+
+# All workflows under examples/, loaded, validated and precompiled once; reloaded when a file changes.
+WORKFLOWS = default_registry()
+
+# Tool results are memoized across runs; concurrent identical calls execute once.
+TOOLS = tools_mod.MemoizingToolRegistry({"search": tools_mod.search_tool, "run_tests": tools_mod.run_tests_tool})
+
+# Optional step checkpoints (a directory, or a .db/.sqlite file) so runs can be resumed by run_key. Checkpoints
+# not written for CHECKPOINT_RETENTION_SECONDS (default 7 days) are purged in the background.
+CHECKPOINTS = open_checkpoint_store(
+    os.getenv("CHECKPOINT_STORE"),
+    float(os.environ["CHECKPOINT_RETENTION_SECONDS"]) if os.getenv("CHECKPOINT_RETENTION_SECONDS") else None,
+)
+# seconds between purges of expired checkpoints and artifacts
+HOUSEKEEPING_INTERVAL = 600.0
+
+# Optional artifact store (a directory, or ":memory:"): step outputs over ARTIFACT_THRESHOLD_BYTES leave events and
+# responses as references and are fetched lazily from GET /artifacts/{id}. Files unused for
+# ARTIFACT_RETENTION_SECONDS (default 7 days) are purged in the background.
+ARTIFACTS = open_artifact_store(
+    os.getenv("ARTIFACT_STORE"),
+    int(os.getenv("ARTIFACT_THRESHOLD_BYTES", "65536")),
+    float(os.environ["ARTIFACT_RETENTION_SECONDS"]) if os.getenv("ARTIFACT_RETENTION_SECONDS") else None,
+)
+
+# Optional run registry (a SQLite file) shared by all worker processes: run ownership, cross-process cancel and
+# event relay, so `uvicorn --workers N` can serve /cancel and stream reconnects from any worker
+RUNS = open_run_registry(os.getenv("RUN_REGISTRY"))
+
+# Default wall-clock limit for a run, queueing included (seconds; unset means none). Per request: ?timeout=
+RUN_TIMEOUT = float(os.environ["RUN_TIMEOUT_SECONDS"]) if os.getenv("RUN_TIMEOUT_SECONDS") else None
+
+# Client-side limits for the remote model, shared by every run: LLM_RPM / LLM_TPM (unset means unlimited) and
+# LLM_MAX_CONCURRENCY (the ceiling for the adaptive concurrency limit)
+LIMITER = RateLimiter(
+    name="openai",
+    requests_per_minute=float(os.environ["LLM_RPM"]) if os.getenv("LLM_RPM") else None,
+    tokens_per_minute=float(os.environ["LLM_TPM"]) if os.getenv("LLM_TPM") else None,
+    max_concurrency=int(os.getenv("LLM_MAX_CONCURRENCY", "64")),
+)
+
+# Adapters and runners are shared by all requests. The OpenAI runner is created on first use.
+RUNNERS: Dict[bool, WorkflowRunner] = {
+    False: WorkflowRunner(MockLLM(), tools=TOOLS, checkpoint_store=CHECKPOINTS, artifact_store=ARTIFACTS),
+}
+
+
+def get_runner(use_openai: bool = False) -> WorkflowRunner:
+    runner = RUNNERS.get(use_openai)
+    if runner is None:
+        runner = RUNNERS[use_openai] = WorkflowRunner(RateLimitedLLM(OpenAIAdapter(), LIMITER), tools=TOOLS,
+                                                      checkpoint_store=CHECKPOINTS, artifact_store=ARTIFACTS)
+    return runner
+
+
+def get_workflow(workflow_id: str) -> dict:
+    try:
+        return WORKFLOWS.get(workflow_id)
+    except KeyError:
+        raise HTTPException(status_code=404, detail=f"unknown workflow: {workflow_id}")
+
+
+async def _housekeeping() -> None:
+    loop = asyncio.get_running_loop()
+    while True:
+        if CHECKPOINTS is not None:
+            CHECKPOINTS.purge()
+        if ARTIFACTS is not None:
+            # a walk over every stored file: keep it off the event loop
+            await loop.run_in_executor(None, ARTIFACTS.purge)
+        await asyncio.sleep(HOUSEKEEPING_INTERVAL)
+
+
+def _checkpointed(run_id: str, run_key: Optional[str], run):
+    # a run under its own run_id (no explicit run_key) that completed is never resumed: drop its checkpoints.
+    # Stopped, cancelled or failed runs keep them so they can be resumed with run_key=<run_id>.
+    async def wrapped():
+        result = await run()
+        if CHECKPOINTS is not None and run_key is None and not result.get("stop_reason"):
+            CHECKPOINTS.clear(run_id)
+        return result
+    return wrapped
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    background = [asyncio.create_task(WORKFLOWS.watch(WORKFLOW_POLL_INTERVAL)), asyncio.create_task(_housekeeping())]
+    if RUNS is not None:
+        background.append(asyncio.create_task(RUNS.maintain(_cancel_local)))
+    try:
+        yield
+    finally:
+        for task in background:
+            task.cancel()
+        if RUNS is not None:
+            RUNS.close()
+
+
+app = FastAPI(title="Agent Demo API", lifespan=lifespan)
 
 # Allow local dev server
 app.add_middleware(
@@ -24,104 +145,336 @@ app.add_middleware(
 )
 
 
-def load_example_workflow(name: str = "hybrid_workflow.json") -> dict:
-    p = Path(__file__).parent.parent / "examples" / name
-    with p.open("r", encoding="utf-8") as f:
-        return json.load(f)
+def client_key(request: Request) -> str:
+    """Identify the caller for fair scheduling: an X-Client-Id header, else the peer address."""
+    return request.headers.get("x-client-id") or (request.client.host if request.client else "anonymous")
+
+
+def make_budget(timeout: Optional[float], max_tokens: Optional[int]) -> Optional[RunBudget]:
+    timeout = timeout if timeout is not None else RUN_TIMEOUT
+    if timeout is None and max_tokens is None:
+        return None
+    return RunBudget(timeout=timeout, max_tokens=max_tokens)
+
+
+def _tracked(run_id: str, factory):
+    # keep the shared registry's view of a run's state in step with the local scheduler
+    async def run():
+        RUNS.set_state(run_id, "running")
+        try:
+            return await factory()
+        finally:
+            RUNS.set_state(run_id, "finished")
+    return run
+
+
+def submit_run(run_id: str, factory, request: Request, priority: int) -> asyncio.Future:
+    if RUNS is not None:
+        factory = _tracked(run_id, factory)
+    try:
+        fut = SCHEDULER.submit(run_id, factory, client=client_key(request), priority=priority)
+    except SchedulerFull as e:
+        raise HTTPException(status_code=429, detail=str(e), headers={"Retry-After": str(int(e.retry_after + 0.999))})
+    if RUNS is not None:
+        # the run's task has not started yet, so "running" is always recorded after this
+        RUNS.register(run_id)
+    return fut
 
 
 @app.get("/health")
 async def health():
-    return {"status": "ok"}
+    return {"status": "ok", "template_cache": template_cache_stats()}
+
+
+@app.get("/scheduler")
+async def scheduler_stats():
+    """Queue depth, running count, wait-time stats and admission counters of the run scheduler."""
+    return SCHEDULER.stats()
+
+
+@app.get("/rate-limit")
+async def rate_limit_stats():
+    """Token bucket levels, adaptive concurrency limit, in-flight calls and retry counters of the LLM limiter."""
+    return LIMITER.state()
+
+
+RUNS_RUNNING = REGISTRY.gauge("agent_runs_running", "Workflow runs currently executing.")
+RUNS_PENDING = REGISTRY.gauge("agent_runs_pending", "Workflow runs waiting in the scheduler queue.")
+RUNS_TOTAL = REGISTRY.counter("agent_runs_total", "Scheduler admission outcomes.")
+
+
+@app.get("/metrics")
+async def metrics():
+    """Prometheus metrics: span latency histograms, in-flight gauges, LLM sizes and scheduler state."""
+    stats = SCHEDULER.stats()
+    RUNS_RUNNING.set(stats["running"])
+    RUNS_PENDING.set(stats["pending"])
+    for outcome, n in SCHEDULER.counters.items():
+        RUNS_TOTAL.set_total(n, outcome=outcome)
+    return PlainTextResponse(REGISTRY.render(), media_type="text/plain; version=0.0.4")
+
+
+def _byte_range(range_header: Optional[str], offset: Optional[int], length: Optional[int],
+                size: int) -> Optional[tuple]:
+    """(start, end) of the requested slice, from `?offset=&length=` or a single `Range: bytes=a-b` header."""
+    if offset is not None or length is not None:
+        if (offset or 0) < 0 or (length or 0) < 0:
+            raise HTTPException(status_code=416, detail="offset and length must not be negative",
+                                headers={"Content-Range": f"bytes */{size}"})
+        start = offset or 0
+        end = size if length is None else min(size, start + length)
+    elif range_header:
+        unit, _, spec = range_header.partition("=")
+        first, _, last = spec.partition("-")
+        if unit.strip() != "bytes" or not (first or last) or not (first + last).strip().isdigit():
+            raise HTTPException(status_code=416, detail="only a single bytes range is supported")
+        if first:
+            start, end = int(first), size if not last else min(size, int(last) + 1)
+        else:
+            # a suffix range: the last N bytes
+            start, end = max(0, size - int(last)), size
+    else:
+        return None
+    if start >= size or end <= start:
+        raise HTTPException(status_code=416, detail=f"range outside artifact of {size} bytes",
+                            headers={"Content-Range": f"bytes */{size}"})
+    return start, end
+
+
+@app.get("/artifacts/{artifact_id}")
+async def get_artifact(artifact_id: str, request: Request, offset: Optional[int] = None,
+                       length: Optional[int] = None):
+    """Content of a stored step output. Supports range reads (`Range: bytes=a-b` or `?offset=&length=`)."""
+    if ARTIFACTS is None:
+        raise HTTPException(status_code=404, detail="artifact store is not enabled")
+    try:
+        info = ARTIFACTS.info(artifact_id)
+        rng = _byte_range(request.headers.get("range"), offset, length, info["size"])
+        data = ARTIFACTS.read(artifact_id, *(rng or (0, None)))
+    except KeyError:
+        raise HTTPException(status_code=404, detail=f"unknown artifact: {artifact_id}")
+    # artifacts are content-addressed, so their content never changes
+    headers = {"Accept-Ranges": "bytes", "ETag": f'"{artifact_id}"', "Cache-Control": "max-age=31536000, immutable"}
+    if rng is None:
+        return Response(data, media_type=info["content_type"], headers=headers)
+    headers["Content-Range"] = f"bytes {rng[0]}-{rng[1] - 1}/{info['size']}"
+    return Response(data, status_code=206, media_type=info["content_type"], headers=headers)
+
+
+@app.get("/workflows")
+async def list_workflows():
+    """List the loaded workflow ids and any files that failed to load."""
+    return {
+        "workflows": [
+            {"id": wid, "steps": [s.get("id") for s in WORKFLOWS.get(wid).get("steps", [])]} for wid in WORKFLOWS.ids()
+        ],
+        "errors": WORKFLOWS.errors,
+    }
 
 
 @app.post("/run-workflow")
-async def run_workflow(use_openai: bool = False):
-    """Run the example hybrid workflow and return the final memory object.
+async def run_workflow(request: Request, use_openai: bool = False, workflow_id: str = DEFAULT_WORKFLOW,
+                       priority: int = 0, run_key: Optional[str] = None, trace: bool = False,
+                       timeout: Optional[float] = None, max_tokens: Optional[int] = None):
+    """Run a workflow (the hybrid example by default) and return the final memory object.
 
     Query param `use_openai=true` will attempt to use the OpenAIAdapter (requires OPENAI_API_KEY env var).
+    `workflow_id` selects any workflow listed by `GET /workflows`. The run goes through the scheduler and
+    gets a 429 with Retry-After when the queue is full. When CHECKPOINT_STORE is configured, pass your own
+    `run_key` to make repeated runs recompute only the steps whose inputs changed; without one, checkpoints
+    are kept under the run's id only until it completes, so a stopped run can be resumed with that key.
+    `trace=true` adds the run's spans as OTLP/JSON under "trace". `timeout` (seconds, queueing included;
+    default RUN_TIMEOUT_SECONDS) and `max_tokens` bound the run; when either runs out the run stops early
+    and the result carries `stop_reason` and a `budget` usage report.
     """
-    workflow = load_example_workflow()
-    if use_openai:
-        llm = OpenAIAdapter()
-    else:
-        llm = MockLLM()
+    workflow = get_workflow(workflow_id)
+    runner = get_runner(use_openai)
+    run_id = str(uuid.uuid4())
+    budget = make_budget(timeout, max_tokens)
+    run = _checkpointed(run_id, run_key, lambda: runner.run(workflow, run_key=run_key or run_id, trace=trace,
+                                                             budget=budget))
+    fut = submit_run(run_id, run, request, priority)
+    try:
+        # shielded: a client disconnect cancels this handler, not the scheduler's future
+        return await asyncio.shield(fut)
+    except asyncio.CancelledError:
+        if SCHEDULER.state(run_id) is None and fut.cancelled():
+            # the run itself was cancelled (POST /cancel), not this request
+            raise HTTPException(status_code=409, detail="run was cancelled")
+        # the client went away: do not leave the run and its LLM calls going in the background
+        SCHEDULER.cancel(run_id)
+        raise
+
+
+class BatchRequest(BaseModel):
+    items: List[Dict[str, Any]]
+    max_concurrency: int = 8
+
+
+@app.post("/run-batch")
+async def run_batch(request: Request, batch: BatchRequest, use_openai: bool = False,
+                    workflow_id: str = DEFAULT_WORKFLOW, priority: int = 0):
+    """Run a workflow once per item and stream results as JSON lines.
+
+    Each item is a dict of `entry_inputs` overrides (e.g. `{"function_code": "..."}`). Lines are written as
+    runs finish, so they may arrive out of order; each carries its `index`. A failing item produces an
+    `{"index": i, "error": ...}` line without aborting the batch. Every item is a run of its own in the
+    scheduler, so batches share MAX_CONCURRENT_RUNS fairly with other clients; `max_concurrency` is capped to
+    it, and items wait (rather than fail) while the scheduler's queue is full. With CHECKPOINT_STORE, each item
+    checkpoints under its own run id (reported as `checkpoint.run_key`), dropped once the item completes.
+    """
+    workflow = get_workflow(workflow_id)
+    runner = get_runner(use_openai)
+    client = client_key(request)
+
+    async def scheduled(wf: dict):
+        run_id = str(uuid.uuid4())
+        while True:
+            try:
+                # each item checkpoints under its own run id, like /run-workflow without a run_key
+                run = _checkpointed(run_id, None, lambda: runner.run(wf, run_key=run_id))
+                fut = SCHEDULER.submit(run_id, run, client=client, priority=priority)
+                break
+            except SchedulerFull as e:
+                await asyncio.sleep(e.retry_after)
+        try:
+            return await fut
+        except asyncio.CancelledError:
+            # the client went away: stop the run too (a no-op once it has finished)
+            SCHEDULER.cancel(run_id)
+            raise
+
+    async def lines():
+        limit = min(batch.max_concurrency, SCHEDULER.max_concurrent)
+        async for out in runner.run_many(workflow, batch.items, max_concurrency=limit, run=scheduled):
+            yield json.dumps(out, default=str) + "\n"
+
+    return StreamingResponse(lines(), media_type="application/x-ndjson")
+
 
-    tools = {"search": tools_mod.search_tool, "run_tests": tools_mod.run_tests_tool}
-    runner = WorkflowRunner(llm, tools=tools)
-    result = await runner.run(workflow)
-    return result
+def _last_event_id(request: Request, last_event_id: Optional[int]) -> Optional[int]:
+    # EventSource sends Last-Event-ID on reconnect; a query param lets clients request a replay explicitly
+    if last_event_id is not None:
+        return last_event_id
+    header = request.headers.get("last-event-id")
+    return int(header) if header and header.isdigit() else None
+
+
+def _sse_response(hub: RunEventHub, last_event_id: Optional[int]) -> StreamingResponse:
+    sub = hub.subscribe(last_event_id)
+
+    async def event_generator():
+        # Starlette cancels this generator when the client disconnects, so there is nothing to poll
+        try:
+            async for frame in sub:
+                yield frame
+        finally:
+            hub.unsubscribe(sub)
+
+    return StreamingResponse(event_generator(), media_type="text/event-stream")
+
+
+def _forget_run(run_id: str) -> None:
+    # keep the hub around for a while so reconnecting clients can still replay the end of the run
+    asyncio.get_running_loop().call_later(HUB_LINGER_SECONDS, HUBS.pop, run_id, None)
 
 
 @app.get("/stream-workflow")
-async def stream_workflow(request: Request):
+async def stream_workflow(request: Request, use_openai: bool = False, workflow_id: str = DEFAULT_WORKFLOW,
+                          priority: int = 0, run_key: Optional[str] = None, trace: bool = False,
+                          timeout: Optional[float] = None, max_tokens: Optional[int] = None):
     """Stream workflow execution as server-sent events (SSE).
 
-    Connect with EventSource from the browser to receive events.
+    Connect with EventSource from the browser to receive events. Every frame carries an `id`; other clients
+    can attach to the same run (or reconnect) through `/stream-workflow/{run_id}`. The run is admitted by the
+    scheduler: a 429 with Retry-After is returned when the queue is full, and a `queued` event reports the
+    position while it waits. With CHECKPOINT_STORE configured, `run_key` (default: this run's id) names the
+    checkpoints, so a cancelled or crashed run can be resumed by streaming again with `run_key=<old run_id>`.
+    With `trace=true`, step_end and final events carry their span tree and the done event the OTLP trace.
+    `timeout` and `max_tokens` bound the run as for `/run-workflow`; a `budget_exhausted` event reports an
+    early stop.
     """
-    workflow = load_example_workflow()
-    llm = MockLLM()
-    tools = {"search": tools_mod.search_tool, "run_tests": tools_mod.run_tests_tool}
-    runner = WorkflowRunner(llm, tools=tools)
+    workflow = get_workflow(workflow_id)
+    runner = get_runner(use_openai)
 
     run_id = str(uuid.uuid4())
-    queue: asyncio.Queue = asyncio.Queue()
+    budget = make_budget(timeout, max_tokens)
+    hub = RunEventHub(run_id, sink=functools.partial(RUNS.publish, run_id) if RUNS is not None else None)
 
     async def producer():
         try:
-            # announce start
-            await queue.put({"type": "started", "run_id": run_id})
-            result = await runner.run(workflow, event_queue=queue)
+            await hub.put({"type": "started", "run_id": run_id})
+            result = await _checkpointed(run_id, run_key, lambda: runner.run(
+                workflow, event_queue=hub, run_key=run_key or run_id, trace=trace, budget=budget))()
             # final message containing result
-            await queue.put({"type": "done", "result": result})
+            await hub.put({"type": "done", "result": result})
         except asyncio.CancelledError:
             # push cancelled event
-            await queue.put({"type": "cancelled", "run_id": run_id})
+            await hub.put({"type": "cancelled", "run_id": run_id})
         except Exception as e:
-            await queue.put({"type": "error", "error": str(e)})
+            await hub.put({"type": "error", "error": str(e)})
         finally:
-            # cleanup registry
-            TASK_REGISTRY.pop(run_id, None)
+            hub.close()
+            _forget_run(run_id)
 
-    task = asyncio.create_task(producer())
-    # register task and queue
-    TASK_REGISTRY[run_id] = {"task": task, "queue": queue}
+    submit_run(run_id, producer, request, priority)
+    HUBS[run_id] = hub
+    if SCHEDULER.state(run_id) == "queued":
+        await hub.put({"type": "queued", "run_id": run_id, "position": SCHEDULER.position(run_id)})
+    # subscribe from the first event so the opening client sees the whole run
+    return _sse_response(hub, 0)
 
-    async def event_generator():
-        # Yield events from the queue as SSE
-        while True:
-            # If client disconnected, stop producing
-            if await request.is_disconnected():
-                # optionally cancel the task when client disconnects
-                # task.cancel()
-                break
-            try:
-                ev = await asyncio.wait_for(queue.get(), timeout=1.0)
-            except asyncio.TimeoutError:
-                continue
 
-            data = json.dumps(ev, default=str)
-            yield f"data: {data}\n\n"
-            if ev.get("type") in ("done", "error", "cancelled"):
-                break
+@app.get("/stream-workflow/{run_id}")
+async def attach_stream(run_id: str, request: Request, last_event_id: Optional[int] = None):
+    """Attach to an existing run's event stream. Buffered events after `Last-Event-ID` (header or
+    `last_event_id` query param) are replayed first; without one, only new events are sent."""
+    hub = HUBS.get(run_id)
+    if hub is not None:
+        return _sse_response(hub, _last_event_id(request, last_event_id))
+    if RUNS is not None and RUNS.info(run_id) is not None:
+        # the run belongs to another worker process: relay its events from the shared registry
+        return _relay_response(run_id, _last_event_id(request, last_event_id))
+    raise HTTPException(status_code=404, detail=f"unknown run: {run_id}")
+
+
+def _relay_response(run_id: str, last_event_id: Optional[int]) -> StreamingResponse:
+    async def event_generator():
+        async for seq, event in RUNS.relay(run_id, last_event_id):
+            yield sse_frame(seq, event)
 
     return StreamingResponse(event_generator(), media_type="text/event-stream")
 
 
+async def _cancel_local(run_id: str) -> Optional[str]:
+    """Cancel a run owned by this process. Returns its state before cancelling, or None if unknown here."""
+    hub = HUBS.get(run_id)
+    # notify subscribers, then cancel
+    if hub is not None and SCHEDULER.state(run_id) is not None:
+        await hub.put({"type": "cancel_requested", "run_id": run_id})
+    state = SCHEDULER.cancel(run_id)
+    if state == "queued":
+        # the run never started, so its producer will not report the cancellation
+        if hub is not None:
+            await hub.put({"type": "cancelled", "run_id": run_id})
+            _forget_run(run_id)
+        if RUNS is not None:
+            RUNS.set_state(run_id, "finished")
+    return state
+
 
 @app.post("/cancel/{run_id}")
 async def cancel_run(run_id: str):
-    """Cancel a running workflow by run_id. Returns 404 if not found."""
-    entry = TASK_REGISTRY.get(run_id)
-    if not entry:
-        return {"status": "not_found"}
-    task = entry.get("task")
-    queue = entry.get("queue")
-    # cancel task
-    task.cancel()
-    # notify client via queue
-    try:
-        await queue.put({"type": "cancel_requested", "run_id": run_id})
-    except Exception:
-        pass
-    return {"status": "cancelled", "run_id": run_id}
+    """Cancel a queued or running workflow by run_id. Returns {"status": "not_found"} if unknown.
+
+    With RUN_REGISTRY configured, a run owned by another worker process is flagged for cancellation and that
+    worker cancels it within one poll interval; the response then has status "cancel_requested".
+    """
+    state = await _cancel_local(run_id)
+    if state is not None:
+        return {"status": "cancelled", "run_id": run_id, "was": state}
+    if RUNS is not None:
+        info = RUNS.request_cancel(run_id)
+        if info is not None and not info["local"] and info["state"] != "finished":
+            return {"status": "cancel_requested", "run_id": run_id, "owner": info["owner"], "was": info["state"]}
+    return {"status": "not_found"}
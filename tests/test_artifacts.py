@@ -0,0 +1,127 @@
+import asyncio
+import pytest
+from src.agent_demo.artifacts import FileArtifactStore, MemoryArtifactStore, is_artifact_ref
+from src.agent_demo.llm import LLMAdapter
+from src.agent_demo.workflow import WorkflowRunner
+
+
+class ReportLLM(LLMAdapter):
+    """Answers every prompt with a long report."""
+
+    async def generate(self, prompt: str, **opts):
+        return {"text": "line of the report\n" * 500}
+
+
+def test_file_store_offloads_large_values_and_reads_ranges(tmp_path):
+    store = FileArtifactStore(str(tmp_path / "artifacts"), threshold=100)
+    assert store.offload("short") == "short"
+    assert store.offload({"n": 1}) == {"n": 1}
+
+    text = "0123456789" * 50
+    ref = store.offload(text)
+    assert is_artifact_ref(ref) and ref["size"] == 500 and ref["preview"] == text[:200]
+    assert ref["content_type"].startswith("text/plain")
+    assert store.read(ref["id"], 10, 15) == b"01234"
+    assert store.read(ref["id"], 495) == b"56789"
+    assert store.load(ref) == text
+    # identical content is stored once
+    assert store.offload(text)["id"] == ref["id"]
+    assert len(list((tmp_path / "artifacts").glob("*/*.bin"))) == 1
+
+    data = {"items": list(range(100))}
+    assert store.load(store.offload(data)) == data
+
+    with pytest.raises(KeyError):
+        store.read("../../etc/passwd")
+    with pytest.raises(KeyError):
+        store.info("0" * 64)
+    assert store.purge(older_than=-1) == 2
+    with pytest.raises(KeyError):
+        store.read(ref["id"])
+
+
+def test_runner_events_and_results_carry_artifact_refs():
+    workflow = {
+        "id": "report",
+        "entry_inputs": {"topic": "x"},
+        "steps": [
+            {"id": "draft", "template": "Write about {{ inputs.topic }}", "parser": "text", "outputs": ["draft"]},
+            {"id": "count", "template": "{{ memory.draft._raw | length }}", "parser": "text", "outputs": ["length"]},
+        ],
+    }
+
+    class LengthLLM(ReportLLM):
+        async def generate(self, prompt: str, **opts):
+            # the second step still sees the full draft
+            return {"text": prompt} if prompt.isdigit() else await super().generate(prompt, **opts)
+
+    async def _run():
+        store = MemoryArtifactStore(threshold=1024)
+        runner = WorkflowRunner(LengthLLM(), artifact_store=store, stream_tokens=False)
+        q: asyncio.Queue = asyncio.Queue()
+        result = await runner.run(workflow, event_queue=q)
+        events = []
+        while not q.empty():
+            events.append(q.get_nowait())
+        return store, result, events
+
+    store, result, events = asyncio.run(_run())
+    report = "line of the report\n" * 500
+    ends = {e["step_id"]: e["parsed"] for e in events if e["type"] == "step_end"}
+    # text outputs are {"_raw": text}: dict outputs are offloaded field by field
+    assert is_artifact_ref(ends["draft"]["_raw"]) and ends["count"] == {"_raw": str(len(report))}
+    assert result["memory"]["length"] == {"_raw": str(len(report))} and result["memory"]["topic"] == "x"
+    ref = result["memory"]["draft"]["_raw"]
+    assert ref == ends["draft"]["_raw"] and store.load(ref) == report
+
+    async def _fetch():
+        import httpx
+        from src import server
+
+        server.ARTIFACTS = store
+        try:
+            transport = httpx.ASGITransport(app=server.app)
+            async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+                full = await client.get(f"/artifacts/{ref['id']}")
+                part = await client.get(f"/artifacts/{ref['id']}", headers={"Range": "bytes=0-3"})
+                tail = await client.get(f"/artifacts/{ref['id']}", params={"offset": ref["size"] - 7})
+                bad = await client.get(f"/artifacts/{ref['id']}", headers={"Range": "bytes=99999-"})
+                missing = await client.get("/artifacts/" + "0" * 64)
+                negative = [await client.get(f"/artifacts/{ref['id']}", params=p)
+                            for p in ({"offset": -5}, {"length": -1}, {"offset": 2, "length": -3})]
+        finally:
+            server.ARTIFACTS = None
+        assert full.status_code == 200 and full.text == report
+        assert part.status_code == 206 and part.text == "line"
+        assert part.headers["content-range"] == f"bytes 0-3/{ref['size']}"
+        assert tail.status_code == 206 and tail.text == "report\n"
+        assert bad.status_code == 416 and missing.status_code == 404
+        # negative offsets/lengths would otherwise slice from the end
+        assert [r.status_code for r in negative] == [416] * 3
+
+    asyncio.run(_fetch())
+
+
+def test_housekeeping_purges_expired_artifacts(tmp_path):
+    from src import server
+    from src.agent_demo.artifacts import open_artifact_store
+
+    store = open_artifact_store(str(tmp_path / "artifacts"), threshold=10, retention=-1)
+    ref = store.offload("x" * 100)
+    assert MemoryArtifactStore().purge() == 0
+
+    async def _run():
+        server.ARTIFACTS = store
+        task = asyncio.ensure_future(server._housekeeping())
+        try:
+            for _ in range(100):
+                await asyncio.sleep(0.01)
+                if not list((tmp_path / "artifacts").glob("*/*.bin")):
+                    break
+        finally:
+            task.cancel()
+            server.ARTIFACTS = None
+
+    asyncio.run(_run())
+    with pytest.raises(KeyError):
+        store.read(ref["id"])
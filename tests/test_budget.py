@@ -0,0 +1,120 @@
+import asyncio
+import json
+import time
+from src.agent_demo.budget import RunBudget
+from src.agent_demo.llm import LatencyMockLLM, MockLLM
+from src.agent_demo.reactor import ReActAgent
+from src.agent_demo.workflow import WorkflowRunner
+from src.agent_demo import tools as tools_mod
+
+
+def _workflow():
+    with open("examples/hybrid_workflow.json", "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def test_deadline_cancels_in_flight_calls_and_reports_why():
+    async def _run():
+        llm = LatencyMockLLM(distribution="fixed", latency=5.0)
+        runner = WorkflowRunner(llm, tools={"search": tools_mod.search_tool})
+        budget = RunBudget(timeout=0.1)
+        queue = asyncio.Queue()
+        start = time.monotonic()
+        result = await runner.run(_workflow(), event_queue=queue, budget=budget)
+        assert time.monotonic() - start < 1.0
+        assert result["stop_reason"] == "deadline"
+        assert result["budget"]["stop_reason"] == "deadline" and result["budget"]["llm_calls"] == 0
+        events = []
+        while not queue.empty():
+            events.append(queue.get_nowait())
+        assert events[-1] == {"type": "budget_exhausted", "stop_reason": "deadline"}
+        # the cancelled call never completed and nothing is left running
+        await asyncio.sleep(0)
+        assert [t for t in asyncio.all_tasks() if t is not asyncio.current_task()] == []
+
+    asyncio.run(_run())
+
+
+def test_react_stops_early_when_budget_is_spent():
+    async def _run():
+        tools = {"search": tools_mod.search_tool, "run_tests": tools_mod.run_tests_tool}
+        prompt = "You are a ReAct agent. Thought and action."
+
+        budget = RunBudget(max_tokens=1)
+        result = await ReActAgent(MockLLM(), tools, stream_tokens=False).run(prompt, budget=budget)
+        assert result["reason"] == "budget_exhausted" and result["stop_reason"] == "tokens"
+        assert result["iterations"] == 1 and budget.llm_calls == 1 and budget.tokens_used > 1
+
+        # tool calls beyond the budget are skipped and reported to the agent as an observation
+        budget = RunBudget(max_tool_calls=0)
+        queue = asyncio.Queue()
+        await ReActAgent(MockLLM(), tools).run(prompt, event_queue=queue, budget=budget)
+        observations = []
+        while not queue.empty():
+            ev = queue.get_nowait()
+            if ev["type"] == "observation":
+                observations.append(ev["observation"])
+        assert observations[0] == "Tool search skipped: run budget exhausted (tool_calls)"
+        assert budget.stop_reason == "tool_calls"
+
+    asyncio.run(_run())
+
+
+def test_client_disconnect_cancels_the_run_but_cancel_endpoint_reports_409():
+    import pytest
+    from fastapi import HTTPException
+    from src import server
+
+    class FakeRequest:
+        headers = {}
+        client = None
+
+    slow = WorkflowRunner(LatencyMockLLM(distribution="fixed", latency=5.0), tools=server.TOOLS)
+
+    async def _run():
+        original = server.get_runner
+        server.get_runner = lambda use_openai=False: slow
+        try:
+            # the client goes away: the run is cancelled with the request
+            handler = asyncio.ensure_future(server.run_workflow(FakeRequest(), timeout=None, max_tokens=None))
+            await asyncio.sleep(0.05)
+            assert server.SCHEDULER.stats()["running"] == 1
+            handler.cancel()
+            with pytest.raises(asyncio.CancelledError):
+                await handler
+            await asyncio.sleep(0.01)
+            assert server.SCHEDULER.stats()["running"] == 0
+
+            # the run is cancelled through the scheduler (POST /cancel): the request gets a 409
+            handler = asyncio.ensure_future(server.run_workflow(FakeRequest(), timeout=None, max_tokens=None))
+            await asyncio.sleep(0.05)
+            (run_id,) = list(server.SCHEDULER._runs)
+            server.SCHEDULER.cancel(run_id)
+            with pytest.raises(HTTPException) as e:
+                await handler
+            assert e.value.status_code == 409
+        finally:
+            server.get_runner = original
+
+    asyncio.run(_run())
+
+
+def test_budget_stopped_steps_are_not_checkpointed(tmp_path):
+    from src.agent_demo.checkpoint import FileCheckpointStore
+
+    async def _run():
+        store = FileCheckpointStore(str(tmp_path / "ckpt"))
+        tools = {"search": tools_mod.search_tool, "run_tests": tools_mod.run_tests_tool}
+        runner = WorkflowRunner(MockLLM(), tools=tools, stream_tokens=False, checkpoint_store=store)
+        first = await runner.run(_workflow(), run_key="k", budget=RunBudget(max_llm_calls=2))
+        assert first["stop_reason"] == "llm_calls" and first["checkpoint"]["run_key"] == "k"
+        investigate = first["memory"]["investigation"]["react_result"]
+        assert investigate["reason"] == "budget_exhausted"
+        assert "investigate" not in store.load("k")
+
+        # resuming redoes the cut-off investigation instead of reusing it
+        again = await runner.run(_workflow(), run_key="k")
+        assert "summarize" in again["checkpoint"]["reused"] and "investigate" in again["checkpoint"]["computed"]
+        assert again["memory"]["investigation"]["react_result"]["final_answer"] is not None
+
+    asyncio.run(_run())
@@ -0,0 +1,52 @@
+import asyncio
+import json
+from src.agent_demo.events import RunEventHub
+
+
+def _payloads(frames):
+    return [json.loads(f.decode().split("data: ", 1)[1]) for f in frames]
+
+
+def test_hub_fans_out_and_replays_from_last_event_id():
+    async def _run():
+        hub = RunEventHub("r1", buffer_size=3)
+        live = hub.subscribe()
+        for n in range(5):
+            await hub.put({"type": "step", "n": n})
+        await hub.put({"type": "done"})
+        assert hub.closed
+
+        frames = [f async for f in live]
+        assert [p.get("n") for p in _payloads(frames)] == [0, 1, 2, 3, 4, None]
+
+        # late subscriber replays what is still buffered after its last id
+        late = [f async for f in hub.subscribe(last_event_id=4)]
+        assert frames[4:] == late
+        # ids older than the buffer produce a replay_gap notice first
+        gap = _payloads([f async for f in hub.subscribe(last_event_id=1)])
+        assert gap[0] == {"type": "replay_gap", "run_id": "r1", "missed": [2, 3]}
+
+    asyncio.run(_run())
+
+
+def test_hub_slow_consumer_policies():
+    async def _run():
+        hub = RunEventHub("r2", subscriber_queue_size=2, policy="drop")
+        sub = hub.subscribe()
+        for n in range(4):
+            await hub.put({"n": n})
+        hub.close()
+        assert [p["n"] for p in _payloads([f async for f in sub])] == [2, 3]
+        assert sub.dropped == 2
+
+        hub = RunEventHub("r3", subscriber_queue_size=1, policy="block")
+        sub = hub.subscribe()
+        await hub.put({"n": 0})
+        blocked = asyncio.ensure_future(hub.put({"n": 1}))
+        await asyncio.sleep(0)
+        assert not blocked.done()
+        assert _payloads([await sub.__anext__()]) == [{"n": 0}]
+        await blocked
+        assert _payloads([await sub.__anext__()]) == [{"n": 1}]
+
+    asyncio.run(_run())
@@ -0,0 +1,51 @@
+from src.agent_demo.history import PromptHistory
+
+
+def test_history_unbounded_matches_plain_join():
+    h = PromptHistory("Q")
+    assert h.render() == "Q\n\nHistory:\n"
+    h.append("Observation: a")
+    h.append("Observation: b")
+    assert h.render() == "Q\n\nHistory:\n" + "\n".join(["Observation: a", "Observation: b"])
+
+
+def test_history_budget_truncates_old_entries_with_stable_prefix():
+    h = PromptHistory("Q", budget=300, keep_recent=1, truncate_to=20)
+    h.append("Observation: " + "x" * 200)
+    h.append("Observation: " + "y" * 200)
+    assert h.compactions == 1
+    assert len(h.render()) - len("Q\n\nHistory:\n") <= 300
+    assert h.entries[-1].endswith("y" * 200)
+    compacted = h.render()
+    h.append("Observation: z")
+    # appending under budget only extends the prompt
+    assert h.render().startswith(compacted)
+
+
+def test_history_summarize_strategy():
+    h = PromptHistory("Q", budget=160, strategy="summarize", keep_recent=1)
+    for n in range(5):
+        h.append(f"Observation: result {n} " + "." * 30)
+    assert h.entries[0].startswith("Summary of")
+    assert h.entries[-1].startswith("Observation: result 4")
+
+
+def test_history_truncates_each_entry_once_and_keeps_prefix_between_compactions():
+    h = PromptHistory("Q", budget=2000, keep_recent=2, truncate_to=200)
+    for n in range(3):
+        h.append(f"Observation {n}: " + "x" * 700)
+    assert h.compactions == 1
+    first = h.entries[0]
+    h.append("Observation 3: " + "x" * 700)
+    # the entry truncated earlier is left as it was, with the real number of characters removed
+    assert h.entries[0] == first and first.endswith("[truncated 515 chars]")
+    assert "truncated 25 chars" not in h.render()
+
+    h = PromptHistory("Q", budget=2000, keep_recent=2, truncate_to=200)
+    for n in range(5):
+        h.append(f"Observation {n}: " + "x" * 700)
+    compactions, before = h.compactions, h.render()
+    h.append("Observation 5: short")
+    h.append("Observation 6: short")
+    # appends that fit do not compact, so the rendered prompt only grows at the end
+    assert h.compactions == compactions and h.render().startswith(before)
@@ -0,0 +1,274 @@
+import os
+import time
+import asyncio
+import json
+import pytest
+from src.agent_demo.llm import CachingLLM, LLMAdapter
+
+
+class CountingLLM(LLMAdapter):
+    def __init__(self):
+        self.calls = 0
+
+    async def generate(self, prompt: str, **opts):
+        self.calls += 1
+        return {"text": f"{prompt}:{opts.get('temperature')}"}
+
+
+def test_caching_llm_memory_and_disk_tiers(tmp_path):
+    async def _run():
+        db = str(tmp_path / "cache.sqlite")
+        inner = CountingLLM()
+        llm = CachingLLM(inner, db_path=db)
+        assert (await llm.generate("summarize", temperature=0.2))["text"] == "summarize:0.2"
+        await llm.generate("summarize", temperature=0.2)
+        # a different output-affecting opt is a different entry
+        await llm.generate("summarize", temperature=0.7)
+        assert inner.calls == 2
+        assert llm.stats["hits"] == 1
+        llm.close()
+
+        # a fresh adapter over the same file is served from disk
+        inner2 = CountingLLM()
+        llm2 = CachingLLM(inner2, db_path=db)
+        assert (await llm2.generate("summarize", temperature=0.2))["text"] == "summarize:0.2"
+        assert inner2.calls == 0 and llm2.stats["disk_hits"] == 1
+        llm2.close()
+
+    asyncio.run(_run())
+
+
+def test_caching_llm_disk_size_eviction(tmp_path):
+    async def _run():
+        llm = CachingLLM(CountingLLM(), max_entries=1, db_path=str(tmp_path / "c.sqlite"), max_disk_entries=2)
+        for p in ("a", "b", "c"):
+            await llm.generate(p)
+        count = llm._db.execute("SELECT COUNT(*) FROM llm_cache").fetchone()[0]
+        assert count == 2
+        llm.close()
+
+        # a byte budget keeps the most recently used rows that fit, whatever their number
+        llm = CachingLLM(CountingLLM(), max_entries=1, db_path=str(tmp_path / "b.sqlite"), max_disk_bytes=60)
+        for p in ("a" * 10, "b" * 10, "c" * 10, "d" * 10):
+            await llm.generate(p)
+        keys = [r[0] for r in llm._db.execute("SELECT value FROM llm_cache ORDER BY accessed")]
+        assert [json.loads(v)["text"][0] for v in keys] == ["c", "d"] and llm.stats["evictions"] >= 2
+        llm.close()
+
+    asyncio.run(_run())
+
+
+def test_caching_llm_memory_copy_of_a_disk_entry_keeps_its_age(tmp_path):
+    async def _run():
+        db = str(tmp_path / "c.sqlite")
+        llm = CachingLLM(CountingLLM(), db_path=db, ttl=60.0)
+        await llm.generate("a")
+        # the disk row is nearly expired
+        llm._db.execute("UPDATE llm_cache SET created = ?", (time.time() - 59.9,))
+        llm._db.commit()
+        llm.close()
+
+        inner = CountingLLM()
+        llm = CachingLLM(inner, db_path=db, ttl=60.0)
+        await llm.generate("a")
+        assert inner.calls == 0 and llm.stats["disk_hits"] == 1
+        await asyncio.sleep(0.15)
+        # the memory copy expires with the disk row instead of living for another full ttl
+        await llm.generate("a")
+        assert inner.calls == 1 and llm.stats["hits"] == 0
+        llm.close()
+
+    asyncio.run(_run())
+
+
+def test_caching_llm_disk_hits_do_not_write_every_time(tmp_path):
+    async def _run():
+        inner = CountingLLM()
+        llm = CachingLLM(inner, max_entries=1, db_path=str(tmp_path / "c.sqlite"))
+        await llm.generate("a")
+        await llm.generate("b")
+        writes = llm._db.total_changes
+        # "a" and "b" evict each other from memory, so every call is a disk hit
+        for _ in range(5):
+            await llm.generate("a")
+            await llm.generate("b")
+        assert inner.calls == 2 and llm.stats["disk_hits"] == 10
+        assert llm._db.total_changes == writes
+        llm.touch_interval = 0.0
+        await llm.generate("a")
+        assert llm._db.total_changes == writes + 1
+        llm.close()
+
+    asyncio.run(_run())
+
+
+def test_async_openai_adapter_against_stand_in_server():
+    httpx = pytest.importorskip("httpx")
+    fastapi = pytest.importorskip("fastapi")
+    from src.agent_demo.llm import AsyncOpenAIAdapter
+
+    app = fastapi.FastAPI()
+    seen = []
+
+    @app.post("/v1/chat/completions")
+    async def completions(body: dict):
+        seen.append(body)
+        content = body["messages"][-1]["content"].upper()
+        if body.get("stream"):
+            def sse():
+                for ch in content:
+                    yield "data: " + json.dumps({"choices": [{"delta": {"content": ch}}]}) + "\n\n"
+                yield "data: [DONE]\n\n"
+            return fastapi.responses.StreamingResponse(sse(), media_type="text/event-stream")
+        return {"choices": [{"message": {"role": "assistant", "content": content}}], "usage": {"total_tokens": 3}}
+
+    async def _run():
+        llm = AsyncOpenAIAdapter(api_key="test", base_url="http://stand-in/v1", transport=httpx.ASGITransport(app=app))
+        try:
+            resp = await llm.generate("hello", mode="react", temperature=0.0)
+            chunks = [c async for c in llm.generate_stream("hey")]
+        finally:
+            await llm.aclose()
+        assert resp["text"] == "HELLO"
+        assert seen[0]["temperature"] == 0.0
+        assert seen[0]["messages"][0]["role"] == "system"
+        assert chunks == ["H", "E", "Y"]
+
+    asyncio.run(_run())
+
+
+def test_latency_mock_llm_distributions_and_errors():
+    from src.agent_demo.llm import LatencyMockLLM, LLMServiceError, MockLLM
+
+    trace = LatencyMockLLM(distribution="trace", trace=[0.5, 1.5])
+    assert [trace.sample_latency() for _ in range(3)] == [0.5, 1.5, 0.5]
+
+    a = LatencyMockLLM(latency=0.3, sigma=1.0, seed=7)
+    b = LatencyMockLLM(latency=0.3, sigma=1.0, seed=7)
+    samples = [a.sample_latency() for _ in range(200)]
+    assert samples == [b.sample_latency() for _ in range(200)]
+    assert max(samples) > 0.3 > min(samples)
+
+    async def _run():
+        flaky = LatencyMockLLM(distribution="fixed", latency=0.001, error_rate=1.0, error_status=429)
+        with pytest.raises(LLMServiceError) as exc:
+            await flaky.generate("summarize")
+        assert exc.value.status_code == 429
+
+        ok = LatencyMockLLM(distribution="fixed", latency=0.0, tokens_per_second=1000)
+        assert await ok.generate("summarize") == await MockLLM().generate("summarize")
+
+    asyncio.run(_run())
+
+
+def test_cassette_records_and_replays_with_latency(tmp_path):
+    from src.agent_demo.llm import CassetteLLM, CassetteMiss, LatencyMockLLM
+    from src.agent_demo.reactor import ReActAgent
+    from src.agent_demo import tools as tools_mod
+
+    path = str(tmp_path / "traffic.cassette")
+    tools = {"search": tools_mod.search_tool}
+    prompt = "You are a ReAct agent. Thought and action."
+
+    async def _run():
+        live = LatencyMockLLM(distribution="fixed", latency=0.05)
+        recorder = CassetteLLM(path, mode="record", inner=live)
+        recorded = await ReActAgent(recorder, tools).run(prompt, event_queue=asyncio.Queue())
+        await recorder.generate("Summarize this", temperature=0.0)
+        recorder.close()
+        assert recorder.stats["recorded"] == 3 and live.calls == 3
+
+        # replay needs no backend and answers instantly, unless asked to reproduce the recorded latency
+        replay = CassetteLLM(path)
+        start = time.monotonic()
+        again = await ReActAgent(replay, tools).run(prompt, event_queue=asyncio.Queue())
+        assert again == recorded and time.monotonic() - start < 0.05
+        assert (await replay.generate("Summarize this", temperature=0.0))["text"].startswith('{"summary"')
+        with pytest.raises(CassetteMiss):
+            await replay.generate("Summarize this", temperature=0.7)
+        replay.close()
+
+        slow = CassetteLLM(path, replay_latency=True)
+        start = time.monotonic()
+        await slow.generate("Summarize this", temperature=0.0)
+        assert time.monotonic() - start >= 0.04
+
+    asyncio.run(_run())
+
+    # a missing index is rebuilt from the cassette itself
+    os.remove(path + ".idx")
+    rebuilt = CassetteLLM(path)
+    assert rebuilt.stats == {"hits": 0, "misses": 0, "recorded": 0} and len(rebuilt._index) == 3
+    assert os.path.exists(path + ".idx")
+    rebuilt.close()
+
+
+def test_router_prefers_fast_backends_hedges_and_fails_over():
+    from src.agent_demo.llm import LatencyMockLLM, RouterLLM
+
+    async def _run():
+        fast = LatencyMockLLM(distribution="fixed", latency=0.01)
+        slow = LatencyMockLLM(distribution="fixed", latency=2.0)
+        router = RouterLLM([slow, fast], names=["slow", "fast"], policy="least_outstanding", hedge_initial=0.05)
+
+        # every call that lands on the slow backend is hedged to the fast one; the slow call is cancelled
+        start = time.monotonic()
+        replies = await asyncio.gather(*(router.generate("Summarize this") for _ in range(6)))
+        assert time.monotonic() - start < 0.5
+        assert all(r["text"].startswith('{"summary"') for r in replies)
+        stats = router.stats()
+        by_name = {b["name"]: b for b in stats["backends"]}
+        assert stats["hedged"] >= 1 and stats["hedge_wins"] == stats["hedged"]
+        assert by_name["slow"]["wins"] == 0 and by_name["slow"]["cancelled"] == by_name["slow"]["calls"]
+        assert by_name["slow"]["outstanding"] == 0
+
+        # latency-EWMA routing learns to send everything to the fast backend
+        router = RouterLLM([slow, fast], names=["slow", "fast"], policy="ewma", hedge_initial=0.05)
+        for _ in range(5):
+            await router.generate("Summarize this")
+        assert [b["calls"] for b in router.stats()["backends"]] == [1, 5]
+
+        # streams race on time to first chunk
+        pieces = [p async for p in router.generate_stream("Summarize this")]
+        assert "".join(pieces).startswith('{"summary"')
+
+        # a failing backend is failed over to another one
+        broken = LatencyMockLLM(distribution="fixed", latency=0.0, error_rate=1.0)
+        router = RouterLLM([broken, fast], policy="least_outstanding", hedge=False)
+        for _ in range(4):
+            assert (await router.generate("Summarize this"))["text"]
+        assert broken.errors >= 1 and router.counters["failovers"] == broken.errors
+
+    asyncio.run(_run())
+
+
+def test_cassette_survives_a_torn_last_record(tmp_path):
+    from src.agent_demo.llm import CassetteLLM, MockLLM
+
+    path = str(tmp_path / "torn.cassette")
+
+    async def _run():
+        recorder = CassetteLLM(path, mode="record", inner=MockLLM())
+        await recorder.generate("Summarize this")
+        recorder.close()
+        # an interrupted recording: half a record, no newline, index out of date
+        with open(path, "ab") as f:
+            f.write(b'{"k":"abc","t":"par')
+
+        replay = CassetteLLM(path)
+        assert len(replay._index) == 1 and (await replay.generate("Summarize this"))["text"]
+        replay.close()
+
+        auto = CassetteLLM(path, mode="auto", inner=MockLLM())
+        await auto.generate("Summarize this", temperature=0.5)
+        auto.close()
+        with open(path, "rb") as f:
+            lines = f.read().split(b"\n")
+        # the torn record was cut off before the new one was appended
+        assert lines[-1] == b"" and all(json.loads(line) for line in lines[:-1]) and len(lines) == 4
+
+        again = CassetteLLM(path)
+        assert len(again._index) == 2
+        again.close()
+
+    asyncio.run(_run())
@@ -0,0 +1,146 @@
+import time
+import asyncio
+import pytest
+from src.agent_demo.budget import RunBudget, use_budget
+from src.agent_demo.llm import LLMAdapter, LLMServiceError, MockLLM
+from src.agent_demo.ratelimit import RateLimitedLLM, RateLimiter
+
+
+class OverloadedLLM(LLMAdapter):
+    """Fails the first `failures` calls with the given status, then answers."""
+
+    def __init__(self, failures: int, status: int = 429):
+        self.failures = failures
+        self.status = status
+        self.calls = 0
+
+    async def generate(self, prompt: str, **opts):
+        self.calls += 1
+        n = self.calls
+        await asyncio.sleep(0.01)
+        if n <= self.failures:
+            raise LLMServiceError("slow down", status_code=self.status)
+        return {"text": "ok", "usage": {"total_tokens": 10}}
+
+
+def test_token_buckets_pace_requests_and_tokens():
+    async def _run():
+        llm = RateLimitedLLM(MockLLM(), requests_per_minute=1200, request_burst=2)
+        start = time.monotonic()
+        await asyncio.gather(*(llm.generate("Summarize this") for _ in range(6)))
+        # 2 calls from the burst, then 20 per second
+        assert 0.18 <= time.monotonic() - start < 1.0
+
+        limiter = RateLimiter(tokens_per_minute=60000, token_burst=100, reply_tokens=50)
+        llm = RateLimitedLLM(OverloadedLLM(0), limiter)
+        await llm.generate("x" * 200)
+        # 100 tokens estimated (50 prompt + 50 reply), 10 used: the difference is refunded
+        assert limiter.state()["tokens_available"] > 90
+        assert limiter.counters["calls"] == 1
+
+    asyncio.run(_run())
+
+
+def test_token_limit_holds_for_calls_bigger_than_the_burst():
+    class BigLLM(LLMAdapter):
+        async def generate(self, prompt: str, **opts):
+            return {"text": "ok", "usage": {"total_tokens": opts["max_tokens"]}}
+
+    async def _run():
+        # 1000 tokens per second with a 100-token burst; every call costs 200
+        limiter = RateLimiter(tokens_per_minute=60000, token_burst=100)
+        llm = RateLimitedLLM(BigLLM(), limiter)
+        start = time.monotonic()
+        for _ in range(4):
+            await llm.generate("q", max_tokens=200)
+        # the first call goes out on the full bucket, each later one waits out the previous call's debt
+        assert 0.55 <= time.monotonic() - start < 1.5
+        assert limiter.state()["tokens_available"] < 0
+
+    asyncio.run(_run())
+
+
+def test_adaptive_concurrency_backs_off_retries_and_recovers():
+    async def _run():
+        inner = OverloadedLLM(3)
+        limiter = RateLimiter(initial_concurrency=4, base_delay=0.01, max_delay=0.05, seed=1)
+        llm = RateLimitedLLM(inner, limiter)
+        replies = await asyncio.gather(*(llm.generate("q") for _ in range(4)))
+        assert [r["text"] for r in replies] == ["ok"] * 4
+        state = limiter.state()
+        assert state["overloads"] == 3 and state["retries"] == 3 and state["inflight"] == 0
+        # the three 429s came from calls started together: one multiplicative decrease, then additive growth
+        assert 2.0 <= state["concurrency_limit"] < 4.0
+        for _ in range(10):
+            await llm.generate("q")
+        assert limiter.state()["concurrency_limit"] > state["concurrency_limit"]
+
+        # client errors are not retried
+        bad = RateLimitedLLM(OverloadedLLM(1, status=400), base_delay=0.01)
+        with pytest.raises(LLMServiceError):
+            await bad.generate("q")
+        assert bad.inner.calls == 1 and bad.limiter.counters["errors"] == 1
+
+        # no retry is attempted when its backoff would overrun the run's deadline
+        slow_retry = RateLimitedLLM(OverloadedLLM(1), base_delay=10.0, seed=1)
+        with use_budget(RunBudget(timeout=0.5)):
+            with pytest.raises(LLMServiceError):
+                await slow_retry.generate("q")
+        assert slow_retry.limiter.counters["retries"] == 0
+
+        # streams are retried when they fail before the first chunk
+        streamed = RateLimitedLLM(OverloadedLLM(1), base_delay=0.01)
+        pieces = [p async for p in streamed.generate_stream("q")]
+        assert "".join(pieces) == "ok" and streamed.limiter.counters["retries"] == 1
+
+    asyncio.run(_run())
+
+
+def test_openai_v0_errors_are_retried_and_shrink_the_limit():
+    class RateLimitError(Exception):
+        # shaped like openai 0.x errors: the status in `http_status`, response headers in `headers`
+        def __init__(self):
+            super().__init__("Rate limit reached")
+            self.http_status = 429
+            self.headers = {"retry-after": "0.05"}
+
+    class OpenAIV0LLM(LLMAdapter):
+        calls = 0
+
+        async def generate(self, prompt: str, **opts):
+            self.calls += 1
+            if self.calls == 1:
+                raise RateLimitError()
+            return {"text": "ok"}
+
+    async def _run():
+        limiter = RateLimiter(initial_concurrency=4, base_delay=0.0)
+        llm = RateLimitedLLM(OpenAIV0LLM(), limiter)
+        start = time.monotonic()
+        assert (await llm.generate("q"))["text"] == "ok"
+        # Retry-After is honoured even though the jittered backoff is 0
+        assert time.monotonic() - start >= 0.05
+        assert limiter.counters["overloads"] == 1 and limiter.counters["retries"] == 1
+        assert limiter.state()["concurrency_limit"] < 4
+
+    asyncio.run(_run())
+
+
+def test_stream_releases_its_slot_while_backing_off():
+    async def _run():
+        limiter = RateLimiter(initial_concurrency=1, base_delay=0.2, max_delay=0.2, seed=3)
+        streamed = RateLimitedLLM(OverloadedLLM(1), limiter)
+        other = RateLimitedLLM(OverloadedLLM(0), limiter)
+
+        async def consume():
+            return "".join([p async for p in streamed.generate_stream("q")])
+
+        task = asyncio.ensure_future(consume())
+        while limiter.counters["retries"] == 0:
+            await asyncio.sleep(0.005)
+        # the failed stream is sleeping before its retry: its slot is free for other calls
+        assert limiter.concurrency.inflight == 0
+        assert (await asyncio.wait_for(other.generate("q"), 0.1))["text"] == "ok"
+        assert await task == "ok"
+
+    asyncio.run(_run())
@@ -1,4 +1,5 @@
 import asyncio
+import time
 import json
 from src.agent_demo.llm import MockLLM
 from src.agent_demo.reactor import ReActAgent
@@ -20,3 +21,192 @@ def test_react_emits_events():
         assert result.get("final_answer") is not None or result.get("reason") == "max_iters_reached"
 
     asyncio.run(_run())
+
+
+def test_react_streams_tokens_and_dispatches_tool_early():
+    from src.agent_demo.parsing import IncrementalJSONObject
+
+    parser = IncrementalJSONObject()
+    parser.feed('```json\n{"thought": "t", "action": "sea')
+    assert parser.members == {"thought": "t"}
+    parser.feed('rch", "action_input": {"query": "x"}, "final_')
+    assert parser.members["action_input"] == {"query": "x"}
+    parser.feed('answer": null}')
+    assert parser.done and parser.members["final_answer"] is None
+
+    async def _run():
+        calls = []
+
+        async def search(inp):
+            calls.append(inp)
+            return "found"
+
+        agent = ReActAgent(MockLLM(), tools={"search": search}, max_iters=4)
+        queue = asyncio.Queue()
+        result = await agent.run("You are a ReAct agent. Thought and action.", event_queue=queue)
+        items = []
+        while not queue.empty():
+            items.append(queue.get_nowait())
+        tokens = [e for e in items if e["type"] == "token"]
+        assert len(tokens) > 1
+        assert calls == [{"query": "recursive factorial common bugs"}]
+        assert result["final_answer"]
+
+    asyncio.run(_run())
+
+
+def test_early_tool_call_is_cancelled_when_the_stream_fails():
+    from src.agent_demo.llm import LLMAdapter, LLMServiceError
+
+    class BrokenStreamLLM(LLMAdapter):
+        async def generate_stream(self, prompt: str, **opts):
+            yield '{"thought": "t", "action": "search", "action_input": {"query": "x"}, '
+            await asyncio.sleep(0.01)
+            raise LLMServiceError("connection reset", status_code=502)
+
+    async def _run():
+        cancelled = []
+
+        async def search(inp):
+            try:
+                await asyncio.sleep(3600)
+            except asyncio.CancelledError:
+                cancelled.append(inp)
+                raise
+
+        agent = ReActAgent(BrokenStreamLLM(), tools={"search": search}, max_iters=1)
+        try:
+            await agent.run("You are a ReAct agent. Thought and action.", event_queue=asyncio.Queue())
+        except LLMServiceError:
+            pass
+        # the cancellation reaches the tool through the executor's wait_for
+        await asyncio.sleep(0.01)
+        # the tool dispatched from the partial reply did not outlive it
+        assert cancelled == [{"query": "x"}]
+        assert [t for t in asyncio.all_tasks() if t is not asyncio.current_task()] == []
+
+    asyncio.run(_run())
+
+
+def test_react_runs_multiple_actions_concurrently_with_timeouts():
+    import time
+    from src.agent_demo.llm import LLMAdapter
+    from src.agent_demo.tools import ToolExecutor
+
+    class MultiActionLLM(LLMAdapter):
+        async def generate(self, prompt, **opts):
+            if "Observation" in prompt:
+                return {"text": json.dumps({"thought": "done", "final_answer": prompt.split("History:\n", 1)[1]})}
+            return {"text": json.dumps({"thought": "fan out", "actions": [
+                {"action": "slow_sync", "action_input": {"n": 1}},
+                {"action": "search", "action_input": {"query": "factorial"}},
+                {"action": "hang", "action_input": {}},
+            ]})}
+
+    def slow_sync(inp):
+        time.sleep(0.05)
+        return f"slow {inp['n']}"
+
+    async def hang(inp):
+        await asyncio.sleep(10)
+
+    async def _run():
+        tools = {"slow_sync": slow_sync, "search": tools_mod.search_tool, "hang": hang}
+        executor = ToolExecutor(default_timeout=5.0, timeouts={"hang": 0.1}, concurrency={"slow_sync": 1})
+        agent = ReActAgent(MultiActionLLM(), tools=tools, executor=executor)
+        result = await agent.run("investigate")
+        lines = result["final_answer"].splitlines()
+        assert lines[0] == "Observation 1 (slow_sync): slow 1"
+        assert lines[1].startswith("Observation 2 (search): Search results")
+        assert lines[2] == "Observation 3 (hang): Tool hang timed out after 0.1s"
+
+    asyncio.run(_run())
+
+
+def test_react_repairs_sloppy_replies_without_reprompting():
+    from src.agent_demo.llm import LLMAdapter
+    from src.agent_demo.parsing import parse_react_reply
+
+    assert parse_react_reply('{"thought": "t", "final_answer": "x"}') == ({"thought": "t", "final_answer": "x"}, "strict")
+    payload, how = parse_react_reply('Sure! Here you go:\n```json\n{"thought": "t", "action": "search",'
+                                     ' "action_input": {"query": "a, }"},}\n```\nLet me know.')
+    assert how == "fenced+commas" and payload["action_input"] == {"query": "a, }"}
+    assert parse_react_reply('I think {"thought": "t", "final_answer": None} works')[1] == "extracted+literals"
+    # valid JSON that is not a ReAct reply is not accepted
+    assert parse_react_reply('{"answer": 42}') == (None, None)
+    assert parse_react_reply("no json here") == (None, None)
+
+    class SloppyLLM(LLMAdapter):
+        def __init__(self):
+            self.prompts = []
+
+        async def generate(self, prompt, **opts):
+            self.prompts.append(prompt)
+            if "not valid JSON" in prompt:
+                return {"text": '{"thought": "fixed", "final_answer": "after reprompt"}'}
+            if "Observation" in prompt:
+                return {"text": "Final:\n```\n{'thought': 'single quotes are beyond repair'}\n```"}
+            return {"text": 'Thinking...\n{"thought": "look", "action": "search", "action_input": {"query": "q"},}'}
+
+    async def _run():
+        llm = SloppyLLM()
+        agent = ReActAgent(llm, tools={"search": tools_mod.search_tool}, stream_tokens=False)
+        result = await agent.run("task")
+        assert result == {"final_answer": "after reprompt", "iterations": 2}
+        # one reply repaired locally, one truly unrecoverable reply re-prompted once
+        assert agent.parse_stats == {"strict": 1, "fenced": 0, "extracted": 1, "reprompts": 1}
+        assert len(llm.prompts) == 3
+
+    asyncio.run(_run())
+
+
+def test_speculative_branches_cancel_losers_and_share_tools():
+    from src.agent_demo.llm import LLMAdapter
+    from src.agent_demo.reactor import accept_answer
+
+    class TemperatureLLM(LLMAdapter):
+        # 0.2: careful and slow, 0.5: answers at once but vaguely, 0.9: quick
+        async def generate(self, prompt: str, **opts):
+            temperature = opts["temperature"]
+            seen = prompt.count("Observation")
+            if temperature == 0.5:
+                await asyncio.sleep(0.01)
+                return {"text": json.dumps({"thought": "guess", "final_answer": "maybe"})}
+            await asyncio.sleep(0.01 if seen == 0 else (0.5 if temperature == 0.2 else 0.02))
+            if seen == 0:
+                reply = {"thought": "look it up", "action": "search", "action_input": {"query": "factorial"}}
+            else:
+                reply = {"thought": "done", "final_answer": f"answer at {temperature}"}
+            return {"text": json.dumps(reply)}
+
+    searches = []
+
+    async def search(inp):
+        searches.append(inp)
+        await asyncio.sleep(0.05)
+        return "guard negative inputs"
+
+    async def _run():
+        agent = ReActAgent(TemperatureLLM(), tools={"search": search}, max_iters=4)
+        queue = asyncio.Queue()
+        result = await agent.run_speculative("Investigate.", [{"temperature": 0.2}, {"temperature": 0.5},
+                                                              {"temperature": 0.9}],
+                                             accept=accept_answer(pattern="answer"), event_queue=queue)
+        events = []
+        while not queue.empty():
+            events.append(queue.get_nowait())
+        return result, events
+
+    start = time.monotonic()
+    result, events = asyncio.run(_run())
+    assert time.monotonic() - start < 0.4
+    assert result["final_answer"] == "answer at 0.9" and result["branch"] == 2
+    spec = result["speculation"]
+    assert [b["status"] for b in spec["branches"]] == ["cancelled", "rejected", "won"]
+    # both tool-using branches asked for the same search: it ran once
+    assert len(searches) == 1 and spec["tool_calls"] == 1 and spec["shared_tool_results"] == 1
+    assert spec["llm_calls"] == 5 and spec["extra_llm_calls"] == 3
+    assert spec["latency_saved_estimate"] > 0
+    assert [e["branch"] for e in events if e["type"] == "branch_end"] == [1, 2]
+    finals = [e for e in events if e["type"] == "final"]
+    assert len(finals) == 1 and finals[0]["speculation"]["winner"] == 2
@@ -0,0 +1,36 @@
+import json
+import os
+from src.agent_demo.registry import WorkflowRegistry, default_registry
+
+
+def _write(path, workflow, mtime):
+    path.write_text(json.dumps(workflow), encoding="utf-8")
+    os.utime(path, ns=(mtime, mtime))
+
+
+def test_registry_loads_examples():
+    registry = default_registry()
+    assert {"hybrid_demo", "react_only", "template_only"} <= set(registry.ids())
+    assert registry.errors == {}
+
+
+def test_registry_reloads_changed_files_and_keeps_last_good(tmp_path):
+    path = tmp_path / "wf.json"
+    _write(path, {"id": "wf", "steps": [{"id": "a", "template": "v1"}]}, 1_000_000_000)
+    registry = WorkflowRegistry(str(tmp_path))
+    assert registry.refresh() == ["wf"]
+    assert registry.refresh() == []
+
+    _write(path, {"id": "wf", "steps": [{"id": "a", "template": "v2"}]}, 2_000_000_000)
+    assert registry.refresh() == ["wf"]
+    assert registry.get("wf")["steps"][0]["template"] == "v2"
+
+    # an invalid edit is reported and the previous version keeps serving
+    _write(path, {"id": "wf", "steps": [{"id": "a", "template": "{{ broken"}]}, 3_000_000_000)
+    assert registry.refresh() == []
+    assert registry.get("wf")["steps"][0]["template"] == "v2"
+    assert str(path) in registry.errors
+
+    path.unlink()
+    assert registry.refresh() == ["wf"]
+    assert "wf" not in registry
@@ -0,0 +1,59 @@
+import asyncio
+import functools
+from src.agent_demo.events import RunEventHub
+from src.agent_demo.runs import SQLiteRunRegistry
+
+
+def test_shared_registry_relays_events_and_cancels_across_workers(tmp_path):
+    async def _run():
+        path = str(tmp_path / "runs.db")
+        # two registries on one file stand in for two worker processes
+        owner = SQLiteRunRegistry(path, worker_id="w1", poll_interval=0.01)
+        other = SQLiteRunRegistry(path, worker_id="w2", poll_interval=0.01)
+
+        owner.register("r1")
+        owner.set_state("r1", "running")
+        hub = RunEventHub("r1", sink=functools.partial(owner.publish, "r1"))
+        await hub.put({"type": "started"})
+        owner.flush()
+        assert other.info("r1")["owner"] == "w1" and not other.info("r1")["local"]
+
+        # a relay on the other worker replays from the given id and follows new events
+        relayed = []
+
+        async def follow():
+            async for seq, event in other.relay("r1", last_id=0):
+                relayed.append((seq, event["type"]))
+
+        follower = asyncio.ensure_future(follow())
+        await asyncio.sleep(0.03)
+
+        # the other worker asks for a cancel; only the owner receives it, exactly once
+        assert other.request_cancel("r1")["state"] == "running"
+        assert other.take_cancel_requests() == []
+        cancelled = []
+
+        async def on_cancel(run_id):
+            cancelled.append(run_id)
+            await hub.put({"type": "cancelled", "run_id": run_id})
+            owner.set_state(run_id, "finished")
+
+        maintainer = asyncio.ensure_future(owner.maintain(on_cancel))
+        await asyncio.wait_for(follower, 1.0)
+        maintainer.cancel()
+        assert cancelled == ["r1"]
+        assert relayed == [(1, "started"), (2, "cancelled")]
+        assert other.request_cancel("r1")["state"] == "finished"
+        assert owner.take_cancel_requests() == []
+
+        # runs whose owner stopped heartbeating are reported instead of waited on forever
+        other.register("r2", state="running")
+        other.close()
+        lost = [e async for _, e in owner.relay("r2")]
+        assert lost[0]["type"] == "error" and "w2" in lost[0]["error"]
+
+        assert owner.purge(older_than=0) == 1
+        assert owner.info("r1") is None
+        owner.close()
+
+    asyncio.run(_run())
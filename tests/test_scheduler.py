@@ -0,0 +1,124 @@
+import asyncio
+import pytest
+from src.agent_demo.scheduler import RunScheduler, SchedulerFull
+
+
+def test_scheduler_caps_queues_fairly_and_cancels():
+    async def _run():
+        sched = RunScheduler(max_concurrent=1, max_pending=3)
+        started = []
+        gate = asyncio.Event()
+
+        def job(name):
+            async def run():
+                started.append(name)
+                await gate.wait()
+                return name
+            return run
+
+        first = sched.submit("a1", job("a1"), client="a")
+        sched.submit("a2", job("a2"), client="a")
+        sched.submit("a3", job("a3"), client="a")
+        sched.submit("b1", job("b1"), client="b")
+        with pytest.raises(SchedulerFull) as exc:
+            sched.submit("c1", job("c1"), client="c")
+        assert exc.value.retry_after >= 1
+
+        assert sched.state("a1") == "running" and sched.state("a3") == "queued"
+        assert sched.cancel("a3") == "queued"
+        stats = sched.stats()
+        assert stats["running"] == 1 and stats["pending"] == 2 and stats["rejected"] == 1
+
+        gate.set()
+        assert await first == "a1"
+        while sched.stats()["running"] or sched.stats()["pending"]:
+            await asyncio.sleep(0)
+        assert started == ["a1", "a2", "b1"]
+
+    asyncio.run(_run())
+
+
+def test_scheduler_prefers_higher_priority_and_round_robins_clients():
+    async def _run():
+        sched = RunScheduler(max_concurrent=1, max_pending=10)
+        order = []
+        gate = asyncio.Event()
+
+        def job(name):
+            async def run():
+                order.append(name)
+                await gate.wait()
+            return run
+
+        sched.submit("blocker", job("blocker"))
+        for name in ("a1", "a2", "a3"):
+            sched.submit(name, job(name), client="a")
+        sched.submit("b1", job("b1"), client="b")
+        sched.submit("urgent", job("urgent"), client="c", priority=5)
+        gate.set()
+        while sched.stats()["running"] or sched.stats()["pending"]:
+            await asyncio.sleep(0)
+        assert order == ["blocker", "urgent", "a1", "b1", "a2", "a3"]
+
+    asyncio.run(_run())
+
+
+def test_scheduler_keeps_dispatching_after_a_caller_cancels_its_future():
+    async def _run():
+        sched = RunScheduler(max_concurrent=1, max_pending=4)
+
+        async def work(v):
+            await asyncio.sleep(0.02)
+            return v
+
+        first = sched.submit("a", lambda: work(1))
+        second = sched.submit("b", lambda: work(2))
+        # a caller awaiting the future directly cancels it when its own task is cancelled
+        first.cancel()
+        assert await asyncio.wait_for(second, 1.0) == 2
+        assert sched.stats()["running"] == 0 and sched.stats()["pending"] == 0
+
+    asyncio.run(_run())
+
+
+def test_run_batch_goes_through_the_scheduler(tmp_path):
+    import json
+    import httpx
+    from src import server
+    from src.agent_demo.checkpoint import FileCheckpointStore
+    from src.agent_demo.llm import MockLLM
+    from src.agent_demo.workflow import WorkflowRunner
+
+    sched = RunScheduler(max_concurrent=2, max_pending=8)
+    peak = []
+
+    class SlowLLM(MockLLM):
+        async def generate(self, prompt: str, **opts):
+            peak.append(sched.stats()["running"])
+            await asyncio.sleep(0.01)
+            return await super().generate(prompt, **opts)
+
+    async def _run():
+        original = server.SCHEDULER, server.get_runner
+        server.SCHEDULER = sched
+        store = server.CHECKPOINTS = FileCheckpointStore(str(tmp_path / "ckpt"))
+        runner = WorkflowRunner(SlowLLM(), tools=server.TOOLS, checkpoint_store=store)
+        server.get_runner = lambda use_openai=False: runner
+        try:
+            transport = httpx.ASGITransport(app=server.app)
+            async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+                resp = await client.post("/run-batch", json={"items": [{}] * 5, "max_concurrency": 100})
+        finally:
+            server.SCHEDULER, server.get_runner = original
+            server.CHECKPOINTS = None
+        lines = [json.loads(line) for line in resp.text.splitlines()]
+        assert sorted(o["index"] for o in lines) == list(range(5)) and all("result" in o for o in lines)
+        # every item was a scheduler run, and the requested concurrency was capped to the scheduler's
+        assert sched.counters["submitted"] == 5 and sched.counters["completed"] == 5
+        assert max(peak) == 2
+        # items checkpoint under their own keys (never reusing each other's steps) and clean up when done
+        keys = {o["result"]["checkpoint"]["run_key"] for o in lines}
+        assert len(keys) == 5 and not any(o["result"]["checkpoint"]["reused"] for o in lines)
+        assert list((tmp_path / "ckpt").iterdir()) == []
+
+    asyncio.run(_run())
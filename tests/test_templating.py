@@ -13,3 +13,17 @@ def test_safe_get_helper():
     ctx = {"inputs": {}, "memory": {"investigation": {"react_result": {"final_answer": "done"}}}}
     out = render_template(tpl, ctx)
     assert "done" in out
+
+
+def test_template_cache_and_precompile():
+    from src.agent_demo import templating
+
+    templating.clear_template_cache()
+    workflow = {"steps": [{"id": "a", "template": "A {{ inputs.x }}"}, {"id": "b", "template": "B {{ inputs.x }}"}]}
+    assert templating.precompile_workflow(workflow) == 2
+    stats = templating.template_cache_stats()
+    assert stats["misses"] == 2 and stats["hits"] == 0
+
+    out = render_template("A {{ inputs.x }}", {"inputs": {"x": 1}})
+    assert out == "A 1"
+    assert templating.template_cache_stats()["hits"] == 1
@@ -0,0 +1,57 @@
+import asyncio
+from src.agent_demo.tools import MemoizingToolRegistry
+
+
+def test_memoizing_registry_caches_and_coalesces():
+    calls = []
+
+    async def search(inp):
+        calls.append(inp)
+        await asyncio.sleep(0.02)
+        return "result for " + inp["query"]
+
+    def side_effect(inp):
+        calls.append(("side", inp))
+        return "ran"
+
+    async def _run():
+        tools = MemoizingToolRegistry({"search": search, "side": side_effect}, no_cache=["side"])
+        # concurrent identical calls (key order ignored) execute once
+        results = await asyncio.gather(
+            tools["search"]({"query": "x", "k": 1}),
+            tools.get("search")({"k": 1, "query": "x"}),
+        )
+        assert results == ["result for x", "result for x"]
+        assert await tools["search"]({"query": "x", "k": 1}) == "result for x"
+        assert len(calls) == 1
+        assert tools.stats == {"hits": 1, "misses": 1, "coalesced": 1}
+
+        assert tools["side"] is side_effect
+        assert set(tools) == {"search", "side"}
+
+    asyncio.run(_run())
+
+
+def test_hung_call_is_cancelled_once_every_caller_gives_up():
+    from src.agent_demo.tools import ToolExecutor
+
+    started = []
+
+    async def lookup(inp):
+        started.append(inp)
+        if len(started) == 1:
+            # the first call hangs
+            await asyncio.sleep(3600)
+        return "found"
+
+    async def _run():
+        tools = MemoizingToolRegistry({"lookup": lookup})
+        executor = ToolExecutor(default_timeout=0.05)
+        first = await executor.call("lookup", tools["lookup"], {"q": 1})
+        assert first == "Tool lookup timed out after 0.05s"
+        # the orphaned call was cancelled and dropped, so the next identical call runs afresh
+        assert await executor.call("lookup", tools["lookup"], {"q": 1}) == "found"
+        assert len(started) == 2 and tools.stats["coalesced"] == 0
+        assert tools._inflight == {} and tools._waiters == {}
+
+    asyncio.run(_run())
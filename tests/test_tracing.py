@@ -0,0 +1,70 @@
+import asyncio
+import json
+from src.agent_demo.llm import MockLLM
+from src.agent_demo.workflow import WorkflowRunner
+from src.agent_demo.metrics import Registry
+from src.agent_demo import tools as tools_mod
+
+
+def test_run_trace_nests_spans_and_exports_otlp():
+    async def _run():
+        with open("examples/hybrid_workflow.json", "r", encoding="utf-8") as f:
+            workflow = json.load(f)
+        tools = {"search": tools_mod.search_tool, "run_tests": tools_mod.run_tests_tool}
+        runner = WorkflowRunner(MockLLM(), tools=tools)
+        queue = asyncio.Queue()
+        result = await runner.run(workflow, event_queue=queue, trace=True)
+        events = []
+        while not queue.empty():
+            events.append(queue.get_nowait())
+
+        step_ends = [e for e in events if e["type"] == "step_end"]
+        assert step_ends and all(e["spans"]["name"] == "workflow.step" for e in step_ends)
+        react_end = next(e for e in step_ends if "react_result" in e["parsed"])
+        react = next(c for c in react_end["spans"]["children"] if c["name"] == "react.run")
+        iteration = react["children"][0]
+        assert iteration["name"] == "react.iteration"
+        assert "llm.generate" in [c["name"] for c in iteration["children"]]
+        assert any(e["type"] == "final" and "spans" in e for e in events)
+
+        spans = result["trace"]["resourceSpans"][0]["scopeSpans"][0]["spans"]
+        by_id = {s["spanId"]: s for s in spans}
+        root = [s for s in spans if "parentSpanId" not in s]
+        assert [s["name"] for s in root] == ["workflow.run"]
+        assert all(s["parentSpanId"] in by_id for s in spans if s is not root[0])
+        assert len({s["traceId"] for s in spans}) == 1
+        assert "tool.call" in {s["name"] for s in spans}
+
+        # untraced runs do not attach spans to events or results
+        plain = await runner.run(workflow)
+        assert "trace" not in plain
+
+    asyncio.run(_run())
+
+
+def test_metrics_render_prometheus_text():
+    reg = Registry()
+    h = reg.histogram("demo_seconds", "Demo.", buckets=(0.1, 1.0))
+    h.observe(0.05, span="a")
+    h.observe(0.5, span="a")
+    reg.gauge("demo_inflight", "Demo.").inc(span="a")
+    text = reg.render()
+    assert '# TYPE demo_seconds histogram' in text
+    assert 'demo_seconds_bucket{span="a",le="0.1"} 1' in text
+    assert 'demo_seconds_bucket{span="a",le="+Inf"} 2' in text
+    assert 'demo_seconds_count{span="a"} 2' in text
+    assert 'demo_inflight{span="a"} 1' in text
+
+    async def _run():
+        import httpx
+        from src import server
+
+        transport = httpx.ASGITransport(app=server.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            await client.post("/run-workflow")
+            resp = await client.get("/metrics")
+        assert resp.status_code == 200
+        assert 'agent_span_duration_seconds_count{span="workflow.run"}' in resp.text
+        assert "agent_runs_running 0" in resp.text
+
+    asyncio.run(_run())
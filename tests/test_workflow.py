@@ -0,0 +1,225 @@
+import asyncio
+import json
+import time
+import pytest
+from src.agent_demo.llm import LLMAdapter
+from src.agent_demo.workflow import WorkflowRunner, step_dependencies, validate_workflow
+
+
+class SlowEchoLLM(LLMAdapter):
+    def __init__(self, delay: float = 0.05):
+        self.delay = delay
+        self.active = 0
+        self.peak = 0
+
+    async def generate(self, prompt: str, **opts):
+        self.active += 1
+        self.peak = max(self.peak, self.active)
+        await asyncio.sleep(self.delay)
+        self.active -= 1
+        return {"text": prompt}
+
+
+def test_step_dependencies_from_templates_and_depends_on():
+    steps = [
+        {"id": "a", "template": "{{ inputs.x }}", "outputs": ["a_out"]},
+        {"id": "b", "template": "{{ inputs.y }}", "outputs": ["b_out"]},
+        {"id": "c", "template": "{{ memory.a_out }} {{ get(memory, 'b_out._raw', '') }}", "outputs": ["c_out"]},
+        {"id": "d", "template": "{{ inputs.x }}", "depends_on": ["c"], "outputs": ["d_out"]},
+    ]
+    deps = step_dependencies(steps)
+    assert deps == {"a": [], "b": [], "c": ["a", "b"], "d": ["c"]}
+
+    # dict methods are not keys: the reads cannot be told, so the step waits for everything before it
+    steps = [
+        {"id": "a", "template": "{{ inputs.x }}", "outputs": ["summary"]},
+        {"id": "b", "template": "{{ memory.get('summary') }}", "outputs": ["b_out"]},
+        {"id": "c", "template": "{% for k, v in memory.items() %}{{ k }}{% endfor %}", "outputs": ["c_out"]},
+    ]
+    assert step_dependencies(steps) == {"a": [], "b": ["a"], "c": ["a", "b"]}
+
+    with pytest.raises(ValueError):
+        step_dependencies([{"id": "a", "depends_on": ["b"]}, {"id": "b", "depends_on": ["a"]}])
+
+
+def test_independent_steps_run_concurrently():
+    async def _run():
+        workflow = {
+            "entry_inputs": {"x": "1"},
+            "steps": [
+                {"id": "a", "template": "A {{ inputs.x }}", "outputs": ["a_out"]},
+                {"id": "b", "template": "B {{ inputs.x }}", "outputs": ["b_out"]},
+                {"id": "c", "template": "C {{ memory.a_out._raw }} {{ memory.b_out._raw }}", "outputs": ["c_out"]},
+            ],
+        }
+        llm = SlowEchoLLM()
+        result = await WorkflowRunner(llm, max_concurrency=2).run(workflow)
+        assert llm.peak == 2
+        assert result["memory"]["c_out"]["_raw"] == "C A 1 B 1"
+
+        llm = SlowEchoLLM()
+        await WorkflowRunner(llm, max_concurrency=1).run(workflow)
+        assert llm.peak == 1
+
+    asyncio.run(_run())
+
+
+def test_run_many_streams_results_and_isolates_errors():
+    async def _run():
+        workflow = {
+            "entry_inputs": {"x": "default"},
+            "steps": [{"id": "a", "template": "A {{ inputs.x }} {{ inputs.y }}", "outputs": ["a_out"]}],
+        }
+        # the second item lacks `y`, so StrictUndefined makes that run fail
+        items = [{"y": "1"}, {}, {"x": "other", "y": "3"}]
+        llm = SlowEchoLLM(delay=0.01)
+        results = [r async for r in WorkflowRunner(llm).run_many(workflow, items, max_concurrency=2)]
+        by_index = {r["index"]: r for r in results}
+        assert sorted(by_index) == [0, 1, 2]
+        assert by_index[0]["result"]["memory"]["a_out"]["_raw"] == "A default 1"
+        assert "UndefinedError" in by_index[1]["error"]
+        assert by_index[2]["result"]["memory"]["a_out"]["_raw"] == "A other 3"
+        assert llm.peak <= 2
+
+    asyncio.run(_run())
+
+
+def test_run_many_reports_bad_items_and_iterator_failures(tmp_path):
+    from run_demo import read_batch
+
+    workflow = {"steps": [{"id": "a", "template": "A {{ inputs.y }}", "outputs": ["a_out"]}]}
+    batch = tmp_path / "batch.jsonl"
+    batch.write_text('{"y": 1}\n{"y": 2}\n{bad\n{"y": 4}\n', encoding="utf-8")
+
+    def broken():
+        yield {"y": 1}
+        yield {"y": 2}
+        raise ValueError("source went away")
+
+    async def _run():
+        runner = WorkflowRunner(SlowEchoLLM(delay=0.01))
+        from_file = [r async for r in runner.run_many(workflow, read_batch(str(batch)), max_concurrency=2)]
+        from_broken = [r async for r in runner.run_many(workflow, broken(), max_concurrency=2)]
+        return from_file, from_broken
+
+    from_file, from_broken = asyncio.run(_run())
+    by_index = {r["index"]: r for r in from_file}
+    # the unparsable line is one failed item; the lines after it still run
+    assert sorted(by_index) == [0, 1, 2, 3]
+    assert "line 3: invalid JSON" in by_index[2]["error"] and by_index[3]["result"]["memory"]["a_out"]["_raw"] == "A 4"
+    by_index = {r["index"]: r for r in from_broken}
+    assert sorted(by_index) == [0, 1, 2]
+    assert "items iterator failed: ValueError: source went away" in by_index[2]["error"]
+
+
+def test_checkpointed_runs_are_incremental(tmp_path):
+    from src.agent_demo.checkpoint import FileCheckpointStore, SQLiteCheckpointStore
+
+    workflow = {
+        "id": "wf",
+        "entry_inputs": {"x": "1", "y": "1"},
+        "steps": [
+            {"id": "a", "template": "A {{ inputs.x }}", "outputs": ["a_out"]},
+            {"id": "b", "template": "B {{ inputs.y }}", "outputs": ["b_out"]},
+            {"id": "c", "template": "C {{ memory.a_out._raw }}", "outputs": ["c_out"]},
+        ],
+    }
+
+    async def _run(store):
+        runner = WorkflowRunner(SlowEchoLLM(delay=0), checkpoint_store=store)
+        first = await runner.run(workflow)
+        assert sorted(first["checkpoint"]["computed"]) == ["a", "b", "c"]
+
+        again = await runner.run(workflow)
+        assert sorted(again["checkpoint"]["reused"]) == ["a", "b", "c"]
+        assert again["memory"] == first["memory"]
+
+        # changing y only recomputes b; a and its downstream c are reused
+        changed = dict(workflow, entry_inputs={"x": "1", "y": "2"})
+        third = await runner.run(changed)
+        assert third["checkpoint"]["computed"] == ["b"]
+        assert third["memory"]["b_out"]["_raw"] == "B 2"
+
+    asyncio.run(_run(FileCheckpointStore(str(tmp_path / "ckpt"))))
+    asyncio.run(_run(SQLiteCheckpointStore(str(tmp_path / "ckpt.db"))))
+
+
+def test_checkpoint_retention_and_server_cleanup(tmp_path):
+    import httpx
+    from src import server
+    from src.agent_demo.checkpoint import FileCheckpointStore, SQLiteCheckpointStore
+
+    for store in (FileCheckpointStore(str(tmp_path / "ckpt")), SQLiteCheckpointStore(str(tmp_path / "ckpt.db"))):
+        store.save("old", "a", {"parsed": 1})
+        assert store.purge() == 0 and store.load("old")
+        assert store.purge(older_than=-1) == 1 and store.load("old") == {}
+
+    async def _run():
+        store = FileCheckpointStore(str(tmp_path / "server"))
+        server.CHECKPOINTS = store
+        for runner in server.RUNNERS.values():
+            runner.checkpoint_store = store
+        try:
+            transport = httpx.ASGITransport(app=server.app)
+            async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+                # a completed run without a run_key leaves nothing behind
+                assert (await client.post("/run-workflow")).status_code == 200
+                assert list((tmp_path / "server").iterdir()) == []
+                # an explicit run_key keeps its checkpoints for the next incremental run
+                await client.post("/run-workflow", params={"run_key": "mine"})
+                assert store.load("mine")
+        finally:
+            server.CHECKPOINTS = None
+            for runner in server.RUNNERS.values():
+                runner.checkpoint_store = None
+
+    asyncio.run(_run())
+
+
+def test_map_reduce_step_chunks_code_and_fans_out():
+    from src.agent_demo.chunking import split_code
+
+    source = "import os\n\n\n@decorator\ndef a():\n    return 1\n\n\n# helper\ndef b():\n    return 2\n\n\nclass C:\n    def m(self):\n        return 3\n"
+    chunks = split_code(source, max_tokens=12)
+    assert "".join(chunks) == source
+    # cuts fall only between top-level definitions, keeping decorators and comments with them
+    assert [c.split("\n", 1)[0] for c in chunks] == ["import os", "# helper", "class C:"]
+
+    with open("examples/map_reduce_workflow.json", "r", encoding="utf-8") as f:
+        workflow = json.load(f)
+    validate_workflow(workflow)
+
+    class ChunkSummaryLLM(SlowEchoLLM):
+        def __init__(self):
+            super().__init__(delay=0.05)
+            self.prompts = []
+
+        async def generate(self, prompt: str, **opts):
+            self.prompts.append(prompt)
+            await super().generate(prompt)
+            first = prompt.split("\n\n", 1)[-1].split("\n", 1)[0]
+            return {"text": json.dumps({"summary": f"covers {first}"})}
+
+    async def _run():
+        llm = ChunkSummaryLLM()
+        runner = WorkflowRunner(llm)
+        queue = asyncio.Queue()
+        start = time.monotonic()
+        result = await runner.run(workflow, event_queue=queue)
+        elapsed = time.monotonic() - start
+        out = result["memory"]["module_summary"]
+        n = out["chunks"]
+        assert n > 2 and len(out["map_results"]) == n
+        # map calls ran concurrently (fan_out 4), then one reduce call
+        assert elapsed < 0.05 * (n + 1)
+        assert len(llm.prompts) == n + 1
+        assert "- covers def choose(n, k):" in llm.prompts[-1]
+        assert llm.peak == 4
+        events = []
+        while not queue.empty():
+            events.append(queue.get_nowait())
+        partial = [e for e in events if e["type"] == "map_result"]
+        assert sorted(e["index"] for e in partial) == list(range(n))
+        assert all(e["step_id"] == "summarize_module" for e in partial)
+
+    asyncio.run(_run())
@@ -7,6 +7,7 @@ export default function App(){
   const [streaming, setStreaming] = useState(false)
   const [logs, setLogs] = useState([])
   const [runId, setRunId] = useState(null)
+  const [liveText, setLiveText] = useState('')
 
   async function handleRun(){
     setRunning(true)
@@ -24,11 +25,17 @@ export default function App(){
   // Streamed run using SSE
   function handleStreamRun(){
     setLogs([])
+    setLiveText('')
     setStreaming(true)
     const es = new EventSource('http://127.0.0.1:8000/stream-workflow')
     es.onmessage = (ev) => {
       try{
         const data = JSON.parse(ev.data)
+        if(data.type === 'token'){
+          // token events are chatty; show them as live text instead of log entries
+          setLiveText((t)=> t + data.text)
+          return
+        }
         setLogs((l)=>[...l, data])
         if(data.type === 'started'){
           setRunId(data.run_id)
@@ -78,6 +85,9 @@ export default function App(){
       <h3>Streamed Logs</h3>
   <button onClick={handleStreamRun} disabled={streaming}>{streaming? 'Streaming...':'Stream Run'}</button>
   <button onClick={handleCancel} disabled={!runId} style={{marginLeft:8}}>{runId? `Cancel ${runId}` : 'Cancel'}</button>
+      {liveText && (
+        <pre style={{whiteSpace:'pre-wrap', background:'#f5f5f5', padding:8, marginTop:8}}>{liveText}</pre>
+      )}
       <div style={{maxHeight:300, overflow:'auto', background:'#fafafa', padding:8, marginTop:8}}>
         {logs.length===0? <p>No logs</p> : logs.map((ev, idx)=> (
           <div key={idx} style={{borderBottom:'1px solid #eee', padding:6}}>
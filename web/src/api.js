@@ -9,3 +9,11 @@ export async function cancelRun(runId){
   if(!res.ok) throw new Error('Cancel failed: '+res.status)
   return await res.json()
 }
+
+// Large step outputs arrive as {"$ref": "artifact", id, size, preview}; fetch the content (or a byte range) lazily
+export async function fetchArtifact(id, start, end){
+  const headers = start === undefined ? {} : {Range: `bytes=${start}-${end === undefined ? '' : end - 1}`}
+  const res = await fetch(`http://127.0.0.1:8000/artifacts/${id}`, {headers})
+  if(!res.ok) throw new Error('Artifact fetch failed: '+res.status)
+  return await res.text()
+}